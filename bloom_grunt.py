@@ -0,0 +1,182 @@
+"""
+module containing a persistent bloom filter over all tx hashes in the tx
+metadata store.
+
+a lookup for a tx hash that is not in the store (eg because the spendee is in
+the same block, or the tx is invalid) is a definite miss if any of its k bits
+are unset, and the store does not need to be touched at all. if all k bits are
+set then the tx hash is probably in the store - the store must be checked. when
+it turns out not to be there, that is a false positive.
+
+tx hashes are already uniformly distributed, so the bit positions are derived
+directly from the tx hash bytes (double hashing) instead of hashing again.
+
+the filter is saved to disk incrementally - only the pages that have changed
+since the last save are rewritten. bits are only ever set, never cleared, so
+saving the filter before the store is written guarantees that the filter on
+disk never misses a tx hash that is in the store on disk.
+
+the filter is only valid for the store it was built from, so the header holds
+the id of that store (see tx_metadata_grunt.get_store_id()). a filter for a
+different backend, location or generation of the store is rebuilt.
+"""
+
+import os, math, struct
+import config_grunt
+import filesystem_grunt
+
+# magic, num bits, num hashes, num items, store id
+header_format = "<8sQIQ32s"
+header_size = struct.calcsize(header_format)
+magic = "btcblm02"
+page_size = 4096 # bytes
+
+# module globals - do not set here. use init()
+bloom_file = None
+bits = None # bytearray
+num_bits = None
+num_hashes = None
+num_items = 0
+store_id = None
+dirty_pages = set()
+stats = None
+
+def get_size(capacity, fp_rate):
+    """
+    return the optimal (num bits, num hashes) for a filter which holds capacity
+    items with a false positive rate of fp_rate
+    """
+    m = int(math.ceil(-capacity * math.log(fp_rate) / (math.log(2) ** 2)))
+    m = ((m + 7) / 8) * 8 # whole bytes
+    k = max(1, int(round(m / float(capacity) * math.log(2))))
+    return (m, k)
+
+def init(f_name = None, capacity = None, fp_rate = None, new_store_id = ""):
+    """
+    load the filter from disk, or create an empty one if the file does not
+    exist, was created with different dimensions or was built from a different
+    store. return True if the filter is new, in which case the caller must add
+    all existing tx hashes to it. capacity, fp_rate and f_name default to the
+    values in config.json. new_store_id identifies the store that the filter
+    covers (up to 32 bytes).
+    """
+    global bloom_file, bits, num_bits, num_hashes, num_items, store_id, \
+    dirty_pages, stats
+
+    if f_name is None:
+        f_name = config_grunt.config_dict["tx_metadata_bloom_file"]
+    if capacity is None:
+        capacity = config_grunt.config_dict["tx_metadata_bloom_capacity"]
+    if fp_rate is None:
+        fp_rate = config_grunt.config_dict["tx_metadata_bloom_fp_rate"]
+
+    bloom_file = f_name
+    # struct pads to 32 bytes, so pad here too for the comparison
+    store_id = new_store_id.ljust(32, "\x00")
+    (num_bits, num_hashes) = get_size(capacity, fp_rate)
+    dirty_pages = set()
+    stats = {"lookups": 0, "definite_misses": 0, "false_positives": 0}
+
+    if os.path.isfile(bloom_file):
+        with open(bloom_file, "rb") as f:
+            header = f.read(header_size)
+            if len(header) == header_size:
+                (
+                    file_magic, file_num_bits, file_num_hashes, file_num_items,
+                    file_store_id
+                ) = struct.unpack(header_format, header)
+                if (
+                    (file_magic == magic) and
+                    (file_num_bits == num_bits) and
+                    (file_num_hashes == num_hashes) and
+                    (file_store_id == store_id)
+                ):
+                    bits = bytearray(f.read(num_bits / 8))
+                    if len(bits) == num_bits / 8:
+                        num_items = file_num_items
+                        return False
+
+    # create a new filter and write it all to disk
+    bits = bytearray(num_bits / 8)
+    num_items = 0
+    filesystem_grunt.make_sure_path_exists(
+        os.path.dirname(os.path.abspath(bloom_file))
+    )
+    with open(bloom_file, "wb") as f:
+        f.write(struct.pack(
+            header_format, magic, num_bits, num_hashes, 0, store_id
+        ))
+        f.write(bits)
+    return True
+
+def initialized():
+    return bits is not None
+
+def bit_positions(txid):
+    """the k bit positions for the binary tx hash"""
+    (h1, h2) = struct.unpack("<QQ", txid[: 16])
+    h2 |= 1 # make sure all k positions are not the same
+    return [(h1 + i * h2) % num_bits for i in xrange(num_hashes)]
+
+def add(txid):
+    """add the binary tx hash to the filter"""
+    global num_items
+    for pos in bit_positions(txid):
+        byte_num = pos >> 3
+        bits[byte_num] |= 1 << (pos & 7)
+        dirty_pages.add(byte_num / page_size)
+    num_items += 1
+
+def may_contain(txid):
+    """
+    return False if the binary tx hash is definitely not in the filter, or True
+    if it probably is
+    """
+    stats["lookups"] += 1
+    for pos in bit_positions(txid):
+        if not (bits[pos >> 3] & (1 << (pos & 7))):
+            stats["definite_misses"] += 1
+            return False
+    return True
+
+def record_false_positive():
+    """call this when may_contain() was True but the tx hash was not found"""
+    stats["false_positives"] += 1
+
+def save():
+    """write the changed pages and the header to disk, and make them durable"""
+    global dirty_pages
+    with open(bloom_file, "r+b") as f:
+        f.write(struct.pack(
+            header_format, magic, num_bits, num_hashes, num_items, store_id
+        ))
+        for page in sorted(dirty_pages):
+            f.seek(header_size + page * page_size)
+            f.write(bits[page * page_size: (page + 1) * page_size])
+        f.flush()
+        os.fsync(f.fileno())
+    dirty_pages = set()
+
+def expected_fp_rate():
+    """the false positive rate expected for the number of items added so far"""
+    return (1 - math.exp(-num_hashes * num_items / float(num_bits))) \
+    ** num_hashes
+
+def measured_fp_rate():
+    """
+    the fraction of lookups for tx hashes which were not in the store that were
+    not caught by the filter
+    """
+    num_absent = stats["definite_misses"] + stats["false_positives"]
+    if not num_absent:
+        return None
+    return stats["false_positives"] / float(num_absent)
+
+def stats2human_str():
+    measured = measured_fp_rate()
+    return "bloom filter: %d items, %d lookups, %d definite misses, %d false" \
+    " positives, measured false positive rate %s, expected %.6f" % (
+        num_items, stats["lookups"], stats["definite_misses"],
+        stats["false_positives"],
+        "n/a" if measured is None else "%.6f" % measured, expected_fp_rate()
+    )
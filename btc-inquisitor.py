@@ -48,7 +48,11 @@ btc_grunt.init_base_dir()
 
 btc_grunt.connect_to_rpc()
 
-if options.validate is not None:
+if options.headers_only is not None:
+	# raise exception if any block header is invalid
+	btc_grunt.validate_headers(options, inputs_have_been_sanitized)
+
+elif options.validate is not None:
 	# raise exception if anything is invalid
 	btc_grunt.validate_blockchain(options, inputs_have_been_sanitized)
 
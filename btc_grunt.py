@@ -12,6 +12,7 @@ orphan transactions do not exist in the blockfiles that this module processes.
 # TODO - use signrawtransaction to validate signatures (en.bitcoin.it/wiki/Raw_Transactions#JSON-RPC_API)
 # TODO - figure out what to do if we found ourselves on a fork - particularly wrt doublespends
 
+import sys
 import pprint
 import copy
 import binascii
@@ -32,6 +33,10 @@ import xml.dom.minidom
 import csv
 import collections
 import time
+import functools
+import threading
+import multiprocessing
+import Queue
 
 import config_grunt
 config_dict = config_grunt.config_dict
@@ -60,6 +65,51 @@ import lang_grunt
 # module to process the user-specified btc-inquisitor options
 import options_grunt
 
+# module to hold the unspent txouts in ram during validation
+import utxo_grunt
+
+# module to store and retrieve the tx metadata (csv tree or sqlite)
+import tx_metadata_grunt
+
+# module to rule out tx hashes that are not in the tx metadata store
+import bloom_grunt
+
+# module to store the funds and script of every txout for validation
+import txout_grunt
+
+# module containing the queues, threads and stats for the validation pipeline
+import pipeline_grunt
+
+# module to save and load snapshots of the validation state
+import snapshot_grunt
+
+# module to keep track of the latest block in bitcoind in the background
+import tip_grunt
+
+# module to store the trusted header chain
+import header_grunt
+
+# module to cache the start of the latest difficulty retarget periods
+import retarget_grunt
+
+# module to keep track of the latest blocks and detect orphans among them
+import orphan_grunt
+
+# module to store what each recent block changed, so that it can be undone
+import undo_grunt
+
+# module to remember which txin scripts have already passed verification
+import script_cache_grunt
+
+# module to group the txs of a block by their dependencies on each other
+import txgraph_grunt
+
+# module to count the calls, failures and time of each validation rule
+import instrumentation_grunt
+
+# module to look up the coinbase txs which are not mature yet
+import maturity_grunt
+
 # module globals:
 
 # rpc details. do not set here - these are updated from config.json
@@ -68,6 +118,10 @@ rpc_connection_string = None
 # the rpc connection object. initialized from the config file
 rpc = None
 
+# rpc connection objects for threads other than the main thread, since a
+# connection cannot be shared between threads. see connect_to_rpc()
+rpc_thread_local = threading.local()
+
 # if the result set grows beyond this then dump the saved blocks to screen
 max_saved_blocks = 50
 
@@ -79,6 +133,22 @@ max_block_size = 1024 * 1024
 block_range_filter_lower = None
 block_range_filter_upper = None
 
+# tx hashes which exist more than once in the tx metadata, in the format {tx
+# hash hex: [(block height, tx num), ...]}. these are the duplicate coinbase
+# txs on the main chain (see bip30). duplicates found during validation (eg a
+# tx in both an orphan block and the main chain) are added by
+# save_tx_data_to_disk() and saved in the tx metadata store, and
+# load_duplicate_txids() adds them back in on startup. tx hashes which are not
+# in here can take the single instance fast path in mark_spent_tx().
+duplicate_txids = {
+	"d5d27987d2a3dfc724e359870c6644b40e497bdc0589a033220fe15429d88599": [
+		(91812, 0), (91842, 0)
+	],
+	"e3bf3d07d4b0375638d5f1db5255fe07ba2c4cb067cd81b84ee974b6585fb468": [
+		(91722, 0), (91880, 0)
+	]
+}
+
 coinbase_maturity = 100 # blocks
 satoshis_per_btc = 100000000
 coinbase_index = 0xffffffff
@@ -89,6 +159,7 @@ max_script_element_size = 520 # bytes (bitcoin/src/script/script.h)
 max_op_count = 200 # nOpCount in bitcoin/src/script/interpreter.cpp
 locktime_threshold = 500000000 # tue nov 5 00:53:20 1985 
 max_sequence_num = 0xffffffff
+bip16_switch_time = 1333238400 # sun apr 1 00:00:00 2012 (nBIP16SwitchTime)
 
 # address symbols. from https://en.bitcoin.it/wiki/List_of_address_prefixes
 address_symbol = {
@@ -115,11 +186,39 @@ tx_metadata_dir = None # init
 saved_validation_file = "@@base_dir@@/latest-validated-block.txt"
 saved_validation_data = None # gets initialized asap in the following code.
 
-# block hashes of known orphans (one per line in hex)
-known_orphans_file = "@@base_dir@@/known-orphans.txt"
-saved_known_orphans = None # gets initialized asap in the following code.
-
 aux_blockchain_data = None # gets initialized asap in the following code
+
+# tx metadata creates and spends are accumulated here and written to the tx
+# metadata store in one pass by flush_tx_metadata(). the format is {txhash:
+# {blockhashend_txnum: {tx data dict}}} with the data already merged with
+# whatever was in the store.
+tx_metadata_write_buffer = {}
+
+# when the tx metadata journal is open, the creates and spends in the write
+# buffer are also kept here as journal records, to be appended to the journal
+# by flush_tx_metadata(). see tx_metadata_grunt.journal_record_format
+tx_metadata_journal_buffer = []
+
+# write buffers which have been handed to the writer stage of the validation
+# pipeline but not yet written, oldest first. get_tx_metadata() must still see
+# this data. always access with tx_metadata_inflight_lock held.
+tx_metadata_inflight_buffers = collections.deque()
+tx_metadata_inflight_lock = threading.Lock()
+
+# during validation, flush the tx metadata write buffer once every this many
+# blocks (set from config.json)
+tx_metadata_flush_interval = config_dict["tx_metadata_flush_interval"] # blocks
+
+# during validation, snapshot the validation state at the first flush after
+# this many blocks (set from config.json). see snapshot_grunt
+validation_snapshot_interval = config_dict["validation_snapshot_interval"]
+
+# interior merkle tree levels for recently used blocks, so that repeat merkle
+# branches for the same block do not need to rebuild the tree. format is
+# {block hash: [level 0 nodes, level 1 nodes, ..., [root]]}. least recently
+# used blocks are dropped once there are more than merkle_tree_cache_size.
+merkle_tree_cache = collections.OrderedDict()
+merkle_tree_cache_size = 16 # blocks
 tx_metadata_keynames = [
 	# the end of the tx hash as a hex string (the start is in the file name)
 	"tx_hash",
@@ -285,6 +384,36 @@ all_tx_and_validation_info
 # validation info only
 all_validation_info = block_header_validation_info + all_tx_validation_info
 
+# validation info which requires the txin scripts to be evaluated. blocks at or
+# below the --assume-valid block are parsed without it, so that their scripts
+# are never verified
+script_validation_info = [
+	"txin_checksig_validation_status",
+	"txin_sig_pubkey_validation_status",
+	"txin_der_signature_validation_status"
+]
+
+# the info needed to validate a block from its 80 byte header alone. see
+# validate_headers()
+header_validation_info = [
+	"block_height",
+	"block_hash",
+	"version",
+	"block_version_validation_status",
+	"previous_block_hash",
+	"timestamp",
+	"bits",
+	"bits_validation_status",
+	"difficulty",
+	"difficulty_validation_status",
+	"block_hash_validation_status"
+]
+
+# fetch this many headers from bitcoind in each rpc batch. this must not be more
+# than 2016 so that the start of each retarget period is always in the header
+# chain before the retarget block is validated
+header_batch_size = min(config_dict["header_batch_size"], 2016)
+
 """config_file = "config.json"
 def import_config():
 	" ""
@@ -359,8 +488,7 @@ def sanitize_globals():
 	the final lines in this file
 	"""
 	global tx_metadata_dir, blank_hash, initial_bits, \
-	saved_validation_data, saved_validation_file, aux_blockchain_data, \
-	known_orphans_file, saved_known_orphans
+	saved_validation_data, saved_validation_file, aux_blockchain_data
 
 	"""
 	if config_dict["base_dir"] is not None:
@@ -380,8 +508,7 @@ def sanitize_globals():
 	initial_bits = hex2bin(initial_bits)
 	#saved_validation_file = substitute_base_dir(saved_validation_file)
 	saved_validation_data = get_saved_validation_data()
-	#known_orphans_file = substitute_base_dir(known_orphans_file)
-	saved_known_orphans = get_saved_known_orphans()
+	orphan_grunt.load_known_orphans()
 
 def enforce_sanitization(inputs_have_been_sanitized):
 	previous_function = inspect.stack()[1][3] # [0][3] would be this func name
@@ -481,7 +608,7 @@ def validate_blockchain(options, get_prev_tx_methods, sanitized = False):
 	-p/--progress in conjunction with validation as it will take a very long
 	time (weeks) to validate the blockchain from start to finish.
 
-	a dict of block heights and hashes (hash_table) is built up and used to
+	the latest block heights and hashes are tracked in orphan_grunt and used to
 	detect orphans in this function. any transactions for these orphan blocks
 	are marked as "is_orphan" in the previous tx data in the parsed block.
 	attempting to spend a transaction from these orphan blocks results in a
@@ -495,42 +622,222 @@ def validate_blockchain(options, get_prev_tx_methods, sanitized = False):
 	# make sure the user input data has been sanitized
 	enforce_sanitization(sanitized)
 
-	# initialize the hash table from where we left off validating last time.
-	# {current hash: [current block height, previous hash], ...}
-	hash_table = init_hash_table()
+	# count the calls, failures and time of each validation rule. do this before
+	# starting the script workers, so that they run the instrumented functions
+	# too. they send their counters back with their results.
+	if config_dict["validation_instrumentation"]:
+		instrument_validation()
+	# count the bytes hashed by each function in the same way
+	if config_dict["hash_instrumentation"]:
+		reset_hash_instrumentation()
+		enable_hash_instrumentation()
+
+	# validation is a pipeline of stages connected by bounded queues:
+	# - fetch: a thread which gets blocks from bitcoind ahead of validation
+	# - validate: this thread. parses and validates each block in order, since
+	# each block depends on the txs created and spent by the blocks before it
+	# - scripts: worker processes which verify the txin scripts of each block
+	# in parallel
+	# - write: a thread which writes the tx metadata and the latest validated
+	# block to disk, in order
+	# start the script workers before any other threads or files are opened, so
+	# that the forked processes do not inherit them.
+	num_script_workers = config_dict["pipeline_script_workers"] or \
+	multiprocessing.cpu_count()
+	script_pool = multiprocessing.Pool(num_script_workers)
+	stage_workers = [
+		("fetch", 1), ("validate", 1), ("scripts", num_script_workers),
+		("write", 1)
+	]
+	pipeline_grunt.init(stage_workers)
 
-	# get the block height to start validating from. begin 1 after the latest
-	# block in the hash table, since all hash table blocks have already been
-	# validated.
-	block_height = truncate_hash_table(hash_table, 1).values()[0][0] + 1
+	# start tracking the latest blocks from where we left off validating last
+	# time, or from the (blank) parent of the genesis block
+	orphan_grunt.init_ring()
+	if saved_validation_data is not None:
+		orphan_grunt.add(*saved_validation_data)
+	else:
+		orphan_grunt.add(blank_hash, -1, blank_hash)
 
-	# get the very latest block height in the blockchain
-	latest_block = get_info()["blocks"]
+	# get the block height to start validating from. begin 1 after the latest
+	# tracked block, since it has already been validated.
+	block_height = orphan_grunt.tip_height + 1
+
+	# keep track of the very latest block height in the blockchain in the
+	# background, rather than asking bitcoind after every block
+	start_tip_watcher()
+	latest_block = tip_grunt.get_height()
+
+	# check each block against the trusted header chain from previous runs with
+	# the --headers-only flag (if any), and use it for the retarget periods
+	header_grunt.init()
+
+	# skip script validation for blocks at or below the --assume-valid block
+	assume_valid_height = get_assume_valid_height(options)
+	num_assumed_valid_txins = 0
+
+	# start with an empty utxo set. txouts from blocks that were validated
+	# before this run will not be in it, but these are still found on disk
+	utxo_grunt.init()
+	retarget_grunt.init()
+	txgraph_grunt.init()
+
+	# if there is a snapshot from the latest validated block then pick up the
+	# latest blocks, utxo set and bits data from it instead of starting afresh
+	snapshot = None # init
+	if saved_validation_data is not None:
+		snapshot = snapshot_grunt.load(
+			saved_validation_data[0], saved_validation_data[1]
+		)
+	if snapshot is not None:
+		orphan_grunt.init_ring()
+		orphan_grunt.restore(snapshot["orphan_ring"])
+		utxo_grunt.restore(snapshot["utxos"])
+		retarget_grunt.restore(snapshot["retarget_periods"])
+	snapshot_height = block_height - 1
+
+	# the store must not have been switched to sqlite without migrating
+	tx_metadata_grunt.check_store()
+	load_duplicate_txids()
+
+	# append tx metadata creates and spends to the journal rather than
+	# rewriting them in the store. the journal is folded into the store in the
+	# background.
+	if config_dict["tx_metadata_journal"]:
+		tx_metadata_grunt.open_journal(fold_journal_records)
+
+	# avoid looking up tx hashes in the store when they are definitely not there
+	init_tx_metadata_bloom()
+
+	# validation never asks bitcoind for previous txs - all previous txouts come
+	# from the local txout store. make sure the store covers all blocks that
+	# were validated before.
+	txout_grunt.init()
+	backfill_txout_store(block_height, options)
+
+	# keep the undo records for the latest blocks, so that blocks which are
+	# orphaned by a reorg can be disconnected again
+	undo_grunt.init()
+
+	# check coinbase maturity against the coinbase txids of the latest blocks
+	init_coinbase_index(block_height)
+
+	# skip the txin scripts which passed verification in an earlier run
+	if config_dict["script_cache"]:
+		script_cache_grunt.init()
+	get_prev_tx_methods = [
+		method for method in get_prev_tx_methods if method != "rpc"
+	] + ["txout_store"]
 
 	# init the bits for the previous (already validated) block
-	if block_height == 0:
+	if snapshot is not None:
+		block_1_ago = snapshot["block_1_ago"]
+	elif block_height == 0:
 		block_1_ago = {"bits": None, "timestamp": None}
 	else:
-		temp = get_block(block_height - 1, "json")
-		block_1_ago = {"bits": hex2bin(temp["bits"]), "timestamp": temp["time"]}
+		block_1_ago = dict(zip(
+			["bits", "timestamp"], get_bits_data(block_height - 1)
+		))
+
+	# the latest validated block, if it has not been saved to disk yet
+	unsaved_block = None
+
+	def start_pipeline(block_height):
+		"""start the fetch and write stages. return their queues"""
+		fetch_queue = pipeline_grunt.make_queue(
+			"validate", config_dict["pipeline_fetch_ahead"]
+		)
+		pipeline_grunt.start_thread(
+			"fetch", fetch_blocks, block_height, fetch_queue
+		)
+		write_queue = pipeline_grunt.make_queue(
+			"write", config_dict["pipeline_write_queue"]
+		)
+		pipeline_grunt.start_thread("write", tx_metadata_writer, write_queue)
+		return (fetch_queue, write_queue)
+
+	(fetch_queue, write_queue) = start_pipeline(block_height)
 
 	def prog(action):
 		"""quick function to update progress meter"""
 		if options.progress:
 			progress_meter.render(
 				100 * block_height / float(latest_block),
-				"%s block %d of %d" % (action, block_height, latest_block)
+				"%s block %d of %d (%s)" % (
+					action, block_height, latest_block,
+					pipeline_grunt.stats2short_str()
+				)
 			)
 	while True:
 		# if we have already validated the whole user-defined range then exit
 		# here note that block_height is the latest validated block height
 		if block_height >= block_range_filter_upper:
+			if unsaved_block is not None:
+				txout_grunt.commit()
+				undo_grunt.commit()
+				queue_tx_metadata_flush(write_queue, unsaved_block)
+			pipeline_grunt.join(write_queue)
+			pipeline_grunt.shutdown()
+			script_pool.close()
+			script_pool.join()
+			tip_grunt.stop()
+			header_grunt.close()
+			undo_grunt.close()
+			tx_metadata_grunt.close_journal()
+			if options.progress:
+				print "\n%s" % bloom_grunt.stats2human_str()
+				print pipeline_grunt.stats2human_str()
+				print txgraph_grunt.stats2human_str()
+				if script_cache_grunt.initialized():
+					print script_cache_grunt.stats2human_str()
+				if options.ASSUMEVALID is not None:
+					print "assume-valid: the scripts of %d txins up to block" \
+					" %d were not validated" % (
+						num_assumed_valid_txins, assume_valid_height
+					)
+			script_cache_grunt.close()
+			if instrumentation_grunt.enabled:
+				instrumentation_grunt.dump()
+				instrumentation_grunt.uninstrument()
+			if hash_instrumentation:
+				print "\n%s" % hashed_bytes2human_str()
+				enable_hash_instrumentation(False)
 			# TODO - test this
 			return True
 
-		# get the block from bitcoind
+		# get the block from the fetch stage
 		prog("fetching")
-		block_bytes = get_block(block_height, "bytes")
+		(fetched_height, block_bytes) = pipeline_grunt.get(fetch_queue)
+		start = time.time()
+		if instrumentation_grunt.enabled:
+			instrumentation_grunt.start_block(fetched_height)
+		if fetched_height != block_height:
+			raise Exception(
+				"the validation pipeline fetched block %d instead of block %d"
+				% (fetched_height, block_height)
+			)
+
+		# if bitcoind has switched to another chain then disconnect the blocks
+		# which are no longer on the main chain and carry on from the fork
+		if block_bin2dict(
+			block_bytes, block_height, ["previous_block_hash"], None
+		)["previous_block_hash"] != orphan_grunt.tip_hash:
+			prog("disconnecting orphans before")
+			if unsaved_block is not None:
+				txout_grunt.commit()
+				undo_grunt.commit()
+				queue_tx_metadata_flush(write_queue, unsaved_block)
+				unsaved_block = None
+			pipeline_grunt.join(write_queue)
+			pipeline_grunt.shutdown()
+			block_height = rollback_to_main_chain() + 1
+			block_1_ago = dict(zip(
+				["bits", "timestamp"], get_bits_data(block_height - 1)
+			))
+			init_coinbase_index(block_height)
+			pipeline_grunt.init(stage_workers)
+			(fetch_queue, write_queue) = start_pipeline(block_height)
+			continue
 
 		# get the version validation info for this block height. note that
 		# blocks and transactions do not have the validation elements from
@@ -539,40 +846,83 @@ def validate_blockchain(options, get_prev_tx_methods, sanitized = False):
 		version_validation_info = get_version_validation_info(
 			get_version_from_height(block_height)
 		)
+		block_info = all_block_and_validation_info + version_validation_info
+		assume_valid = (block_height <= assume_valid_height)
+		if assume_valid:
+			block_info = [
+				info for info in block_info
+				if info not in script_validation_info
+			]
 		# parse the block and initialize the validation elements to None
 		prog("parsing")
 		parsed_block = block_bin2dict(
-			block_bytes, block_height, all_block_and_validation_info + \
-			version_validation_info, get_prev_tx_methods, options.explain
+			block_bytes, block_height, block_info, get_prev_tx_methods,
+			options.explain
+		)
+		# send the scripts to the script workers while we carry on with the
+		# rest of the block
+		(script_jobs, cached_script_results) = get_block_script_jobs(
+			parsed_block, bugs_and_all, options.explain
+		)
+		pending_script_results = script_pool.map_async(
+			verify_tx_scripts, script_jobs
+		) if script_jobs else None
+
+		# die if this block has no ancestor among the latest blocks, or if it
+		# is not the block in the trusted header chain
+		enforce_ancestor(
+			parsed_block["block_hash"], parsed_block["previous_block_hash"]
 		)
-		# die if this block has no ancestor in the hash table
-		enforce_ancestor(hash_table, parsed_block["previous_block_hash"])
+		enforce_trusted_header(parsed_block)
 
 		save_tx_metadata(parsed_block)
 
-		# update the hash table (contains orphan and main-chain blocks)
-		hash_table[parsed_block["block_hash"]] = [
-			parsed_block["block_height"], parsed_block["previous_block_hash"]
-		]
-		# if there are any orphans in the hash table then save them to disk and
-		# also to the saved_known_orphans var
-		save_new_orphans(hash_table, parsed_block["block_hash"])
+		# make this block the tip. if this orphans any blocks then they are
+		# saved to disk as known orphans
+		orphan_grunt.add(
+			parsed_block["block_hash"], parsed_block["block_height"],
+			parsed_block["previous_block_hash"]
+		)
 
-		# truncate the hash table so as not to use up too much ram
-		if len(hash_table) > (2 * coinbase_maturity):
-			hash_table = truncate_hash_table(hash_table, coinbase_maturity)
+		# the coinbase of this block is immature too
+		maturity_grunt.expire(block_height)
+		maturity_grunt.add(block_height, parsed_block["tx"][0]["hash"])
 
 		# update the validation elements of the parsed block
 		prog("validating")
+		# waiting on the script workers does not count as busy time
+		wait_start = time.time()
+		script_results = get_block_script_results(
+			pending_script_results, cached_script_results
+		)
+		start += time.time() - wait_start
 		parsed_block = validate_block(
-			parsed_block, block_1_ago, bugs_and_all, options.explain
+			parsed_block, block_1_ago, bugs_and_all, options.explain,
+			script_results
 		)
 		# die if the block failed validation
 		enforce_valid_block(parsed_block, options)
+		if assume_valid:
+			num_assumed_valid_txins += sum(
+				len(tx["input"]) for (tx_num, tx) in parsed_block["tx"].items()
+				if tx_num != 0 # coinbase
+			)
 
 		# mark off all the txs that this validated block spends
 		prog("spending txs from")
-		mark_spent_txs(parsed_block)
+		spends = mark_spent_txs(parsed_block)
+
+		# keep the utxo set and the txout store in step with the validated chain
+		prior_utxos = utxo_grunt.connect_block(parsed_block)
+		overwritten_txouts = txout_grunt.add_block(parsed_block)
+
+		# keep a record of what this block changed, in case it is orphaned
+		undo_grunt.save(
+			parsed_block["block_hash"], block_height, [
+				(tx["hash"], tx_num, len(tx["output"]))
+				for (tx_num, tx) in sorted(parsed_block["tx"].items())
+			], spends, prior_utxos, overwritten_txouts
+		)
 
 		# if this block height has not been saved before, or if it has been
 		# saved but has now changed, then back it up to disk. it is important to
@@ -580,54 +930,287 @@ def validate_blockchain(options, get_prev_tx_methods, sanitized = False):
 		# will be written to disk as if it were valid. we back-up to disk in
 		# case an error is encountered later (which would prevent this backup
 		# from occuring and then we would need to start parsing from the
-		# beginning again)
-		save_latest_validated_block(
+		# beginning again). the tx metadata is only written to disk every
+		# tx_metadata_flush_interval blocks, so only save the latest validated
+		# block then too - a crash will then resume from the last flush. both
+		# are written by the writer stage, in order.
+		unsaved_block = (
 			bin2hex(parsed_block["block_hash"]), parsed_block["block_height"],
 			bin2hex(parsed_block["previous_block_hash"])
 		)
+		if not ((block_height + 1) % tx_metadata_flush_interval):
+			txout_grunt.commit()
+			undo_grunt.prune(block_height)
+			undo_grunt.commit()
+			script_cache_grunt.commit()
+			queue_tx_metadata_flush(write_queue, unsaved_block)
+			unsaved_block = None
 		# update vars for the next loop...
 		# update the bits data for the next loop
 		(block_1_ago["bits"], block_1_ago["timestamp"]) = (
 			parsed_block["bits"], parsed_block["timestamp"]
 		)
-		# get the very latest block height in the blockchain to keep the
-		# progress meter accurate
-		latest_block = get_info()["blocks"]
+		retarget_grunt.update(
+			block_height, parsed_block["bits"], parsed_block["timestamp"]
+		)
+		# snapshot the validation state every so often. only do this straight
+		# after a flush, once the writer has caught up, so that the snapshot
+		# matches the latest validated block on disk
+		if (unsaved_block is None) and (
+			(block_height - snapshot_height) >= validation_snapshot_interval
+		):
+			prog("snapshotting")
+			pipeline_grunt.join(write_queue)
+			snapshot_grunt.save(parsed_block["block_hash"], block_height, {
+				"orphan_ring": orphan_grunt.snapshot(),
+				"block_1_ago": block_1_ago,
+				"retarget_periods": retarget_grunt.snapshot(),
+				"utxos": utxo_grunt.snapshot()
+			})
+			snapshot_height = block_height
+		# get the very latest block height in the blockchain from the tip
+		# watcher to keep the progress meter accurate
+		latest_block = tip_grunt.get_height()
+		pipeline_grunt.record("validate", time.time() - start)
+		if instrumentation_grunt.enabled:
+			instrumentation_grunt.end_block()
 		block_height += 1
 
 	# terminate the progress meter if we are using one
 	if options.progress:
 		progress_meter.done()
 
-	# TODO - necessary?
-	save_new_orphans(hash_table, parsed_block["block_hash"])
+def init_coinbase_index(block_height):
+	"""
+	fill the coinbase maturity index (see maturity_grunt) with the coinbase
+	txids of the blocks before block_height that are not mature yet. get these
+	from the undo records of the latest blocks if possible, otherwise from
+	bitcoind.
+	"""
+	maturity_grunt.init(coinbase_maturity)
+
+	# the hashes of the latest blocks on the main chain, by height
+	block_hashes = {}
+	block_hash = orphan_grunt.tip_hash
+	while orphan_grunt.has_block(block_hash):
+		(ring_block_height, previous_block_hash) = \
+		orphan_grunt.blocks[block_hash]
+		block_hashes[ring_block_height] = block_hash
+		block_hash = previous_block_hash
 
-def init_hash_table(block_data = None):
+	for coinbase_height in xrange(
+		max(0, block_height - coinbase_maturity + 1), block_height
+	):
+		undo = undo_grunt.get(block_hashes[coinbase_height]) \
+		if coinbase_height in block_hashes else None
+		if undo is not None:
+			# the coinbase is always the first tx created by the block
+			(_, created, spends, prior_utxos, overwritten_txouts) = undo
+			coinbase_txid = created[0][0]
+		else:
+			coinbase_txid = hex2bin(get_block(coinbase_height, "json")["tx"][0])
+		maturity_grunt.add(coinbase_height, coinbase_txid)
+
+def instrument_validation():
+	"""
+	wrap the validation rules (the valid_*() functions), script verification,
+	tx metadata i/o and block parsing to count their calls, failures and time.
+	see instrumentation_grunt.
+	"""
+	this_module = sys.modules[__name__]
+	instrumentation_grunt.init()
+	instrumentation_grunt.instrument(this_module, [
+		name for name in dir(this_module) if name.startswith("valid_") and
+		name not in ["valid_block_check", "valid_address_checksum_batch"]
+	])
+	instrumentation_grunt.instrument(
+		this_module, ["verify_script"],
+		failed = lambda script_eval_data: script_eval_data["status"] is not True
+	)
+	# these only fail by raising
+	instrumentation_grunt.instrument(this_module, [
+		"block_bin2dict", "get_tx_metadata", "save_tx_metadata",
+		"mark_spent_txs", "flush_tx_metadata"
+	], failed = lambda result: False)
+
+def validate_headers(options, sanitized = False):
 	"""
-	construct the hash table that is needed to begin validating the blockchain
-	from the position specified by the user. the hash table must begin 1 block
-	before the range we begin parsing at and is in the format:
+	validate the proof of work and retarget schedule of the whole main chain
+	from the block headers alone, and save the headers to the trusted header
+	chain (see header_grunt). this function is called whenever the user invokes
+	the -v/--validate flag with the --headers-only flag.
 
-	{current hash: [current block height, previous hash], ...}
+	validation resumes after the last header in the header chain, and the
+	headers are fetched from bitcoind in batches, so this takes minutes rather
+	than the weeks taken by a full validation. if bitcoind has reorganized onto
+	another chain since the last run then the headers which are no longer on the
+	main chain are dropped first.
 
-	if block_data is not specified then init the hash table from file. if it is
-	specified then also update the hash table from this block data.
+	no data is returned as part of this function - exit silently upon success
+	and raise an error upon fail.
 	"""
-	hash_table = {blank_hash: [-1, blank_hash]} # init
-	if saved_validation_data is not None:
-		(
-			saved_validated_block_hash, saved_validated_block_height,
-			saved_previous_validated_block_hash
-		) = saved_validation_data
+	enforce_sanitization(sanitized)
+	header_grunt.init()
+	retarget_grunt.init()
+
+	# drop headers which are no longer on the main chain
+	block_height = header_grunt.num_headers
+	while (
+		(block_height > 0) and
+		calculate_block_hash(header_grunt.get(block_height - 1)) != \
+		hex2bin(do_rpc("getblockhash", block_height - 1))
+	):
+		block_height -= 1
+	header_grunt.truncate(block_height)
 
-		hash_table[saved_validated_block_hash] = [
-			saved_validated_block_height, saved_previous_validated_block_hash
-		]
-	if block_data is not None:
-		hash_table[block_data["block_hash"]] = [
-			block_data["block_height"], block_data["previous_block_hash"]
-		]
-	return hash_table
+	final_height = min(block_range_filter_upper, get_latest_block_height())
+
+	# init the hash and bits data for the previous (already validated) header
+	if block_height == 0:
+		previous_block_hash = blank_hash
+		block_1_ago = {"bits": None, "timestamp": None}
+	else:
+		previous_header = block_bin2dict(
+			header_grunt.get(block_height - 1), block_height - 1,
+			["block_hash", "timestamp", "bits"], None
+		)
+		previous_block_hash = previous_header["block_hash"]
+		block_1_ago = {
+			"bits": previous_header["bits"],
+			"timestamp": previous_header["timestamp"]
+		}
+
+	while block_height <= final_height:
+		if options.progress:
+			progress_meter.render(
+				100 * block_height / float(final_height),
+				"validating header %d of %d" % (block_height, final_height)
+			)
+		num_headers = min(header_batch_size, final_height + 1 - block_height)
+		headers = get_block_headers(block_height, num_headers)
+		for header in headers:
+			parsed_header = block_bin2dict(
+				header, block_height, header_validation_info, None,
+				options.explain
+			)
+			if parsed_header["previous_block_hash"] != previous_block_hash:
+				raise Exception(
+					"the header for block %d (hash %s) does not follow on from"
+					" the header for block %d (hash %s)."
+					% (
+						block_height, bin2hex(parsed_header["block_hash"]),
+						block_height - 1, bin2hex(previous_block_hash)
+					)
+				)
+			parsed_header = validate_block_header(
+				parsed_header, block_1_ago, options.explain
+			)
+			enforce_valid_block(parsed_header, options)
+
+			previous_block_hash = parsed_header["block_hash"]
+			(block_1_ago["bits"], block_1_ago["timestamp"]) = (
+				parsed_header["bits"], parsed_header["timestamp"]
+			)
+			retarget_grunt.update(
+				block_height, parsed_header["bits"], parsed_header["timestamp"]
+			)
+			block_height += 1
+
+		# the whole batch is valid - add it to the trusted header chain
+		header_grunt.append(headers)
+
+	if options.progress:
+		progress_meter.done()
+	header_grunt.close()
+	return True
+
+def enforce_trusted_header(parsed_block):
+	"""
+	die if the block hash differs from the hash in the trusted header chain for
+	this block height. blocks beyond the end of the header chain are not
+	checked.
+	"""
+	header = header_grunt.get(parsed_block["block_height"])
+	if header is None:
+		return
+
+	trusted_block_hash = calculate_block_hash(header)
+	if parsed_block["block_hash"] != trusted_block_hash:
+		raise Exception(
+			"block %d has hash %s but the trusted header chain has hash %s."
+			" Investigate."
+			% (
+				parsed_block["block_height"],
+				bin2hex(parsed_block["block_hash"]),
+				bin2hex(trusted_block_hash)
+			)
+		)
+
+def get_assume_valid_height(options):
+	"""
+	return the height of the --assume-valid block, or -1 if the option was not
+	used. the block must be on the main chain - otherwise the scripts of blocks
+	which are not its ancestors would be skipped too.
+	"""
+	if options.ASSUMEVALID is None:
+		return -1
+
+	block_hash = bin2hex(options.ASSUMEVALID)
+	block = get_block(block_hash, "json")
+	# bitcoind gives orphan blocks -1 confirmations
+	if block["confirmations"] < 1:
+		raise ValueError(
+			"the --assume-valid block %s is not on the main chain" % block_hash
+		)
+	return block["height"]
+
+def fetch_blocks(block_height, fetch_queue):
+	"""
+	the fetch stage of the validation pipeline. get blocks from bitcoind in
+	order, beginning at block_height, and queue them as (block height, block
+	bytes) until the end of the user-defined range. the queue is bounded so this
+	never runs more than a few blocks ahead of validation.
+	"""
+	connect_to_rpc(this_thread_only = True)
+	while block_height < block_range_filter_upper:
+		start = time.time()
+		block_bytes = get_block(block_height, "bytes")
+		pipeline_grunt.record("fetch", time.time() - start)
+		if not pipeline_grunt.put(fetch_queue, (block_height, block_bytes)):
+			return
+		block_height += 1
+
+def backfill_txout_store(block_height, options):
+	"""
+	add the txouts from all blocks before block_height that are not yet in the
+	txout store. this is only necessary when validation was begun before the
+	txout store existed. only the txouts are parsed, so bitcoind is never asked
+	for previous txs here either.
+	"""
+	start_height = txout_grunt.get_latest_height() + 1
+	if start_height >= block_height:
+		return
+
+	required_info = ["block_height", "tx_hash", "txout_funds", "txout_script"]
+	for height in xrange(start_height, block_height):
+		if options.progress:
+			progress_meter.render(
+				100 * (height - start_height) / \
+				float(block_height - start_height),
+				"backfilling txout store with block %d of %d"
+				% (height, block_height - 1)
+			)
+		parsed_block = block_bin2dict(
+			get_block(height, "bytes"), height, required_info, None,
+			options.explain
+		)
+		txout_grunt.add_block(parsed_block)
+		if not (height % 1000):
+			txout_grunt.commit()
+
+	txout_grunt.commit()
+	if options.progress:
+		progress_meter.done()
 
 def backup_hash_table(hash_table, latest_block_hash):
 	"""
@@ -747,16 +1330,21 @@ def extract_txs(binary_blocks, options):
 
 def save_latest_validated_block(
 	latest_validated_block_hash, latest_validated_block_height,
-	previous_validated_block_hash
+	previous_validated_block_hash, allow_earlier = False
 ):
 	"""
 	save to disk the latest block that has been validated. overwrite file if it
 	exists. the file format is:
 	latest validated block hash, latest validated block height, previously
 	validated hash
+
+	allow_earlier is only set when later blocks have been disconnected (see
+	rollback_to_main_chain())
 	"""
+	global saved_validation_data
+
 	# do not overwrite a later value with an earlier value
-	if saved_validation_data is not None:
+	if (saved_validation_data is not None) and not allow_earlier:
 		(
 			saved_validated_block_hash, saved_validated_block_height,
 			saved_previous_validated_block_hash
@@ -788,6 +1376,10 @@ def save_latest_validated_block(
 				previous_validated_block_hash
 			)
 		)
+	saved_validation_data = [
+		hex2bin(latest_validated_block_hash), latest_validated_block_height,
+		hex2bin(previous_validated_block_hash)
+	]
 
 def get_saved_validation_data():
 	"""
@@ -826,101 +1418,6 @@ def get_saved_validation_data():
 
 	return saved_validation_data
 
-def get_saved_known_orphans():
-	"""
-	retrieve the saved orphan data. this is necessary because validation now
-	happens seperately to block retrieval, and we need to know if a block is an
-	orphan when retrieving it via rpc.
-
-	the file format is "block height, block hash" per line. note the full-stop
-	on the final line - this is vital as it ensures that the entire file has
-	been written correctly in the past, and not terminated half way through a
-	write.
-	"""
-	try:
-		with open(known_orphans_file, "r") as f:
-			file_data = f.readlines()
-
-		file_exists = True
-	except:
-		# the file cannot be opened
-		file_exists = False
-		saved_known_orphans = None
-
-	if file_exists:
-		if file_data[-1].strip() != ".":
-			raise IOError(
-				"the validation data was not previously backed up to disk"
-				" correctly. it should end with a full stop, however one was"
-				" not found. this implies that the file-write was interrupted."
-				" please restore from one of the %s backup files."
-				% known_orphans_file
-			)
-		else:
-			file_data = file_data[: -1]
-			saved_known_orphans = {} # init
-			# convert the whole-file-string to a dict in two setps. firstly
-			# get a list with each element being a line of the file
-			list_of_csvs = [
-				orphan_block_hash.strip() for orphan_block_hash in file_data
-			]
-			# then loop through the list of csvs and convert to a dict
-			for csv_str in list_of_csvs:
-				csv_list = csv_str.split(",")
-				block_height = int(csv_list[0])
-				block_hash = hex2bin(csv_list[1])
-				if block_height not in saved_known_orphans:
-					# this block height has not been saved before
-					saved_known_orphans[block_height] = [block_hash]
-				elif block_hash not in saved_known_orphans[block_height]:
-					# this block height has been saved before but not this hash
-					saved_known_orphans[block_height].append(block_hash)
-
-	return saved_known_orphans
-
-def save_known_orphans(orphans, backup = True):
-	"""
-	save the supplied dict of orphans to disk and backup the old file if
-	necessary. the purpose of the backup is to enable restoring in case of a
-	failed disk write. orphans is in the format {
-		block height: [block hash, ...], ...
-	}
-	"""
-	global saved_known_orphans
-
-	backup_orphans_file = "%s.backup.%s" % (
-		known_orphans_file, time.strftime("%Y-%m-%d-%H-%M-%S")
-	)
-	# copy2 preserves file metadata
-	shutil.copy2(known_orphans_file, backup_orphans_file)
-	# the old orphans file is now safely backed-up :)
-
-	for filename in glob.glob("%s*" % known_orphans_file):
-		if filename not in [known_orphans_file, backup_orphans_file]:
-			os.remove(filename)
-
-	with open(known_orphans_file, "w") as f:
-		# convert the orphans var to a single string for the whole file. first
-		# get a list of csv strings
-		csv_list = [] # init
-		for (block_height, hash_list) in orphans.items():
-			for block_hash in hash_list:
-				csv_list.append("%d,%s" % (block_height, bin2hex(block_hash)))
-
-		csv_list.append(".")
-
-		# convert the list of csv strings into a single string for the file
-		f.write("\n".join(s for s in csv_list))
-
-	# the new orphan data is saved to disk - reflect this in the global variable
-	saved_known_orphans = orphans
-
-def is_orphan(block_hash):
-	for (block_height, orphan_block_hash_list) in saved_known_orphans.items():
-		if block_hash in orphan_block_hash_list:
-			return True
-	return False
-
 def save_tx_metadata(parsed_block):
 	"""
 	save all txs in this block to the filesystem. as of this block the txs are
@@ -989,13 +1486,10 @@ def save_tx_metadata(parsed_block):
 
 def save_tx_data_to_disk(txhash, save_data):
 	"""
-	save a 64 character hash, eg 2ea121e32934b7348445f09f46d03dda69117f2540de164
-	36835db7f032370d0 in a directory structure like base_dir/2e/a1/21.txt the
-	remainder of the hash is the first column entry within the csv file:
-	e32934b7348445f09f46d03dda69117f2540de16436835db7f032370d0
-	this way we use up a maximum of 0xff^3 = 16,777,216 files, but probably far
-	fewer. there should be plenty of inodes for this amount of files on any 1tb+
-	hard drive.
+	save the metadata for a 64 character tx hash, eg 2ea121e32934b7348445f09f46d
+	03dda69117f2540de16436835db7f032370d0, merging it with any metadata that
+	already exists for this hash. the storage backend is handled by module
+	tx_metadata_grunt - either a csv tree like base_dir/2e/a1/21.txt or sqlite.
 
 	txs actually are not unique, for example, block 91842 and block 91812 both
 	have the exact same coinbase tx. this occurs when two coinbase addresses are
@@ -1004,51 +1498,246 @@ def save_tx_data_to_disk(txhash, save_data):
 	metadata. this enables us to distinguish between a doublespend and a
 	blockchain reorganization.
 	"""
-	(f_dir, f_name, hashend) = hash2dir_and_filename_and_hashend(txhash)
-
-	# create the dir if it does not exist
-	if not os.path.exists(f_dir):
-		os.makedirs(f_dir)
+	existing_data_dict = get_tx_metadata(txhash)
+	if existing_data_dict is None:
+		new_data_dict = save_data
+		if bloom_grunt.initialized():
+			bloom_grunt.add(hex2bin(txhash))
+	else:
+		# a new block-hash-end txnum for an existing tx hash is a duplicate
+		new_instances = [
+			(blockhashend_txnum, tx_data) for (blockhashend_txnum, tx_data) in \
+			save_data.items() if (
+				(blockhashend_txnum not in existing_data_dict) and
+				("block_height" in tx_data)
+			)
+		]
+		if new_instances:
+			for (blockhashend_txnum, tx_data) in \
+			existing_data_dict.items() + new_instances:
+				add_duplicate_txid(
+					txhash, tx_data["block_height"],
+					int(blockhashend_txnum.split("-")[1])
+				)
+		new_data_dict = merge_tx_metadata(txhash, existing_data_dict, save_data)
 
-	# write data to the file if the file does not exist
-	try:
-		if not os.path.isfile(f_name):
-			with open(f_name, "w") as f:
-				f.write(tx_metadata_dict2csv({hashend: save_data}))
+		# if there is nothing to update then exit here
+		if existing_data_dict == new_data_dict:
 			return
-	except:
-		raise IOError(
-			"failed to open file %s for writing unspent transaction data %s in"
-			% (f_name, save_data)
+
+	# the data is not written until flush_tx_metadata() is called
+	tx_metadata_write_buffer[txhash] = new_data_dict
+	if tx_metadata_grunt.journal_is_open():
+		tx_metadata_journal_buffer.extend(
+			tx_metadata2journal_records(txhash, save_data)
 		)
 
-	# if we get here then we know the file exists. get one tx per list item
-	existing_data_csv = get_tx_metadata_csv(txhash, f_dir, f_name, hashend)
-	existing_data_dict = tx_metadata_csv2dict(existing_data_csv)
+def add_duplicate_txid(txhash, block_height, tx_num, save = True):
+	"""
+	add an instance of a tx hash (hex) to the duplicate txids and save it in the
+	tx metadata store, so that it is still known after a restart.
+	"""
+	if txhash not in duplicate_txids:
+		duplicate_txids[txhash] = []
+	if (block_height, tx_num) not in duplicate_txids[txhash]:
+		duplicate_txids[txhash].append((block_height, tx_num))
+		if save:
+			tx_metadata_grunt.add_duplicate_txid(txhash, block_height, tx_num)
 
-	save_data_new1 = copy.deepcopy(existing_data_dict) # init
-	# now update only the relevant hash if it has changed
-	if txhash in existing_data_dict:
-		save_data_new1[txhash] = merge_tx_metadata(
-			txhash, existing_data_dict[txhash], save_data
-		)
-	else:
-		# add the new hash to the dict
-		save_data_new1[txhash] = save_data
+def load_duplicate_txids():
+	"""add the duplicate txids saved by earlier runs to duplicate_txids"""
+	for (txhash, block_height, tx_num) in \
+	tx_metadata_grunt.get_duplicate_txids():
+		add_duplicate_txid(txhash, block_height, tx_num, save = False)
 
-	# if there is nothing to update then exit here
-	if existing_data_dict == save_data_new1:
+def flush_tx_metadata():
+	"""
+	write all buffered tx metadata to the tx metadata store in one pass and
+	empty the buffer. this must be done before save_latest_validated_block() so
+	that a crash never leaves the store behind the latest validated block.
+
+	if the journal is open then the buffered creates and spends are appended to
+	the journal instead, and the background compactor folds them into the store
+	later on.
+	"""
+	global tx_metadata_write_buffer, tx_metadata_journal_buffer
+	if not tx_metadata_write_buffer:
 		return
 
-	# alter the hashes into hashends
-	hashstart_len = 64 - len(hashend)
-	save_data_new2 = {
-		txhash[hashstart_len:]: data for (txhash, data) in \
-		save_data_new1.items()
-	}
-	# overwrite the file
-	with open(f_name, "w") as f:
-		f.write(tx_metadata_dict2csv(save_data_new2))
+	# the bloom filter on disk must always cover the store on disk, so save it
+	# first
+	if bloom_grunt.initialized():
+		bloom_grunt.save()
+
+	write_tx_metadata(tx_metadata_write_buffer, tx_metadata_journal_buffer)
+	tx_metadata_write_buffer = {}
+	tx_metadata_journal_buffer = []
+
+def write_tx_metadata(write_buffer, journal_records, conn = None):
+	"""
+	write a tx metadata write buffer (and its journal records) to the store, or
+	to the journal if it is open. conn is only needed when using sqlite from a
+	thread other than the main thread.
+	"""
+	if tx_metadata_grunt.journal_is_open():
+		tx_metadata_grunt.append_journal_records(journal_records)
+	else:
+		tx_metadata_grunt.set_csv_batch({
+			txhash: tx_metadata_dict2csv({txhash: data}).split("\n")
+			for (txhash, data) in write_buffer.items()
+		}, conn)
+
+def queue_tx_metadata_flush(write_queue, unsaved_block):
+	"""
+	the same as flush_tx_metadata() followed by save_latest_validated_block(),
+	except that the writes are done by the writer stage of the validation
+	pipeline (see tx_metadata_writer()) so that validation can carry on in the
+	meantime. the writer writes everything in the order it is queued here.
+	"""
+	global tx_metadata_write_buffer, tx_metadata_journal_buffer
+
+	# the bloom filter is only ever changed in this thread. it must be saved
+	# before the writer gets to the store (see flush_tx_metadata())
+	if tx_metadata_write_buffer and bloom_grunt.initialized():
+		bloom_grunt.save()
+
+	with tx_metadata_inflight_lock:
+		tx_metadata_inflight_buffers.append(tx_metadata_write_buffer)
+	if not pipeline_grunt.put(write_queue, (
+		tx_metadata_write_buffer, tx_metadata_journal_buffer, unsaved_block
+	)):
+		pipeline_grunt.raise_error()
+	tx_metadata_write_buffer = {}
+	tx_metadata_journal_buffer = []
+
+def tx_metadata_writer(write_queue):
+	"""
+	the writer stage of the validation pipeline. write each queued tx metadata
+	buffer to the store and then save the latest validated block, strictly in
+	order. the buffer stays visible to get_tx_metadata() until it is written.
+	"""
+	conn = tx_metadata_grunt.connect() \
+	if tx_metadata_grunt.backend == "sqlite" else None
+	try:
+		while not pipeline_grunt.stopped():
+			try:
+				item = write_queue.get(timeout = pipeline_grunt.poll_interval)
+			except Queue.Empty:
+				continue
+			start = time.time()
+			(write_buffer, journal_records, unsaved_block) = item
+			if write_buffer:
+				write_tx_metadata(write_buffer, journal_records, conn)
+			if unsaved_block is not None:
+				save_latest_validated_block(*unsaved_block)
+			with tx_metadata_inflight_lock:
+				tx_metadata_inflight_buffers.popleft()
+			pipeline_grunt.record("write", time.time() - start)
+			write_queue.task_done()
+	finally:
+		if conn is not None:
+			conn.close()
+
+def tx_metadata2journal_records(txhash, save_data):
+	"""
+	convert the data passed to save_tx_data_to_disk() into journal records - one
+	create record for each blockhashend_txnum that has a block height, and one
+	spend record for each element of the spending_txs_list that is set
+	"""
+	records = []
+	txid = hex2bin(txhash)
+	for (blockhashend_txnum, data) in save_data.items():
+		(blockhashend, tx_num) = blockhashend_txnum.split("-")
+		blockhashend = hex2bin(blockhashend)
+		tx_num = int(tx_num)
+		spending_txs_list = data.get("spending_txs_list") or []
+		if data.get("block_height") is not None:
+			flags = 0
+			if data.get("is_coinbase"):
+				flags |= tx_metadata_grunt.journal_coinbase_flag
+			if data.get("is_orphan"):
+				flags |= tx_metadata_grunt.journal_orphan_flag
+			records.append((
+				tx_metadata_grunt.journal_create, txid, blockhashend, tx_num,
+				data["block_height"], len(spending_txs_list), flags, "\x00" * 2
+			))
+		for (spendee_index, spender) in enumerate(spending_txs_list):
+			if spender is None:
+				continue
+			(spender_hashstart, spender_txin_index) = spender.split("-")
+			records.append((
+				tx_metadata_grunt.journal_spend, txid, blockhashend, tx_num,
+				spendee_index, int(spender_txin_index), 0,
+				hex2bin(spender_hashstart)
+			))
+	return records
+
+def journal_records2tx_metadata(txhash, records):
+	"""
+	apply the journal records for a single tx hash, in order, and return the
+	result in the format {blockhashend_txnum: {tx data dict}}
+	"""
+	def pad(l, n):
+		return l + [None] * (n - len(l))
+
+	tx_metadata = {}
+	for (
+		kind, txid, blockhashend, tx_num, a, b, flags, spender_hashstart
+	) in records:
+		blockhashend_txnum = "%s-%s" % (bin2hex(blockhashend), tx_num)
+		if kind == tx_metadata_grunt.journal_create:
+			record_data = {
+				"block_height": a,
+				"is_coinbase": 1 if \
+				(flags & tx_metadata_grunt.journal_coinbase_flag) else None,
+				"is_orphan": 1 if \
+				(flags & tx_metadata_grunt.journal_orphan_flag) else None,
+				"spending_txs_list": [None] * b
+			}
+		else:
+			spending_txs_list = [None] * (a + 1)
+			spending_txs_list[a] = "%s-%s" % (bin2hex(spender_hashstart), b)
+			record_data = {"spending_txs_list": spending_txs_list}
+
+		if blockhashend_txnum not in tx_metadata:
+			tx_metadata[blockhashend_txnum] = record_data
+			continue
+
+		# the spend records only know about the txouts up to the one being
+		# spent, so pad the lists to the same length before merging them
+		tx_data = tx_metadata[blockhashend_txnum]
+		n = max(
+			len(tx_data["spending_txs_list"]),
+			len(record_data["spending_txs_list"])
+		)
+		record_data["spending_txs_list"] = merge_spending_txs_lists(
+			txhash, pad(tx_data["spending_txs_list"], n),
+			pad(record_data["spending_txs_list"], n)
+		)
+		tx_data.update(record_data)
+	return tx_metadata
+
+def apply_journal_records(txhash, csv_lines, records):
+	"""
+	apply the journal records on top of the csv lines from the store (or None)
+	and return the result in the format {blockhashend_txnum: {tx data dict}}
+	"""
+	journal_data = journal_records2tx_metadata(txhash, records)
+	if csv_lines is None:
+		return journal_data
+	return merge_tx_metadata(
+		txhash, filter_tx_metadata(tx_metadata_csv2dict(csv_lines), txhash),
+		journal_data
+	)
+
+def fold_journal_records(txhash, csv_lines, records):
+	"""
+	used by the tx metadata compactor to fold journal records into the csv lines
+	from the store. return the new csv lines.
+	"""
+	return tx_metadata_dict2csv({
+		txhash: apply_journal_records(txhash, csv_lines, records)
+	}).split("\n")
 
 def merge_tx_metadata(txhash, old_dict, new_dict):
 	"""update the old dict with data from the new dict"""
@@ -1335,36 +2024,70 @@ def tx_metadata_csv2dict(csv_data):
 
 	return dict_data
 
-def get_tx_metadata_csv(txhash, f_dir = None, f_name = None, hashend = None):
+def get_tx_metadata_csv(txhash):
 	"""
-	given a tx hash (as a hex string), fetch the position data from the
-	tx_metadata dirs. return csv data in a list - one line per item and each
-	item is a csv string.
+	given a tx hash (as a hex string), fetch the metadata from the tx metadata
+	store. return csv data in a list - one line per item and each item is a csv
+	string. return None if the tx hash is not in the store. this can occur when
+	the user spends a transaction which exists within the same block - the
+	transaction will not have been saved yet. not to worry - we just fetch the
+	transaction from ram later on (before moving on to the next block)
 	"""
-	if (
-		(f_dir is None) or
-		(f_name is None) or
-		(hashend is None)
+	return tx_metadata_grunt.get_csv(txhash)
+
+def get_tx_metadata(txhash):
+	"""
+	given a tx hash (as a hex string), return its metadata in the format
+	{blockhashend_txnum: {tx data dict}}, or None if it is not in the store.
+	data in the write buffer (or waiting for the validation pipeline writer)
+	takes precedence over data in the store. if the journal is open then any
+	journal records which have not yet been compacted are applied on top of the
+	data in the store.
+	"""
+	if txhash in tx_metadata_write_buffer:
+		# copy so that the caller cannot alter the buffered data
+		return copy.deepcopy(tx_metadata_write_buffer[txhash])
+
+	# then the buffers waiting for the pipeline writer, newest first. the writer
+	# only drops a buffer once it is in the store.
+	with tx_metadata_inflight_lock:
+		for write_buffer in reversed(tx_metadata_inflight_buffers):
+			if txhash in write_buffer:
+				return copy.deepcopy(write_buffer[txhash])
+
+	# skip the store entirely if the tx hash is definitely not in it
+	if bloom_grunt.initialized() and not bloom_grunt.may_contain(
+		hex2bin(txhash)
 	):
-		(f_dir, f_name, hashend) = hash2dir_and_filename_and_hashend(txhash)
-	prepend_len = 64 - len(hashend)
-	hashstart = txhash[: prepend_len]
-	try:
-		with open(f_name, "r") as f:
-			# get each tx as a list item
-			data = [] # init
-			for line in f:
-				# get rid of the newline if it exists and prepend the first 6
-				# characters of the tx hash to create a complete hash
-				data.append("%s%s" % (hashstart, line.translate(None, "\n\r")))
-	except:
-		# this can occur when the user spends a transaction which exists within
-		# the same block - the transaction will not have been written to the
-		# filesystem yet. not to worry - we just fetch the transaction from ram
-		# later on (before moving on to the next block)
-		data = None
+		return None
 
-	return data
+	# the journal must be read before the store (see get_journal_records())
+	journal_records = None
+	if tx_metadata_grunt.journal_is_open():
+		journal_records = tx_metadata_grunt.get_journal_records(
+			hex2bin(txhash)
+		)
+	csv_data = get_tx_metadata_csv(txhash)
+	if journal_records:
+		return apply_journal_records(txhash, csv_data, journal_records)
+	if csv_data is None:
+		if bloom_grunt.initialized():
+			bloom_grunt.record_false_positive()
+		return None
+	return filter_tx_metadata(tx_metadata_csv2dict(csv_data), txhash)
+
+def init_tx_metadata_bloom():
+	"""
+	load the tx metadata bloom filter from disk. if there is no usable filter on
+	disk for the current store then build a new one from all the tx hashes in
+	the store.
+	"""
+	if not bloom_grunt.init(new_store_id = tx_metadata_grunt.get_store_id()):
+		return
+
+	for txid in tx_metadata_grunt.all_txids():
+		bloom_grunt.add(txid)
+	bloom_grunt.save()
 
 def filter_tx_metadata(txs_metadata, filter_txhash):
 	"""
@@ -1387,7 +2110,12 @@ def mark_spent_txs(parsed_block):
 	mark off all txs that this block spends (in the metadata csv database). note
 	that we should not delete these spent txs because we will need them in
 	future to identify txin addresses and also to identify double-spends.
+
+	return the txouts that were marked as spent as a list of (spendee txid,
+	spendee blockhashend-txnum, spendee txout index), for the undo record of the
+	block (see disconnect_block())
 	"""
+	spends = []
 	for (tx_num, tx) in sorted(parsed_block["tx"].items()):
 		# coinbase txs don't spend previous txs
 		if tx_num == 0:
@@ -1397,10 +2125,14 @@ def mark_spent_txs(parsed_block):
 			spendee_txs_metadata = spender_txin["prev_txs_metadata"]
 			spendee_txhash = bin2hex(spender_txin["hash"])
 			spendee_index = spender_txin["index"]
-			mark_spent_tx(
+			blockhashend_txnum = mark_spent_tx(
 				spendee_txhash, spendee_index, spender_txhash, spender_index,
 				spendee_txs_metadata
 			)
+			spends.append(
+				(spender_txin["hash"], blockhashend_txnum, spendee_index)
+			)
+	return spends
 
 def mark_spent_tx(
 	spendee_txhash, spendee_index, spender_txhash, spender_index,
@@ -1411,6 +2143,8 @@ def mark_spent_tx(
 	later txin index. it should be impossible to overwrite a transaction that
 	has already been spent. but don't worry about this - the lower level
 	functions will handle this.
+
+	return the blockhashend-txnum of the spendee tx that was marked as spent
 	"""
 	# coinbase txs do not spend from any previous tx in the blockchain so these
 	# do not need to be marked off
@@ -1434,13 +2168,22 @@ def mark_spent_tx(
 
 	# now determine which block-hash-end txnum combo we are spending from
 	# (remember txs are not unique so we need to specify the block and tx num
-	# that the spendee tx hash is in). if it already exists then use that one...
+	# that the spendee tx hash is in). nearly all tx hashes are unique, so if
+	# there is only one then use it...
 	use_blockhashend_txnum = None # init
-	for (blockhashend_txnum, spendee_tx_metadata) in \
-	spendee_txs_metadata.items():
-		if spendee_tx_metadata["spending_txs_list"][spendee_index] == \
-		spender_hashstart_index:
-			use_blockhashend_txnum = blockhashend_txnum
+	if (
+		(spendee_txhash not in duplicate_txids) and
+		(len(spendee_txs_metadata) == 1)
+	):
+		use_blockhashend_txnum = spendee_txs_metadata.keys()[0]
+
+	# otherwise if it already exists then use that one...
+	else:
+		for (blockhashend_txnum, spendee_tx_metadata) in \
+		spendee_txs_metadata.items():
+			if spendee_tx_metadata["spending_txs_list"][spendee_index] == \
+			spender_hashstart_index:
+				use_blockhashend_txnum = blockhashend_txnum
 
 	# otherwise use the block-hash-end from the tx with the earliest blockheight
 	# that has not already been spent
@@ -1467,23 +2210,102 @@ def mark_spent_tx(
 		use_blockhashend_txnum: {"spending_txs_list": spender_txs_list}
 	}
 	save_tx_data_to_disk(spendee_txhash, save_data)
+	return use_blockhashend_txnum
 
-def hash2dir_and_filename_and_hashend(hash64 = ""):
+def disconnect_block(block_hash):
 	"""
-	convert a 64 character hash, eg 2ea121e32934b7348445f09f46d03dda69117f2540de
-	16436835db7f032370d0 to a directory structure like base_dir/2e/a1/21.txt
-	the remainder of the hash will be stored within this file
+	undo everything that validating the block (binary hash) wrote to disk, using
+	its undo record - remove the txs it created from the tx metadata, the txout
+	store and the utxo set, mark the txouts it spent as unspent again and put
+	them back in the utxo set. the txouts of any earlier tx with the same txid
+	(see bip30) which the block overwrote are put back in the txout store and
+	the utxo set too. the tx metadata is rewritten in a single batch.
+
+	the block must be the latest validated block, and the tx metadata of all
+	blocks must have been handed to the store already (ie the write queue of the
+	validation pipeline must be empty). return the block height.
 	"""
-	n = 2 # max dirname length
-	hash_elements = [hash64[i: i + n] for i in range(0, 6, n)]
-	#f_dir = "%s%s/" % (tx_metadata_dir, "/".join(hash_elements[: -1]))
-	f_dir = os.path.join(
-		os.path.join(tx_metadata_dir, *hash_elements[: -1]), ""
-	)
-	#f_name = "%s%s.txt" % (f_dir, hash_elements[-1])
-	f_name = os.path.join(f_dir, "%s.txt" % hash_elements[-1])
-	hashend = hash64[6:]
-	return (f_dir, f_name, hashend)
+	undo = undo_grunt.get(block_hash)
+	if undo is None:
+		raise Exception(
+			"cannot disconnect block %s since it has no undo record."
+			" Investigate."
+			% bin2hex(block_hash)
+		)
+	(block_height, created, spends, prior_utxos, overwritten_txouts) = undo
+	with tx_metadata_inflight_lock:
+		if tx_metadata_inflight_buffers:
+			raise Exception(
+				"cannot disconnect block %s while tx metadata is still being"
+				" written" % bin2hex(block_hash)
+			)
+	# disconnect against the store alone - fold the journal into it first
+	flush_tx_metadata()
+	journal_was_open = tx_metadata_grunt.journal_is_open()
+	if journal_was_open:
+		tx_metadata_grunt.close_journal()
+
+	updates = {} # {txhash: {blockhashend_txnum: {tx data dict}}}
+	def get_update(txid):
+		txhash = bin2hex(txid)
+		if txhash not in updates:
+			updates[txhash] = get_tx_metadata(txhash) or {}
+		return updates[txhash]
+
+	for (spendee_txid, blockhashend_txnum, spendee_index) in spends:
+		spendee_tx_metadata = get_update(spendee_txid).get(blockhashend_txnum)
+		if spendee_tx_metadata is not None:
+			spendee_tx_metadata["spending_txs_list"][spendee_index] = None
+
+	# txs which are created and spent within this block are removed entirely
+	blockhashend = bin2hex(block_hash[-2:])
+	for (txid, tx_num, num_txouts) in created:
+		get_update(txid).pop("%s-%s" % (blockhashend, tx_num), None)
+
+	tx_metadata_grunt.set_csv_batch({
+		txhash: tx_metadata_dict2csv({txhash: data}).split("\n") if data else []
+		for (txhash, data) in updates.items()
+	})
+	if journal_was_open:
+		tx_metadata_grunt.open_journal(
+			fold_journal_records, tx_metadata_grunt.journal_file
+		)
+
+	if utxo_grunt.initialized():
+		utxo_grunt.disconnect_block(created, prior_utxos)
+	txout_grunt.remove_txs(created, block_height - 1, overwritten_txouts)
+	txout_grunt.commit()
+	undo_grunt.delete(block_hash)
+	undo_grunt.commit()
+	return block_height
+
+def rollback_to_main_chain():
+	"""
+	disconnect validated blocks, latest first, until the latest validated block
+	is on bitcoind's main chain again (ie after a reorg). each disconnected
+	block becomes a known orphan. the latest validated block on disk and the
+	other state that depends on the tip is updated to match. return the height
+	of the new latest validated block.
+	"""
+	num_disconnected = 0
+	while hex2bin(do_rpc("getblockhash", orphan_grunt.tip_height)) != \
+	orphan_grunt.tip_hash:
+		disconnect_block(orphan_grunt.tip_hash)
+		orphan_grunt.disconnect_tip()
+		num_disconnected += 1
+
+	if num_disconnected:
+		tip_height = orphan_grunt.tip_height
+		save_latest_validated_block(
+			bin2hex(orphan_grunt.tip_hash), tip_height,
+			bin2hex(orphan_grunt.blocks[orphan_grunt.tip_hash][1]),
+			allow_earlier = True
+		)
+		# the orphaned headers and retarget periods are no longer valid
+		header_grunt.truncate(tip_height + 1)
+		retarget_grunt.init()
+
+	return orphan_grunt.tip_height
 
 def get_range_options(options, sanitized = False):
 	"""
@@ -1573,7 +2395,7 @@ def get_range_options(options, sanitized = False):
 			upper_block = temp_upper_block
 
 	if upper_block is None:
-		upper_block = get_info()["blocks"]
+		upper_block = get_latest_block_height()
 
 	if (
 		(lower_block is not None) and
@@ -1985,9 +2807,9 @@ def maybe_fetch_more_blocks(
 
 	return (fetch_more_blocks, active_blockchain, bytes_into_section)
 
-def enforce_ancestor(hash_table, previous_block_hash):
+def enforce_ancestor(block_hash, previous_block_hash):
 	"""die if the block has no ancestor"""
-	if previous_block_hash not in hash_table:
+	if not orphan_grunt.has_block(previous_block_hash):
 		raise Exception(
 			"could not find parent for block with hash %s (parent hash: %s)."
 			" Investigate."
@@ -2043,9 +2865,6 @@ def block_bin2dict(
 		block_arr["version"] = bin2int(little_endian(
 			block[pos: pos + 4]
 		))
-		# debug use only
-		if block_arr["version"] > 2:
-			raise Exception("past block version 2!")
 		required_info.remove("version")
 		if not required_info: # no more info required
 			return block_arr
@@ -2431,9 +3250,12 @@ def tx_bin2dict(
 				correct_blockhashend_txnum = True
 				(prev_txs_metadata, prev_txs) = get_previous_txout(
 					txin_hash, get_prev_tx_methods, correct_blockhashend_txnum,
-					explain_errors
+					explain_errors, txin_index
 				)
-				prev_tx0 = prev_txs.values()[0]
+				# prev_txs is None if the txout store does not have the txout.
+				# if it is in this same block then add_missing_prev_txs() will
+				# fill it in later
+				prev_tx0 = None if prev_txs is None else prev_txs.values()[0]
 
 			if "prev_txs_metadata" in required_info:
 				tx["input"][j]["prev_txs_metadata"] = prev_txs_metadata
@@ -2450,8 +3272,8 @@ def tx_bin2dict(
 				# both previous txs are identical (use the last loop hashend).
 				# note that "txin funds" is a non-existent binary entry in this
 				# tx - it must be obtained from the previous txout.
-				tx["input"][j]["funds"] = prev_tx0["output"][txin_index] \
-				["funds"]
+				tx["input"][j]["funds"] = None if prev_tx0 is None \
+				else prev_tx0["output"][txin_index]["funds"]
 			else:
 				tx["input"][j]["funds"] = None
 
@@ -2609,7 +3431,7 @@ def tx_bin2dict(
 		tx["bytes"] = tx_bytes
 
 	if "tx_hash" in required_info:
-		tx["hash"] = little_endian(sha256(sha256(tx_bytes)))
+		tx["hash"] = little_endian(sha256d(tx_bytes))
 
 	if "tx_size" in required_info:
 		tx["size"] = pos - init_pos
@@ -2669,7 +3491,7 @@ def block_dict2bin(block_arr):
 		tx_bytes = tx_dict2bin(block_arr["tx"][tx_num])
 		res.append(tx_bytes)
 		if calc_merkle_root:
-			tx_hash = little_endian(sha256(sha256(tx_bytes)))
+			tx_hash = little_endian(sha256d(tx_bytes))
 			merkle_leaves.append(tx_hash)
 
 	if calc_merkle_root:
@@ -2726,13 +3548,20 @@ def tx_dict2bin(tx):
 	return "".join(res)
 
 def get_previous_txout(
-	prev_tx_hash, try_methods, correct_blockhashend_txnum, explain_errors
+	prev_tx_hash, try_methods, correct_blockhashend_txnum, explain_errors,
+	txin_index = None
 ):
 	"""
 	get the prev_tx dict, containing only txout data and the tx hash, for the tx
 	with the specified hash, using the methods specified in try_methods (in the
 	given order). currently, the only supported methods are "tx_metadata_dir"
-	and "rpc".
+	(the tx metadata store - see tx_metadata_grunt.py), "txout_store" and
+	"rpc".
+
+	if "txout_store" is one of the methods then the txout data comes only from
+	the local txout store (see txout_grunt.py) and bitcoind is never asked for
+	the previous tx. this is how validation works. if the txout is not in the
+	store then the returned prev_txs is None.
 
 	the returned prev_tx dict is in the format: {
 		"blockhashend-txnum": {tx data dict}
@@ -2749,29 +3578,32 @@ def get_previous_txout(
 	blockhashend-txnum with accurate data then set correct_blockhashend_txnum to
 	true. if correct_blockhashend_txnum is set to false then blockhashend-txnum
 	will be set to None.
+
+	if txin_index is specified and the utxo set is in use then it is consulted
+	before any disk or rpc access. upon a hit the returned prev_tx dict only
+	contains the txout at txin_index.
 	"""
+	if txin_index is not None:
+		utxo_result = get_previous_txout_from_utxo_set(
+			prev_tx_hash, txin_index, explain_errors
+		)
+		if utxo_result is not None:
+			return utxo_result
+
 	prev_txs_metadata = None # init
 
 	for try_method in try_methods:
 		if try_method == "tx_metadata_dir":
 			# attempt to get metadata from the tx_metadata files - contains some
 			# irrelevant hashes (ie not all the same hash)
-			prev_txs_metadata_csv = get_tx_metadata_csv(bin2hex(prev_tx_hash))
-			if prev_txs_metadata_csv is None:
-				continue
-
-			if prev_txs_metadata_csv:
-				# filter out the relevant hash if it exists, if it does not
-				# exist then its either because:
-				# - the tx hash has not yet been saved to disk (it could be in
-				# the block currently being processed), or
-				# - the txhash does not exist (fraudulent tx)
-				# - someone has tampered with the tx metadata file
-				prev_txs_metadata = filter_tx_metadata(
-					tx_metadata_csv2dict(prev_txs_metadata_csv),
-					bin2hex(prev_tx_hash)
-				)
-		elif try_method == "rpc":
+			# if the tx hash is not found then its either because:
+			# - the tx hash has not yet been saved to disk (it could be in
+			# the block currently being processed), or
+			# - the txhash does not exist (fraudulent tx)
+			# - someone has tampered with the tx metadata store
+			prev_txs_metadata = get_tx_metadata(bin2hex(prev_tx_hash))
+		elif try_method in ["txout_store", "rpc"]:
+			# the txout data is fetched below
 			block_hashend_txnum = None
 
 		else:
@@ -2782,6 +3614,11 @@ def get_previous_txout(
 	# now that we have given it our best shot to get the metadata, get the tx
 	# data dict the sam way for all methods
 
+	if "txout_store" in try_methods:
+		return get_previous_txout_from_txout_store(
+			prev_tx_hash, txin_index, prev_txs_metadata, explain_errors
+		)
+
 	# get each previous tx with the specified hash (there might be
 	# more than one per hash as tx hashes are not unique). raises exception if
 	# the tx cannot be found.
@@ -2815,10 +3652,114 @@ def get_previous_txout(
 
 			# though some may be in orphaned blocks, and others may not
 			prev_txs_metadata[block_hashend_txnum]["is_orphan"] = \
-			is_orphan(hex2bin(prev_tx_rpc["blockhash"]))
+			orphan_grunt.is_orphan(hex2bin(prev_tx_rpc["blockhash"]))
+
+	return (prev_txs_metadata, prev_txs)
+
+def get_previous_txout_from_txout_store(
+	prev_tx_hash, txin_index, prev_txs_metadata, explain_errors
+):
+	"""
+	get the (prev_txs_metadata, prev_txs) tuple from the local txout store, in
+	the same format as get_previous_txout(). if txin_index is specified then
+	prev_txs only contains the txout at txin_index. prev_txs is None if the
+	txout(s) cannot be found, eg because the prev tx is in the same block (see
+	add_missing_prev_txs()) or does not exist.
+	"""
+	if txin_index is None:
+		txouts = txout_grunt.get_tx(prev_tx_hash)
+	else:
+		txout = txout_grunt.get(prev_tx_hash, txin_index)
+		txouts = {} if txout is None else {txin_index: txout}
+
+	if not txouts:
+		return (prev_txs_metadata, None)
+
+	prev_tx0 = {
+		"hash": prev_tx_hash,
+		"output": {
+			vout: txout_script2dict(funds, script, explain_errors)
+			for (vout, (funds, script)) in txouts.items()
+		}
+	}
+	if prev_txs_metadata is None:
+		return (None, {None: prev_tx0})
 
+	prev_txs = {} # init
+	for (block_hashend_txnum, prev_tx_metadata) in prev_txs_metadata.items():
+		# all txs with this hash are the same
+		prev_txs[block_hashend_txnum] = prev_tx0
+
+		# though some may be in orphaned blocks, and others may not
+		prev_tx_metadata["is_orphan"] = orphan_grunt.is_orphan_blockhashend(
+			prev_tx_metadata["block_height"],
+			hex2bin(block_hashend_txnum.split("-")[0])
+		)
 	return (prev_txs_metadata, prev_txs)
 
+def get_previous_txout_from_utxo_set(prev_tx_hash, txin_index, explain_errors):
+	"""
+	get the (prev_txs_metadata, prev_txs) tuple for a single txout from the utxo
+	set, in the same format as get_previous_txout(). return None if the utxo set
+	is not in use or the txout is not in it - a miss does not mean the txout has
+	been spent, so the caller must fall back to the other methods.
+	"""
+	utxo = utxo_grunt.get(prev_tx_hash, txin_index)
+	if utxo is None:
+		return None
+
+	blockhashend_txnum = "%s-%s" % (bin2hex(utxo["blockhashend"]), utxo["tx_num"])
+	prev_txs_metadata = {blockhashend_txnum: {
+		"block_height": utxo["block_height"],
+		"is_coinbase": 1 if utxo["is_coinbase"] else None,
+		"is_orphan": orphan_grunt.is_orphan_blockhashend(
+			utxo["block_height"], utxo["blockhashend"]
+		),
+		# the txout is in the utxo set, so it is unspent
+		"spending_txs_list": [None] * (txin_index + 1)
+	}}
+	prev_tx0 = {
+		"hash": prev_tx_hash,
+		"output": {txin_index: txout_script2dict(
+			utxo["funds"], utxo["script"], explain_errors
+		)}
+	}
+	return (prev_txs_metadata, {blockhashend_txnum: prev_tx0})
+
+def txout_script2dict(funds, script, explain_errors = False):
+	"""
+	construct the txout dict for all_txout_info from the funds and script alone,
+	exactly as tx_bin2dict() would have parsed it from the tx bytes
+	"""
+	txout = {
+		"funds": funds,
+		"script_length": len(script),
+		"script": script
+	}
+	script_list = script_bin2list(script, explain_errors)
+	if script_list is False:
+		txout["script_list"] = None
+		txout["parsed_script"] = None
+		txout["script_format"] = None
+		txout["standard_script_pubkey"] = None
+		txout["standard_script_address"] = None
+		return txout
+
+	txout["script_list"] = script_list
+	txout["parsed_script"] = script_list2human_str(script_list)
+	script_format = extract_script_format(script_list, ignore_nops = False)
+	if script_format is None:
+		script_format = "non-standard"
+
+	txout["script_format"] = script_format
+	txout["standard_script_pubkey"] = standard_script2pubkey(
+		script_list, script_format
+	)
+	txout["standard_script_address"] = standard_script2address(
+		script_list, script_format, derive_from_pubkey = False
+	)
+	return txout
+
 def add_missing_prev_txs(parsed_block, required_info):
 	"""
 	if any prev_tx data could not be obtained from the tx_metadata dirs in the
@@ -3556,7 +4497,7 @@ def calculate_tx_change(parsed_tx, tx_num):
 
 def calculate_block_hash(block_bytes):
 	"""calculate the block hash from the first 80 bytes of the block"""
-	return little_endian(sha256(sha256(block_bytes[0: 80])))
+	return little_endian(sha256d(buffer(block_bytes, 0, 80)))
 
 def should_get_non_standard_script_addresses(options, parsed_block):
 	"""
@@ -3604,25 +4545,182 @@ def enforce_valid_block(parsed_block, options):
 			)
 		)
 
-def validate_block(parsed_block, block_1_ago, bugs_and_all, explain = False):
+def get_block_script_jobs(parsed_block, bugs_and_all, explain = False):
 	"""
-	validate everything except the orphan status of the block (this way we can
-	validate before waiting coinbase_maturity blocks to check the orphan status)
+	return (jobs, cached results) for the parsed block. the jobs are the script
+	validation jobs - one per tx, in the format expected by verify_tx_scripts().
+	only txins which validate_tx() would pass to verify_script() are included.
+	the previous txs and their metadata are stripped from the txins, since they
+	are not needed to verify the script and would otherwise need to be copied to
+	the worker processes.
 
-	the *_validation_status determines the types of validations to perform. see
-	the block_header_validation_info variable at the top of this file for the
-	full list of possibilities. for this reason, only parsed blocks can be
-	passed to this function.
+	txins which have already passed verification in the script cache are left
+	out of the jobs. their script eval data is returned in the cached results
+	instead, in the format {tx num: {txin num: script eval data}}.
+	"""
+	jobs = []
+	cached_results = {}
+	script_flags = get_script_flags(
+		parsed_block["timestamp"], parsed_block["version"], bugs_and_all
+	)
+	for (tx_num, tx) in sorted(parsed_block["tx"].items()):
+		if tx_num == 0:
+			continue # coinbase
+		prev_tx0s = {}
+		for (txin_num, txin) in tx["input"].items():
+			if (
+				("checksig_validation_status" in txin) or
+				("sig_pubkey_validation_status" in txin) or
+				("der_signature_validation_status" in txin)
+			) and (txin["prev_txs"] is not None):
+				prev_tx0 = txin["prev_txs"].values()[0]
+				script_eval_data = get_cached_script_eval_data(
+					tx["hash"], txin_num, txin["index"], prev_tx0, script_flags
+				)
+				if script_eval_data is not None:
+					if tx_num not in cached_results:
+						cached_results[tx_num] = {}
+					cached_results[tx_num][txin_num] = script_eval_data
+					continue
+				prev_tx0s[txin_num] = prev_tx0
+		if not prev_tx0s:
+			continue
+		light_tx = tx.copy()
+		light_tx["input"] = {
+			txin_num: {
+				k: v for (k, v) in txin.items()
+				if k not in ["prev_txs", "prev_txs_metadata"]
+			} for (txin_num, txin) in tx["input"].items()
+		}
+		jobs.append((
+			tx_num, light_tx, prev_tx0s, parsed_block["timestamp"],
+			parsed_block["version"], bugs_and_all, explain
+		))
+	return (jobs, cached_results)
 
-	if the explain argument is set then set the *_validation_status element
-	values to human readable strings when there is a failure, otherwise to True.
+def get_script_flags(block_time, block_version, bugs_and_all):
+	"""
+	return the script rules that apply to a block as a bitfield, for the script
+	cache. a script which passes under one set of rules may not pass under
+	another, so a cached result is only reused for the same flags.
+	"""
+	flags = 0
+	if bugs_and_all:
+		flags |= 0x1
+	if block_time >= bip16_switch_time:
+		flags |= 0x2 # p2sh
+	if block_version >= 4:
+		flags |= 0x4 # OP_CHECKLOCKTIMEVERIFY
+	version_from_element = get_version_from_element(
+		"der_signature_validation_status"
+	)
+	if (
+		(version_from_element is not None) and
+		(block_version >= version_from_element)
+	):
+		flags |= 0x8 # strict der signatures
+	return flags
 
-	if the explain argument is not set then set the *_validation_status element
-	values to False when there is a failure otherwise to True.
+def get_cached_script_eval_data(
+	txid, txin_num, spendee_index, prev_tx0, script_flags
+):
+	"""
+	return the script eval data for a txin which has already passed
+	verification under these script flags, or None if it is not in the script
+	cache (or if the script cache is not in use). only the elements which
+	validate_tx() uses are included.
+	"""
+	if not script_cache_grunt.initialized():
+		return None
+	sig_pubkey_statuses = script_cache_grunt.get(
+		txid, txin_num, prev_tx0["output"][spendee_index]["script"],
+		script_flags
+	)
+	if sig_pubkey_statuses is None:
+		return None
+	return {
+		"status": True,
+		"sig_pubkey_statuses": sig_pubkey_statuses,
+		"cached": True
+	}
 
-	if there are any undefined txin addresses then assign these in this function
+def verify_tx_scripts(job):
+	"""
+	run verify_script() on each txin of a job from get_block_script_jobs(). this
+	runs in the script validation worker processes of the validation pipeline.
+	return (tx num, {txin num: script eval data}, seconds taken, instrumentation
+	counters). the script eval data is None when verify_script() raises -
+	validate_tx() then runs it again itself to report the error. the
+	instrumentation counters are from take_worker_counters().
+	"""
+	start = time.time()
+	(
+		tx_num, tx, prev_tx0s, block_time, block_version, bugs_and_all, explain
+	) = job
+	results = {}
+	for (txin_num, prev_tx0) in prev_tx0s.items():
+		try:
+			skip_checksig = False
+			results[txin_num] = verify_script(
+				block_time, tx, txin_num, prev_tx0, block_version,
+				skip_checksig, bugs_and_all, explain
+			)
+		except Exception:
+			results[txin_num] = None
+	return (tx_num, results, time.time() - start, take_worker_counters())
 
-	based on https://en.bitcoin.it/wiki/Protocol_rules
+def take_worker_counters():
+	"""
+	return the validation rule counters (see instrumentation_grunt) and the
+	hashed bytes counters recorded in this worker process since the last call,
+	and reset them. return None if neither instrumentation is on.
+	"""
+	if not (instrumentation_grunt.enabled or hash_instrumentation):
+		return None
+	counters = {
+		"rules": instrumentation_grunt.take_block_counters() \
+		if instrumentation_grunt.enabled else {},
+		"hashed_bytes": hashed_bytes_per_caller
+	}
+	reset_hash_instrumentation()
+	return counters
+
+def merge_worker_counters(counters):
+	"""add the counters from take_worker_counters() in a worker process"""
+	if counters is None:
+		return
+	if counters["rules"]:
+		instrumentation_grunt.merge(counters["rules"])
+	for (caller, hashes) in counters["hashed_bytes"].items():
+		if caller not in hashed_bytes_per_caller:
+			hashed_bytes_per_caller[caller] = {}
+		for (hash_name, num_bytes) in hashes.items():
+			hashed_bytes_per_caller[caller][hash_name] = num_bytes + \
+			hashed_bytes_per_caller[caller].get(hash_name, 0)
+
+def get_block_script_results(pending_results, cached_results):
+	"""
+	wait for the script validation jobs of a block to finish. return the script
+	eval data in the format {tx num: {txin num: script eval data}} for
+	validate_block(), merged with the cached results from
+	get_block_script_jobs(). pending_results is None if there were no jobs.
+	"""
+	script_results = cached_results
+	if pending_results is None:
+		return script_results
+	for (tx_num, results, seconds, counters) in pending_results.get():
+		if tx_num not in script_results:
+			script_results[tx_num] = {}
+		script_results[tx_num].update(results)
+		pipeline_grunt.record("scripts", seconds, len(results))
+		merge_worker_counters(counters)
+	return script_results
+
+def validate_block_header(parsed_block, block_1_ago, explain = False):
+	"""
+	validate everything in the block that does not involve the txs. this is all
+	that can be validated when the block was parsed from its header alone. see
+	validate_block() for the meaning of the *_validation_status elements.
 	"""
 	# make sure the block is smaller than the permitted maximum
 	if "block_size_validation_status" in parsed_block:
@@ -3655,26 +4753,62 @@ def validate_block(parsed_block, block_1_ago, bugs_and_all, explain = False):
 		parsed_block["difficulty_validation_status"] = valid_difficulty(
 			parsed_block, explain
 		)
+	return parsed_block
+
+def validate_block(
+	parsed_block, block_1_ago, bugs_and_all, explain = False,
+	script_results = None
+):
+	"""
+	validate everything except the orphan status of the block (this way we can
+	validate before waiting coinbase_maturity blocks to check the orphan status)
+
+	the *_validation_status determines the types of validations to perform. see
+	the block_header_validation_info variable at the top of this file for the
+	full list of possibilities. for this reason, only parsed blocks can be
+	passed to this function.
+
+	if the explain argument is set then set the *_validation_status element
+	values to human readable strings when there is a failure, otherwise to True.
+
+	if the explain argument is not set then set the *_validation_status element
+	values to False when there is a failure otherwise to True.
+
+	if there are any undefined txin addresses then assign these in this function
+
+	script_results are the precomputed verify_script() results from
+	get_block_script_results(). scripts which are not in there are verified
+	here.
+
+	based on https://en.bitcoin.it/wiki/Protocol_rules
+	"""
+	parsed_block = validate_block_header(parsed_block, block_1_ago, explain)
 	# use this var to keep track of txs that have been spent within this very
 	# block. we don't want to mark any txs as spent until we know that the whole
 	# block is valid (ie that the funds are permitted to be spent). it is in the
-	# format {spendee_hash: [spendee_index, spender_hash,  spender_index]}
+	# format {(spendee_hash, spendee_index): [spender_hash, spender_index]}
 	spent_txs = {}
 
-	for (tx_num, tx) in sorted(parsed_block["tx"].items()):
-		(parsed_block["tx"][tx_num], spent_txs) = validate_tx(
-			tx, tx_num, spent_txs, parsed_block["block_height"],
-			parsed_block["timestamp"], parsed_block["version"], bugs_and_all,
-			explain
-		)
+	# validate the txs level by level. the txs within a level do not depend on
+	# each other, so their order within the level does not matter
+	levels = txgraph_grunt.get_levels(
+		txgraph_grunt.build_block_dependency_graph(parsed_block)
+	)
+	txgraph_grunt.record(levels)
+	for level in levels:
+		for tx_num in level:
+			(parsed_block["tx"][tx_num], spent_txs) = validate_tx(
+				parsed_block["tx"][tx_num], tx_num, spent_txs,
+				parsed_block["block_height"], parsed_block["timestamp"],
+				parsed_block["version"], bugs_and_all, explain,
+				None if script_results is None else script_results.get(tx_num)
+			)
 	return parsed_block
 
 def validate_tx(
 	tx, tx_num, spent_txs, block_height, block_time, block_version,
-	bugs_and_all, explain = False
+	bugs_and_all, explain = False, script_results = None
 ):
-	# TODO - quick validation for scripts with one checksig (non-multi) that we
-	# have already validated previously
 	"""
 	the *_validation_status determines the types of validations to perform. see
 	the all_tx_validation_info variable at the top of this file for the full
@@ -3687,6 +4821,11 @@ def validate_tx(
 	if the explain argument is not set then set the *_validation_status element
 	values to False when there is a failure otherwise to True.
 
+	script_results is the precomputed verify_script() data for this tx in the
+	format {txin num: script eval data}, if any. txin scripts which are not in
+	there are looked up in the script cache before being verified, and those
+	which pass are added to it.
+
 	based on https://en.bitcoin.it/wiki/Protocol_rules
 	"""
 	txins_exist = False # init
@@ -3735,9 +4874,9 @@ def validate_tx(
 		else:
 			spendee_txs_metadata = None
 
+		# prev_txs is None if the tx being spent could not be found
 		prev_txs = txin["prev_txs"]
-		hashend_txnum0 = prev_txs.keys()[0]
-		prev_tx0 = prev_txs[hashend_txnum0]
+		prev_tx0 = None if prev_txs is None else prev_txs.values()[0]
 
 		if "hash_validation_status" in txin:
 			# check if each transaction (hash) being spent actually exists. use
@@ -3828,17 +4967,28 @@ def validate_tx(
 			("sig_pubkey_validation_status" in txin) or
 			("der_signature_validation_status" in txin)
 		):
-			try:
-				skip_checksig = False
-				script_eval_data = verify_script(
-					block_time, tx, txin_num, prev_tx0, block_version,
-					skip_checksig, bugs_and_all, explain
-				)
-			except:
-				raise Exception(
-					"failed to validate script for txin %d in tx %d (hash %s)"
-					% (txin_num, tx_num, bin2hex(tx["hash"]))
+			# use the result from the script validation workers or the script
+			# cache if there is one
+			script_eval_data = None # init
+			if script_results is not None:
+				script_eval_data = script_results.get(txin_num)
+			if script_eval_data is None:
+				script_eval_data = get_cached_script_eval_data(
+					tx["hash"], txin_num, spendee_index, prev_tx0,
+					get_script_flags(block_time, block_version, bugs_and_all)
 				)
+			if script_eval_data is None:
+				try:
+					skip_checksig = False
+					script_eval_data = verify_script(
+						block_time, tx, txin_num, prev_tx0, block_version,
+						skip_checksig, bugs_and_all, explain
+					)
+				except:
+					raise Exception(
+						"failed to validate script for txin %d in tx %d (hash"
+						" %s)" % (txin_num, tx_num, bin2hex(tx["hash"]))
+					)
 		if "checksig_validation_status" in txin:
 			txin["checksig_validation_status"] = script_eval_data["status"]
 
@@ -3854,8 +5004,13 @@ def validate_tx(
 				(version_from_element is not None) and
 				(block_version >= version_from_element)
 			):
-				txin["der_signature_validation_status"] = \
-				validate_all_der_signatures(script_eval_data["signatures"])
+				# cached scripts only passed if their signatures were der
+				txin["der_signature_validation_status"] = True \
+				if script_eval_data.get("cached") else \
+				validate_all_der_signatures(
+					script_eval_data["signatures"],
+					parsed_signatures = script_eval_data["parsed_signatures"]
+				)
 
 				if txin["der_signature_validation_status"] is not True:
 					# merge the results back into the tx return var
@@ -3872,10 +5027,43 @@ def validate_tx(
 			tx["input"][txin_num] = txin
 			continue
 
+		if (
+			(
+				("checksig_validation_status" in txin) or
+				("sig_pubkey_validation_status" in txin) or
+				("der_signature_validation_status" in txin)
+			) and
+			script_cache_grunt.initialized() and
+			not script_eval_data.get("cached")
+		):
+			# the script passed, so there is no need to verify it again
+			script_cache_grunt.add(
+				tx["hash"], txin_num,
+				prev_tx0["output"][spendee_index]["script"],
+				get_script_flags(block_time, block_version, bugs_and_all),
+				script_eval_data["sig_pubkey_statuses"]
+			)
+
 		if "mature_coinbase_spend_validation_status" in txin:
 			# if a coinbase transaction is being spent then make sure it has
-			# already reached maturity. do this for all previous txs
-			if spendee_txs_metadata is not None:
+			# already reached maturity. the coinbase maturity index has all the
+			# immature coinbase txs, so use it if it is available
+			if maturity_grunt.initialized():
+				coinbase_height = maturity_grunt.get_height(spendee_hash)
+				status = valid_mature_coinbase_spend(
+					block_height, {"is_coinbase": None}
+					if coinbase_height is None else
+					{"is_coinbase": 1, "block_height": coinbase_height},
+					explain
+				)
+				txin["mature_coinbase_spend_validation_status"] = status
+				if status is not True:
+					# merge the results back into the tx return var
+					tx["input"][txin_num] = txin
+					continue
+
+			# otherwise do this for all previous txs
+			elif spendee_txs_metadata is not None:
 				any_immature = False
 				for (hashend_txnum, spendee_tx_metadata) in \
 				spendee_txs_metadata.items():
@@ -3899,8 +5087,9 @@ def validate_tx(
 		# merge the results back into the tx return var
 		tx["input"][txin_num] = txin
 
-		# format {spendee_hash: [spendee_index, spender_hash,  spender_index]}
-		spent_txs[spendee_hash] = [spendee_index, tx["hash"], txin_num]
+		record_same_block_spend(
+			spent_txs, spendee_hash, spendee_index, tx["hash"], txin_num
+		)
 
 		# end of txins for-loop
 
@@ -4076,6 +5265,31 @@ def valid_merkle_tree(block, explain = False):
 		else:
 			return False
 
+def valid_merkle_branch(
+	tx_hash, merkle_branch, tx_num, merkle_root, explain = False
+):
+	"""
+	return True if the merkle branch proves that the tx (at position tx_num) is
+	included in the block with the given merkle root. all hashes are in little
+	endian. if the branch is not valid then either return False if the explain
+	argument is not set, otherwise return a human readable string with an
+	explanation of the failure.
+	"""
+	calculated_merkle_root = merkle_branch2root(tx_hash, merkle_branch, tx_num)
+	if calculated_merkle_root == merkle_root:
+		return True
+	else:
+		if explain:
+			return "bad merkle branch. the merkle root calculated from tx %s" \
+			" (tx number %s) and its merkle branch is %s, but the block" \
+			" header claims the merkle root is %s." \
+			% (
+				bin2hex(tx_hash), tx_num, bin2hex(calculated_merkle_root),
+				bin2hex(merkle_root)
+			)
+		else:
+			return False
+
 def valid_bits(block, block_1_ago, explain = False):
 	"""
 	return True if the block bits matches that derived from the block height and
@@ -4129,10 +5343,11 @@ def valid_bits(block, block_1_ago, explain = False):
 				return False
 	else:
 		# block height is a multiple of 2016 - recalculate
-		block_2016_ago = get_block(parsed_block["block_height"] - 2016, "json")
+		(bits_2016_ago, timestamp_2016_ago) = get_retarget_start(
+			parsed_block["block_height"]
+		)
 		calculated_bits = calc_new_bits(
-			hex2bin(block_2016_ago["bits"]), block_2016_ago["time"],
-			block_1_ago["timestamp"]
+			bits_2016_ago, timestamp_2016_ago, block_1_ago["timestamp"]
 		)
 		if calculated_bits != parsed_block["bits"]:
 			if explain:
@@ -4149,6 +5364,36 @@ def valid_bits(block, block_1_ago, explain = False):
 	# if we get here then all "bits" were correct
 	return True
 
+def get_retarget_start(block_height):
+	"""
+	return (bits, timestamp) for the block 2016 blocks before block_height (the
+	first block of the previous retarget period). during validation this block
+	is always in the retarget period cache, unless validation has only just
+	resumed without a snapshot.
+	"""
+	start_height = block_height - 2016
+	retarget_start = retarget_grunt.get(start_height)
+	if retarget_start is None:
+		retarget_start = get_bits_data(start_height)
+		retarget_grunt.update(start_height, *retarget_start)
+
+	return retarget_start
+
+def get_bits_data(block_height):
+	"""
+	return (bits, timestamp) for the block at the given height. get these from
+	the trusted header chain if it has the block, otherwise from bitcoind.
+	"""
+	header = header_grunt.get(block_height)
+	if header is not None:
+		parsed_header = block_bin2dict(
+			header, block_height, ["timestamp", "bits"], None
+		)
+		return (parsed_header["bits"], parsed_header["timestamp"])
+
+	block = get_block(block_height, "json")
+	return (hex2bin(block["bits"]), block["time"])
+
 def valid_difficulty(block, explain = False):
 	if isinstance(block, dict):
 		parsed_block = block
@@ -4335,6 +5580,16 @@ def valid_txin_index(txin_index, prev_tx, get_prev_tx_methods, explain = False):
 		else:
 			return False
 
+def record_same_block_spend(
+	same_block_spent_txs, spendee_hash, spendee_index, tx_hash, txin_num
+):
+	"""
+	record that the txout has been spent within the block being validated, for
+	valid_tx_spend(). every txout is recorded separately, so that another spend
+	of the same previous tx does not hide a doublespend of this txout.
+	"""
+	same_block_spent_txs[(spendee_hash, spendee_index)] = [tx_hash, txin_num]
+
 def valid_tx_spend(
 	spendee_tx_metadata, spendee_hash, spendee_index, tx_hash, txin_num,
 	same_block_spent_txs, explain = False
@@ -4346,9 +5601,8 @@ def valid_tx_spend(
 	otherwise return a human readable string with an explanation of the failure.
 
 	note that same_block_spent_txs is a dict in the format
-	{spendee_hash: [
-		spendee_index, spender_hash, spender_txin_index
-	]}
+	{(spendee_hash, spendee_index): [spender_hash, spender_txin_index]} - see
+	record_same_block_spend()
 	"""
 	try:
 		# use 'try' because this value might be None, or might be malformed
@@ -4385,12 +5639,9 @@ def valid_tx_spend(
 			return False
 
 	# check if it is a doublespend from this same block
-	if (
-		(spendee_hash in same_block_spent_txs) and
-		(same_block_spent_txs[spendee_hash][0] == spendee_index)
-	):
-		spender_txhash = same_block_spent_txs[spendee_hash][1]
-		spender_txin_index = same_block_spent_txs[spendee_hash][2]
+	if (spendee_hash, spendee_index) in same_block_spent_txs:
+		(spender_txhash, spender_txin_index) = \
+		same_block_spent_txs[(spendee_hash, spendee_index)]
 		if explain:
 			return error_text \
 			% (
@@ -4459,13 +5710,19 @@ def valid_address_checksum(address, explain = False):
 			return False
 
 	# decode from base 58 into bytes
-	address_bytes = base58decode(address)
+	try:
+		address_bytes = base58decode(address)
+	except ValueError:
+		if explain:
+			return "address %s is not base58 encoded" % address
+		else:
+			return False
 
 	# the checksum is the last 4 bytes of the address
 	checksum = address_bytes[-4:]
 
 	# the remaining bytes must hash to 
-	expected_checksum = sha256(sha256(address_bytes[: -4]))[: 4]
+	expected_checksum = sha256d(address_bytes[: -4])[: 4]
 
 	if expected_checksum == checksum:
 		return True
@@ -4477,6 +5734,15 @@ def valid_address_checksum(address, explain = False):
 		else:
 			return False
 
+def valid_address_checksum_batch(addresses):
+	"""
+	check the checksums for a list of base58 encoded addresses. the output is a
+	list of True/False values in the same order as the input addresses.
+	"""
+	return [
+		payload is not None for payload in base58check_decode_batch(addresses)
+	]
+
 def valid_tx_balance(tx, explain = False):
 	"""make sure the output funds are not larger than the input funds"""
 	total_txout_funds = sum(txout["funds"] for txout in tx["output"].values())
@@ -4515,13 +5781,21 @@ def valid_txouts_exist(txouts_exist, explain = False):
 		else:
 			return False
 
-def validate_all_der_signatures(signatures, explain = False):
+def validate_all_der_signatures(
+	signatures, explain = False, parsed_signatures = None
+):
 	"""
 	loop through the list of all signatures and validate the der encoding.
+	parsed_signatures is the optional output of parse_signature() for each
+	signature, in the format {signature: parsed signature dict}. signatures
+	which have already been parsed are not parsed again.
 	"""
+	if parsed_signatures is None:
+		parsed_signatures = {}
 	res_all = [
-		valid_der_signature(signature, explain)	for signature in \
-		signatures
+		parsed_signatures[signature]["der_status"] if signature in \
+		parsed_signatures else valid_der_signature(signature, explain) \
+		for signature in signatures
 	]
 	all_ok = True
 	for res in res_all:
@@ -4645,7 +5919,7 @@ def prelim_checksig_setup(tx, on_txin_num, prev_tx, explain = False):
 
 def valid_checksig(
 	wiped_tx, on_txin_num, subscript_list, pubkey, signature, bugs_and_all,
-	txin_block_height, explain = False
+	txin_block_height, explain = False, parsed_signature = None
 ):
 	"""
 	return True if the checksig for this txin passes. if it fails then either
@@ -4655,6 +5929,10 @@ def valid_checksig(
 	note that wiped_tx should have absolutely all input scripts set to "" and
 	their lengths set to 0 as it is input to this function.
 
+	parsed_signature is the optional output of parse_signature() for this
+	signature. if it is der encoded then its r and s values are used directly
+	rather than decoding the signature again.
+
 	http://bitcoin.stackexchange.com/questions/8500
 	https://bitcoin.org/en/developer-guide#signature-hash-types
 	"""
@@ -4694,10 +5972,16 @@ def valid_checksig(
 
 	pybitcointools_error_str = ""
 	try:
-		res2 = pybitcointools.ecdsa_raw_verify(
-			tx_hash, pybitcointools.der_decode_sig(bin2hex(signature)),
-			bin2hex(pubkey)
-		)
+		if (
+			(parsed_signature is not None) and
+			(parsed_signature["der_status"] is True)
+		):
+			vrs = (None, parsed_signature["r"], parsed_signature["s"])
+		else:
+			# signatures which are not strictly der encoded exist in the
+			# blockchain, so fall back to the lenient decoder for these
+			vrs = pybitcointools.der_decode_sig(bin2hex(signature))
+		res2 = pybitcointools.ecdsa_raw_verify(tx_hash, vrs, bin2hex(pubkey))
 	except Exception as e:
 		# we might get an exception if a pubkey is in an unrecognized format,
 		# for example
@@ -4799,7 +6083,7 @@ def sighash(semi_wiped_tx, on_txin_num, hashtype_int):
 		semi_wiped_tx["input"][0] = backup_txin
 
 	hashtype_bin = little_endian(int2bin(hashtype_int, 4))
-	txhash = sha256(sha256("%s%s" % (tx_dict2bin(semi_wiped_tx), hashtype_bin)))
+	txhash = sha256d(tx_dict2bin(semi_wiped_tx), hashtype_bin)
 	return {
 		"status": True,
 		"value": txhash,
@@ -4823,8 +6107,10 @@ def check_pubkey_encoding(pubkey, explain = False):
 		else:
 			return False
 
+	prefix = ord(pubkey[0])
+
 	# uncompressed pubkeys start with 04
-	if bin2int(pubkey[0]) == 0x04:
+	if prefix == 0x04:
 		if len(pubkey) != 65:
 			if explain:
 				return "uncompressed pubkeys should be 65 bytes, this one" \
@@ -4834,8 +6120,8 @@ def check_pubkey_encoding(pubkey, explain = False):
 				return False
 	# compressed pubkeys start with 02 or 03
 	elif (
-		(bin2int(pubkey[0]) == 0x02) or
-		(bin2int(pubkey[0]) == 0x03)
+		(prefix == 0x02) or
+		(prefix == 0x03)
 	):
 		if len(pubkey) != 33:
 			if explain:
@@ -4865,28 +6151,7 @@ def check_signature_encoding(signature, explain = False):
 	the blockchain will become unverifiable by some miners and they will fork
 	the network.
 	"""
-	if len(signature) == 0:
-		# empty signature. not strictly der encoded, but allowed to provide a
-		# compact way to provide an invalid signature for use in CHECK(MULTI)SIG
-		return True
-	# same as IsValidSignatureEncoding() in satoshi source
-	res = valid_der_signature(signature, explain)
-	if res is not True:
-		return res
-
-	# is_low_der_signature() needs to know valid_der_signature()'s results
-	# same as IsLowDERSignature() in satoshi source
-	res = is_low_der_signature(signature, res, explain)
-	if res is not True:
-		return res
-
-	# same as IsDefinedHashtypeSignature() in satoshi source
-	res = is_defined_hashtype_signature(signature, explain)
-	if res is not True:
-		return res
-
-	# if we get here then the signature encoding is correct
-	return True
+	return parse_signature(signature, explain)["status"]
 
 # hashtype codes from script/interpreter.h
 SIGHASH_ALL = 1
@@ -4906,7 +6171,7 @@ def is_defined_hashtype_signature(signature, explain = False):
 			return False
 
 	# first remove the SIGHASH_ANYONECANPAY bit
-	hashtype = bin2int(signature[-1]) & ~SIGHASH_ANYONECANPAY
+	hashtype = ord(signature[-1]) & ~SIGHASH_ANYONECANPAY
 	if (
 		(hashtype < SIGHASH_ALL) or
 		(hashtype > SIGHASH_SINGLE)
@@ -4930,7 +6195,14 @@ def valid_der_signature(signature, explain = False):
 	which would fail these checks (yet still correctly validate tx hashes in
 	certain versions of openssl)
 
-	this function basically makes sure that the signature is in the format:
+	see parse_der_signature() for the format of a der signature.
+	"""
+	return parse_der_signature(signature, explain)[0]
+
+def parse_der_signature(signature, explain = False):
+	"""
+	walk the signature bytes once and make sure that the signature is in the
+	format:
 
 	- 0x30 - constant placeholder 1
 	- alleged signature length - 1 byte (the length of the following bytes, not
@@ -4945,173 +6217,210 @@ def valid_der_signature(signature, explain = False):
 
 	negative r or s are encoded with 0080... ie a leading null byte and the msb
 	in byte 2 set
+
+	return a tuple in the format (status, r_length, s_length). status is the
+	same as the return value of valid_der_signature(). r starts at byte 4 and s
+	starts at byte r_length + 6. if the status is not True then r_length and
+	s_length are None.
 	"""
-	human_signature = bin2hex(signature)
-	signature_length = len(signature)
-
-	placeholder_1 = 0 # init
-	alleged_signature_length = 0 # init
-	placeholder_2 = 0 # init
-	r_length = 0 # init
-	r = "" # init
-	placeholder_3 = 0 # init
-	s_length = 0 # init
-	s = "" # init
-	sighash = 0 # init
-	try:
-		placeholder_1 = bin2int(signature[0])
-		alleged_signature_length = bin2int(signature[1])
-		placeholder_2 = bin2int(signature[2])
-		r_length = bin2int(signature[3])
-		signature = signature[4:] # chop off what we have extracted
-		r = signature[: r_length]
-		signature = signature[r_length:] # chop off what we have extracted
-		placeholder_3 = bin2int(signature[0])
-		s_length = bin2int(signature[1])
-		signature = signature[2:] # chop off what we have extracted
-		s = signature[: s_length]
-		signature = signature[s_length:] # chop off what we have extracted
-		sighash = signature[0]
-	except:
-		pass
+	def set_error(status):
+		return ((status if explain else False), None, None)
+
+	sig = bytearray(signature)
+	signature_length = len(sig)
 
 	# minimum and maximum size constraints
 	if signature_length < 9:
-		if explain:
-			return "error: signature %s is too short (min length is 9 bytes" \
-			" but this is %s bytes)" \
-			% (human_signature, signature_length)
-		else:
-			return False
+		return set_error(
+			"error: signature %s is too short (min length is 9 bytes"
+			" but this is %s bytes)" % (bin2hex(signature), signature_length)
+		)
 
 	if signature_length > 73:
-		if explain:
-			return "error: signature %s is too long (max length is 73 bytes" \
-			" but this is %s bytes)" \
-			% (human_signature, signature_length)
-		else:
-			return False
+		return set_error(
+			"error: signature %s is too long (max length is 73 bytes"
+			" but this is %s bytes)" % (bin2hex(signature), signature_length)
+		)
 
 	# a signature is of type 0x30 (compound)
-	if placeholder_1 != 0x30:
-		if explain:
-			return "error: the first placeholder in signature %s should be %s" \
-			" but it is %s" \
-			% (human_signature, int2hex(0x30), int2hex(placeholder_1))
-		else:
-			return False
+	if sig[0] != 0x30:
+		return set_error(
+			"error: the first placeholder in signature %s should be %s"
+			" but it is %s"
+			% (bin2hex(signature), int2hex(0x30), int2hex(sig[0]))
+		)
 
 	# make sure the length covers the entire signature
-	if alleged_signature_length != (signature_length - 3):
-		if explain:
-			return "error: signature %s claims to be %s bytes (0x%s + 3), but" \
-			" it is really %s bytes" \
+	if sig[1] != (signature_length - 3):
+		return set_error(
+			"error: signature %s claims to be %s bytes (0x%s + 3), but"
+			" it is really %s bytes"
 			% (
-				human_signature, alleged_signature_length + 3,
-				int2hex(alleged_signature_length), signature_length
+				bin2hex(signature), sig[1] + 3, int2hex(sig[1]),
+				signature_length
 			)
-		else:
-			return False
+		)
 
 	# make sure the length of the s element is still inside the signature
+	r_length = sig[3]
 	if (r_length + 5) >= signature_length:
-		if explain:
-			return "error: signature %s has an incorrect r-length of %s given" \
-			" its actual length of %s" \
-			% (human_signature, r_length, signature_length)
-		else:
-			return False
+		return set_error(
+			"error: signature %s has an incorrect r-length of %s given"
+			" its actual length of %s"
+			% (bin2hex(signature), r_length, signature_length)
+		)
 
 	# verify that the length of the signature matches the sum of the length of
 	# the elements
+	s_length = sig[r_length + 5]
 	if (r_length + s_length + 7) != signature_length:
-		if explain:
-			return "error: signature %s has incorrect r-length of %s or an" \
-			" incorrect s-length of %s for its actual length %s" \
-			% (human_signature, r_length, s_length, signature_length)
-		else:
-			return False
+		return set_error(
+			"error: signature %s has incorrect r-length of %s or an"
+			" incorrect s-length of %s for its actual length %s"
+			% (bin2hex(signature), r_length, s_length, signature_length)
+		)
 
 	# check whether the r element is an integer
-	if placeholder_2 != 0x02:
-		if explain:
-			return "error: the second placeholder in signature %s should be" \
-			" %s but it is %s" \
-			% (human_signature, int2hex(0x02), int2hex(placeholder_2))
-		else:
-			return False
+	if sig[2] != 0x02:
+		return set_error(
+			"error: the second placeholder in signature %s should be"
+			" %s but it is %s"
+			% (bin2hex(signature), int2hex(0x02), int2hex(sig[2]))
+		)
 
 	# zero-length integers are not allowed for r
 	if r_length == 0:
-		if explain:
-			return "error: signature %s has r-length = 0" \
-			% (human_signature)
-		else:
-			return False
+		return set_error(
+			"error: signature %s has r-length = 0"
+			% bin2hex(signature)
+		)
 
 	# negative numbers are not allowed for r
-	if bin2int(r[0]) & 0x80:
-		if explain:
-			return "error: signature %s has a negative r (it starts with %s)" \
-			% (human_signature, bin2hex(r[0]))
-		else:
-			return False
+	if sig[4] & 0x80:
+		return set_error(
+			"error: signature %s has a negative r (it starts with %s)"
+			% (bin2hex(signature), int2hex(sig[4]))
+		)
 
 	# null bytes at the start of r are not allowed, unless r would otherwise
 	# falsely be interpreted as a negative number
 	if (
 		(r_length > 1) and
-		(bin2int(r[0]) == 0x00) and
-		not (bin2int(r[1]) & 0x80)
+		(sig[4] == 0x00) and
+		not (sig[5] & 0x80)
 	):
-		if explain:
-			return "error: signature %s has null bytes at the start of r and" \
-			" r would not otherwise be falsely interpreted as negative: %s" \
-			% (human_signature, bin2hex(r))
-		else:
-			return False
+		return set_error(
+			"error: signature %s has null bytes at the start of r and"
+			" r would not otherwise be falsely interpreted as negative: %s"
+			% (bin2hex(signature), bin2hex(signature[4: 4 + r_length]))
+		)
 
 	# check whether the s element is an integer
-	if placeholder_3 != 0x02:
-		if explain:
-			return "error: the third placeholder in signature %s should be" \
-			" %s but it is %s" \
-			% (human_signature, int2hex(0x02), int2hex(placeholder_3))
-		else:
-			return False
+	s_start = r_length + 6
+	if sig[r_length + 4] != 0x02:
+		return set_error(
+			"error: the third placeholder in signature %s should be"
+			" %s but it is %s"
+			% (bin2hex(signature), int2hex(0x02), int2hex(sig[r_length + 4]))
+		)
 
 	# zero-length integers are not allowed for s
 	if s_length == 0:
-		if explain:
-			return "error: signature %s has s-length = 0" \
-			% (human_signature)
-		else:
-			return False
+		return set_error(
+			"error: signature %s has s-length = 0"
+			% bin2hex(signature)
+		)
 
 	# negative numbers are not allowed for s
-	if bin2int(s[0]) & 0x80:
-		if explain:
-			return "error: signature %s has a negative s (it starts with %s)" \
-			% (human_signature, bin2hex(s[0]))
-		else:
-			return False
+	if sig[s_start] & 0x80:
+		return set_error(
+			"error: signature %s has a negative s (it starts with %s)"
+			% (bin2hex(signature), int2hex(sig[s_start]))
+		)
 
 	# null bytes at the start of s are not allowed, unless s would otherwise
 	# falsely be interpreted as a negative number
 	if (
 		(s_length > 1) and
-		(bin2int(s[0]) == 0x00) and
-		not (bin2int(s[1]) & 0x80)
+		(sig[s_start] == 0x00) and
+		not (sig[s_start + 1] & 0x80)
 	):
-		if explain:
-			return "error: signature %s has null bytes at the start of s and" \
-			" s would not otherwise be falsely interpreted as negative: %s" \
-			% (human_signature, bin2hex(s))
-		else:
-			return False
+		return set_error(
+			"error: signature %s has null bytes at the start of s and"
+			" s would not otherwise be falsely interpreted as negative: %s"
+			% (
+				bin2hex(signature),
+				bin2hex(signature[s_start: s_start + s_length])
+			)
+		)
 
 	# if we get here then everything is ok with the signature
-	return True
+	return (True, r_length, s_length)
+
+def parse_signature(signature, explain = False):
+	"""
+	parse the signature (bytes, including the final hashtype byte) once and
+	answer all the encoding questions about it. return a dict in the format: {
+		"status": same as CheckSignatureEncoding() in the satoshi source,
+		"der_status": same as valid_der_signature(),
+		"low_s_status": same as is_low_der_signature(),
+		"defined_hashtype_status": same as is_defined_hashtype_signature(),
+		"r": r as an int, or None if the signature is not der encoded,
+		"s": s as an int, or None if the signature is not der encoded,
+		"hashtype": the final byte of the signature as an int, or None
+	}
+	each status is either True, False or (if the explain argument is set) a
+	human readable string explaining the failure. r and s can be passed straight
+	to valid_checksig() so that the signature does not need to be decoded again.
+	"""
+	(der_status, r_length, s_length) = parse_der_signature(signature, explain)
+	parsed = {
+		"status": None, # init
+		"der_status": der_status,
+		"low_s_status": None, # init
+		"defined_hashtype_status": \
+		is_defined_hashtype_signature(signature, explain),
+
+		"r": None, # init
+		"s": None, # init
+		"hashtype": ord(signature[-1]) if len(signature) else None
+	}
+	if der_status is True:
+		parsed["r"] = int(bin2hex(signature[4: 4 + r_length]), 16)
+		s_start = r_length + 6
+		parsed["s"] = int(bin2hex(signature[s_start: s_start + s_length]), 16)
+
+		# if the s value is above the order of the curve divided by two, its
+		# complement modulo the order could have been used instead, which is
+		# one byte shorter when encoded correctly
+		if 0 < parsed["s"] <= max_mod_half_order_int:
+			parsed["low_s_status"] = True
+		elif explain:
+			parsed["low_s_status"] = "signature %s is not low-der encoded" \
+			% bin2hex(signature)
+		else:
+			parsed["low_s_status"] = False
+	elif explain:
+		parsed["low_s_status"] = "signature has not passed der validation yet" \
+		" - %s" % der_status
+	else:
+		parsed["low_s_status"] = False
+
+	if len(signature) == 0:
+		# empty signature. not strictly der encoded, but allowed to provide a
+		# compact way to provide an invalid signature for use in CHECK(MULTI)SIG
+		parsed["status"] = True
+	elif der_status is not True:
+		# same as IsValidSignatureEncoding() in satoshi source
+		parsed["status"] = der_status
+	elif parsed["low_s_status"] is not True:
+		# same as IsLowDERSignature() in satoshi source
+		parsed["status"] = parsed["low_s_status"]
+	else:
+		# same as IsDefinedHashtypeSignature() in satoshi source
+		parsed["status"] = parsed["defined_hashtype_status"]
+
+	return parsed
 
 max_mod_half_order = [
 	0x7f, 0xff, 0xff, 0xff, 0xff, 0xff, 0xff, 0xff,
@@ -5119,65 +6428,15 @@ max_mod_half_order = [
 	0x5d, 0x57, 0x6e, 0x73, 0x57, 0xa4, 0x50, 0x1d,
 	0xdf, 0xe9, 0x2f, 0x46, 0x68, 0x1b, 0x20, 0xa0
 ]
-def is_low_der_signature(signature, valid_der_signature, explain = False):
-	"""similar to IsLowDERSignature() in script/interpreter.cpp"""
-	if valid_der_signature is not True:
-		if explain:
-			return "signature has not passed der validation yet - %s" \
-			% valid_der_signature
-		else:
-			return False
-
-	# we want to get the s component of the signature
-	r_length = bin2int(signature[3]) # 1 byte
-	s_length = bin2int(signature[5 + r_length]) # 1 byte
-	s = signature[6 + r_length: 6 + r_length + s_length]
-	
-	# convert s into an array of integers (1 per byte)
-	s = bytearray(s)
-
-	# if the s value is above the order of the curve divided by two, its
-	# complement modulo the order could have been used instead, which is one
-	# byte shorter when encoded correctly
-	max_mod_half_order_copy = copy.deepcopy(max_mod_half_order)
-	if (
-		(compare_big_endian(s, [0]) > 0) and
-		(compare_big_endian(s, max_mod_half_order_copy) <= 0)
-	):
-		return True
-	else:
-		if explain:
-			return "signature %s is not low-der encoded" % bin2hex(signature)
-		else:
-			return False
-
-def compare_big_endian(c1, c2):
+max_mod_half_order_int = int(
+	"".join("%02x" % byte for byte in max_mod_half_order), 16
+)
+def is_low_der_signature(signature, explain = False):
 	"""
-	loosely matches CompareBigEndian() from eccryptoverify.cpp
-
-	compares two lists of integers, and returns a negative value if the first is
-	less than the second, 0 if they're equal, and a positive value if the
-	first is greater than the second.
-
-	thanks to https://github.com/petertodd/python-bitcoinlib
-
-	c1 and c2 must be of type bytearray or lists of integers
+	similar to IsLowDERSignature() in script/interpreter.cpp. a signature which
+	is not der encoded is not low-der either - see parse_signature().
 	"""
-	# adjust starting positions until remaining lengths of the two arrays match
-	while len(c1) > len(c2):
-		if c1.pop(0) > 0:
-			return 1
-
-	while len(c2) > len(c1):
-		if c2.pop(0) > 0:
-			return -1
-
-	while len(c1) > 0:
-		diff = c1.pop(0) - c2.pop(0)
-		if diff != 0:
-			return diff
-
-	return 0
+	return parse_signature(signature, explain)["low_s_status"]
 
 def verify_script(
 	blocktime, tx, on_txin_num, prev_tx, block_version, skip_checksig = False,
@@ -5188,6 +6447,7 @@ def verify_script(
 		"status": True/False/"explanation of failure",
 		"pubkeys": [],
 		"signatures": [],
+		"parsed_signatures": {sig0: parse_signature(sig0), ...},
 		"sig_pubkey_statuses": {sig0: {pubkey0: True, pubkey1: False}, ...}
 	}
 	the status element is True if the scripts pass. if the scripts fail then
@@ -5226,6 +6486,7 @@ def verify_script(
 		"p2sh script": None,
 		"pubkeys": [],
 		"signatures": [],
+		"parsed_signatures": {},
 		"sig_pubkey_statuses": {}
 	}
 	def set_error(status):
@@ -5299,7 +6560,7 @@ def verify_script(
 	# if the txout script is p2sh and if the blocktime is later than 1 apr 2012
 	# 00:00:00 GMT (as per bip 16) then evaluate this also
 	if (
-		(blocktime >= 1333238400) and # nBIP16SwitchTime
+		(blocktime >= bip16_switch_time) and
 		(prev_txout_script_format == "p2sh-txout")
 	):
 		# this is a consensus rule for p2sh
@@ -5337,6 +6598,19 @@ def verify_script(
 	# if we get here then all scripts evaluated correctly
 	return return_dict
 
+def get_parsed_signature(return_dict, signature, explain = False):
+	"""
+	get the parse_signature() result for this signature from the script return
+	dict, parsing the signature and saving the result if it is not there yet
+	"""
+	if "parsed_signatures" not in return_dict:
+		return_dict["parsed_signatures"] = {}
+	if signature not in return_dict["parsed_signatures"]:
+		return_dict["parsed_signatures"][signature] = parse_signature(
+			signature, explain
+		)
+	return return_dict["parsed_signatures"][signature]
+
 # used frequently - OP_1 ... OP_16
 op_1_through_16_str = [("OP_%d" % x) for x in range(1, 17)]
 
@@ -5356,6 +6630,7 @@ def eval_script(
 		"status": True/False/"explanation of failure",
 		"pubkeys": [],
 		"signatures": [],
+		"parsed_signatures": {sig0: parse_signature(sig0), ...},
 		"sig_pubkey_statuses": {sig0: {pubkey0: True, pubkey1: False}, ...}
 	}
 	the status element is True if the scripts pass. if the scripts fail then
@@ -5947,9 +7222,9 @@ def eval_script(
 				elif "OP_SHA256" == opcode_str:
 					res = sha256(v1)
 				elif "OP_HASH160" == opcode_str:
-					res = ripemd160(sha256(v1))
+					res = hash160(v1)
 				elif "OP_HASH256" == opcode_str:
-					res = sha256(sha256(v1))
+					res = sha256d(v1)
 				stack.append(res)
 
 			elif "OP_CODESEPARATOR" == opcode_str:
@@ -5965,6 +7240,9 @@ def eval_script(
 				return_dict["pubkeys"].append(pubkey)
 				signature = stack.pop()
 				return_dict["signatures"].append(signature)
+				parsed_signature = get_parsed_signature(
+					return_dict, signature, explain
+				)
 
 				# this is a standardness rule, but not a consensus rule
 				"""
@@ -5992,7 +7270,8 @@ def eval_script(
 				else:
 					res = valid_checksig(
 						wiped_tx, on_txin_num, subscript_list, pubkey, signature,
-						bugs_and_all, explain
+						bugs_and_all, explain,
+						parsed_signature = parsed_signature
 					)
 				if signature not in return_dict["sig_pubkey_statuses"]:
 					return_dict["sig_pubkey_statuses"][signature] = {} # init
@@ -6141,12 +7420,17 @@ def eval_script(
 				for signature in signatures:
 					if signature not in return_dict["sig_pubkey_statuses"]:
 						return_dict["sig_pubkey_statuses"][signature] = {}
+					# parse the signature once for all the pubkeys
+					parsed_signature = get_parsed_signature(
+						return_dict, signature, explain
+					)
 					sig_pass = False # init
 					while len(pubkeys):
 						pubkey = pubkeys.pop(0)
 						res = valid_checksig(
 							wiped_tx, on_txin_num, subscript_list, pubkey,
-							signature, bugs_and_all, explain
+							signature, bugs_and_all, explain,
+							parsed_signature = parsed_signature
 						)
 						return_dict["sig_pubkey_statuses"][signature] \
 						[pubkey] = res
@@ -6509,6 +7793,52 @@ def tx_balances(txs, addresses):
 
 	return balances
 
+# pre-initialized hash objects. copying one of these is cheaper than looking up
+# and constructing a new hash object on every call. ripemd160 is initialized on
+# first use since it is not available in all builds of openssl.
+sha256_base = hashlib.sha256()
+ripemd160_base = None # init
+
+# when hash instrumentation is on, the number of bytes passed to each hash
+# function is counted per calling function, in the format
+# {caller: {"sha256": num bytes, "sha256d": num bytes, ...}}
+hash_instrumentation = False
+hashed_bytes_per_caller = {}
+
+def enable_hash_instrumentation(on = True):
+	"""turn counting the bytes hashed per calling function on or off"""
+	global hash_instrumentation
+	hash_instrumentation = on
+
+def reset_hash_instrumentation():
+	global hashed_bytes_per_caller
+	hashed_bytes_per_caller = {}
+
+def count_hashed_bytes(hash_name, num_bytes):
+	"""
+	add num_bytes to the count for the function which called the hash function
+	that called this function
+	"""
+	caller = inspect.currentframe().f_back.f_back.f_code.co_name
+	if caller not in hashed_bytes_per_caller:
+		hashed_bytes_per_caller[caller] = {}
+	if hash_name not in hashed_bytes_per_caller[caller]:
+		hashed_bytes_per_caller[caller][hash_name] = 0
+	hashed_bytes_per_caller[caller][hash_name] += num_bytes
+
+def hashed_bytes2human_str():
+	"""the hashed bytes per calling function, most bytes first"""
+	callers = sorted(
+		hashed_bytes_per_caller.items(),
+		key = lambda (caller, hashes): sum(hashes.values()), reverse = True
+	)
+	return "bytes hashed per function:\n%s" % "\n".join(
+		"%s: %s" % (caller, ", ".join(
+			"%s %d" % (hash_name, num_bytes) for (hash_name, num_bytes) in \
+			sorted(hashes.items())
+		)) for (caller, hashes) in callers
+	)
+
 def sha1(bytes):
 	"""takes binary, performs sha1 hash, returns binary"""
 	# .digest() keeps the result in binary, .hexdigest() outputs as hex string
@@ -6516,17 +7846,86 @@ def sha1(bytes):
 
 def sha256(bytes):
 	"""takes binary, performs sha256 hash, returns binary"""
+	if hash_instrumentation:
+		count_hashed_bytes("sha256", len(bytes))
+	h = sha256_base.copy()
+	h.update(bytes)
 	# .digest() keeps the result in binary, .hexdigest() outputs as hex string
-	return hashlib.sha256(bytes).digest()
+	return h.digest()
+
+def sha256d(bytes, *more_bytes):
+	"""
+	takes binary, performs sha256 twice, returns binary. any extra arguments are
+	hashed as if they were appended to the first, without actually joining the
+	strings together.
+	"""
+	if hash_instrumentation:
+		count_hashed_bytes(
+			"sha256d", len(bytes) + sum(len(b) for b in more_bytes)
+		)
+	h = sha256_base.copy()
+	h.update(bytes)
+	for b in more_bytes:
+		h.update(b)
+	h2 = sha256_base.copy()
+	h2.update(h.digest())
+	return h2.digest()
+
+def sha256d_batch(bytes_list):
+	"""perform sha256d on each element of the list and return a list of hashes"""
+	if hash_instrumentation:
+		count_hashed_bytes("sha256d", sum(len(b) for b in bytes_list))
+	base = sha256_base
+	hashes = []
+	for bytes in bytes_list:
+		h = base.copy()
+		h.update(bytes)
+		h2 = base.copy()
+		h2.update(h.digest())
+		hashes.append(h2.digest())
+	return hashes
+
+def get_ripemd160_base():
+	global ripemd160_base
+	if ripemd160_base is None:
+		# must use the following format, rather than hashlib.ripemd160(),
+		# since ripemd160 is not native to hashlib
+		ripemd160_base = hashlib.new("ripemd160")
+	return ripemd160_base
 
 def ripemd160(bytes):
 	"""takes binary, performs ripemd160 hash, returns binary"""
-	# must use the following format, rather than hashlib.ripemd160(), since
-	# ripemd160 is not native to hashlib
-	res = hashlib.new("ripemd160")
+	if hash_instrumentation:
+		count_hashed_bytes("ripemd160", len(bytes))
+	res = get_ripemd160_base().copy()
 	res.update(bytes)
 	return res.digest()
 
+def hash160(bytes):
+	"""takes binary, performs sha256 then ripemd160, returns binary"""
+	if hash_instrumentation:
+		count_hashed_bytes("hash160", len(bytes))
+	h = sha256_base.copy()
+	h.update(bytes)
+	res = get_ripemd160_base().copy()
+	res.update(h.digest())
+	return res.digest()
+
+def hash160_batch(bytes_list):
+	"""perform hash160 on each element of the list and return a list of hashes"""
+	if hash_instrumentation:
+		count_hashed_bytes("hash160", sum(len(b) for b in bytes_list))
+	base = sha256_base
+	ripemd160_base_ = get_ripemd160_base()
+	hashes = []
+	for bytes in bytes_list:
+		h = base.copy()
+		h.update(bytes)
+		res = ripemd160_base_.copy()
+		res.update(h.digest())
+		hashes.append(res.digest())
+	return hashes
+
 def little_endian(bytes):
 	"""
 	takes binary, performs little endian (ie reverse the bytes), returns binary
@@ -7844,8 +9243,14 @@ def opcode2bin(opcode, explain = False):
 			return False
 
 def calculate_merkle_root(merkle_tree_elements):
-	"""recursively calculate the merkle root from the list of leaves"""
+	"""
+	calculate the merkle root from the list of leaves. the leaves are tx hashes
+	in little endian (as they are displayed) and the root is returned in little
+	endian too.
 
+	each level of the tree overwrites the start of the previous level's list,
+	so only a single list is ever held in memory.
+	"""
 	if not merkle_tree_elements:
 		raise ValueError(
 			"No arguments passed to function calculate_merkle_root()"
@@ -7853,35 +9258,149 @@ def calculate_merkle_root(merkle_tree_elements):
 	if len(merkle_tree_elements) == 1: # just return the input
 		return merkle_tree_elements[0]
 
-	nodes = ["placeholder"] # gets overwritten
-	level = 0
-
 	# convert all leaves from little endian back to normal
-	nodes[level] = [little_endian(leaf) for leaf in merkle_tree_elements]
+	nodes = [leaf[:: -1] for leaf in merkle_tree_elements]
+	# this is the hot loop of merkle validation, so do the sha256d of each pair
+	# inline rather than calling sha256d(). local lookups are faster than
+	# global lookups.
+	base = sha256_base
+	num = len(nodes)
+	while num > 1:
+		if num % 2: # duplicate the last node on odd levels
+			nodes.append(nodes[num - 1])
+			num += 1
+		if hash_instrumentation:
+			count_hashed_bytes("sha256d", 32 * num)
+		for i in xrange(0, num, 2):
+			h = base.copy()
+			h.update(nodes[i])
+			h.update(nodes[i + 1])
+			h2 = base.copy()
+			h2.update(h.digest())
+			nodes[i / 2] = h2.digest()
+		num /= 2
+		del nodes[num:]
+
+	# this is the root - output in little endian
+	return nodes[0][:: -1]
+
+def calculate_merkle_roots(list_of_merkle_tree_elements):
+	"""
+	calculate the merkle root for each list of leaves in the input list. return
+	a list of merkle roots in the same order as the input.
+	"""
+	return [
+		calculate_merkle_root(merkle_tree_elements) for merkle_tree_elements \
+		in list_of_merkle_tree_elements
+	]
 
-	while True:
-		num = len(nodes[level])
-		nodes.append("placeholder") # initialize next level
-		for (i, leaf) in enumerate(nodes[level]):
-			if is_odd(i):
-				continue
-			dhash = leaf
-			if (i + 1) == num: # we are on the last index
-				concat = dhash + dhash
-			else: # not on the last index
-				dhash_next = nodes[level][i + 1]
-				concat = dhash + dhash_next
-			node_val = sha256(sha256(concat))
-			if not i:
-				nodes[level + 1] = [node_val]
-			else:
-				nodes[level + 1].append(node_val)
+def calculate_merkle_tree(merkle_tree_elements):
+	"""
+	calculate every level of the merkle tree from the list of leaves (tx hashes
+	in little endian). return a list of levels - the first level is the leaves
+	and the final level is the root. the nodes in each level are in normal
+	endian and the odd final node of a level is not duplicated.
+	"""
+	if not merkle_tree_elements:
+		raise ValueError(
+			"No arguments passed to function calculate_merkle_tree()"
+		)
+	nodes = [leaf[:: -1] for leaf in merkle_tree_elements]
+	levels = [nodes]
+	# do the sha256d of each pair inline, as in calculate_merkle_root()
+	base = sha256_base
+	while len(nodes) > 1:
+		num = len(nodes)
+		if hash_instrumentation:
+			count_hashed_bytes("sha256d", 64 * ((num + 1) / 2))
+		parents = []
+		for i in xrange(0, num, 2):
+			h = base.copy()
+			h.update(nodes[i])
+			h.update(nodes[i + 1 if (i + 1) < num else i])
+			h2 = base.copy()
+			h2.update(h.digest())
+			parents.append(h2.digest())
+		nodes = parents
+		levels.append(nodes)
+	return levels
+
+def get_merkle_tree(merkle_tree_elements, block_hash = None):
+	"""
+	get the merkle tree levels for the leaves. if the block hash is specified
+	then the tree is fetched from, or saved to, the merkle tree cache.
+	"""
+	global merkle_tree_cache
+	if block_hash is None:
+		return calculate_merkle_tree(merkle_tree_elements)
+
+	if block_hash in merkle_tree_cache:
+		# move this block to the most recently used end of the cache
+		levels = merkle_tree_cache.pop(block_hash)
+		merkle_tree_cache[block_hash] = levels
+		return levels
+
+	levels = calculate_merkle_tree(merkle_tree_elements)
+	merkle_tree_cache[block_hash] = levels
+	while len(merkle_tree_cache) > merkle_tree_cache_size:
+		merkle_tree_cache.popitem(last = False)
+	return levels
+
+def merkle_tree2branch(merkle_tree_levels, tx_num):
+	"""
+	extract the merkle branch for the tx num from the merkle tree levels. the
+	branch is the list of sibling hashes (little endian) from the leaf up to,
+	but not including, the root.
+	"""
+	num_leaves = len(merkle_tree_levels[0])
+	if (tx_num < 0) or (tx_num >= num_leaves):
+		raise IndexError(
+			"tx number %s does not exist in a merkle tree with %s leaves"
+			% (tx_num, num_leaves)
+		)
+	branch = []
+	index = tx_num
+	for nodes in merkle_tree_levels[: -1]:
+		sibling_index = index ^ 1
+		if sibling_index >= len(nodes):
+			sibling_index = index # the odd final node is paired with itself
+		branch.append(nodes[sibling_index][:: -1])
+		index >>= 1
+	return branch
+
+def get_merkle_branch(merkle_tree_elements, tx_num, block_hash = None):
+	"""
+	get the merkle branch for a single tx in the block. merkle_tree_elements is
+	the list of all tx hashes in the block (little endian).
+	"""
+	return merkle_tree2branch(
+		get_merkle_tree(merkle_tree_elements, block_hash), tx_num
+	)
 
-		if len(nodes[level + 1]) == 1:
-			# this is the root - output in little endian
-			return little_endian(nodes[level + 1][0])
+def get_merkle_branches(merkle_tree_elements, tx_nums, block_hash = None):
+	"""
+	get the merkle branches for many txs in the same block using a single build
+	of the merkle tree. return a dict in the format {tx_num: branch}.
+	"""
+	levels = get_merkle_tree(merkle_tree_elements, block_hash)
+	return dict(
+		(tx_num, merkle_tree2branch(levels, tx_num)) for tx_num in tx_nums
+	)
 
-		level = level + 1
+def merkle_branch2root(tx_hash, merkle_branch, tx_num):
+	"""
+	calculate the merkle root (little endian) from the tx hash (little endian),
+	its merkle branch and its position in the block
+	"""
+	node = tx_hash[:: -1]
+	index = tx_num
+	for sibling in merkle_branch:
+		if index & 1:
+			node = sha256d(sibling[:: -1], node)
+		else:
+			node = sha256d(node, sibling[:: -1])
+		index >>= 1
+	return node[:: -1]
 
 def mine(block):
 	"""
@@ -7951,7 +9470,12 @@ def calc_new_bits(old_bits, old_bits_time, new_bits_time):
 
 	return target_int2bits(new_target)
 
-def connect_to_rpc():
+def connect_to_rpc(this_thread_only = False):
+	"""
+	connect to bitcoind. if this_thread_only is set then the connection is only
+	used by rpcs made from the calling thread - each thread other than the main
+	thread must call this before making rpcs.
+	"""
 	global rpc
 	# always works, even if bitcoind is not installed!
 	rpc_connection_string = "http://%s:%s@%s:%d" % (
@@ -7960,7 +9484,10 @@ def connect_to_rpc():
 		config_dict["bitcoin_rpc_client"]["host"],
 		config_dict["bitcoin_rpc_client"]["port"]
 	)
-	rpc = AuthServiceProxy(rpc_connection_string)
+	if this_thread_only:
+		rpc_thread_local.rpc = AuthServiceProxy(rpc_connection_string)
+	else:
+		rpc = AuthServiceProxy(rpc_connection_string)
 
 def get_info():
 	"""get info such as the latest block and the client version"""
@@ -8006,6 +9533,21 @@ def get_block(block_id, result_format):
 	else:
 		raise ValueError("unknown result format %s" % result_format)
 
+def get_block_headers(start_height, num_headers):
+	"""
+	get the 80 byte headers (bytes) for num_headers blocks on the main chain,
+	beginning at start_height. use one batch of rpcs to get the block hashes and
+	another to get the headers, rather than two rpcs per header.
+	"""
+	heights = xrange(start_height, start_height + num_headers)
+	block_hashes = do_rpc("batch", [
+		["getblockhash", block_height] for block_height in heights
+	])
+	headers = do_rpc("batch", [
+		["getblockheader", block_hash, False] for block_hash in block_hashes
+	])
+	return [hex2bin(header) for header in headers]
+
 def get_best_block_hash():
 	"""
 	this function is kinda redundant for such a simple method, but we might as
@@ -8013,6 +9555,38 @@ def get_best_block_hash():
 	"""
 	return do_rpc("getbestblockhash", None)
 
+def poll_chain_tip(known_tip):
+	"""
+	return the latest block in bitcoind in the format {"height": block height,
+	"hash": block hash (hex)}. this is the callback for tip_grunt. the best block
+	hash is cheap to get, so only call getinfo for the height when the hash has
+	changed since known_tip - otherwise just return known_tip.
+	"""
+	best_block_hash = get_best_block_hash()
+	if (known_tip is not None) and (known_tip["hash"] == best_block_hash):
+		return known_tip
+	return {"height": get_info()["blocks"], "hash": best_block_hash}
+
+def start_tip_watcher():
+	"""
+	start polling bitcoind for the latest block in a background thread, every
+	chain_tip_refresh_interval seconds (set in config.json). the thread uses its
+	own rpc connection.
+	"""
+	connect_this_thread = functools.partial(
+		connect_to_rpc, this_thread_only = True
+	)
+	tip_grunt.start(poll_chain_tip, connect_this_thread)
+
+def get_latest_block_height():
+	"""
+	get the latest block height in the blockchain - from the tip watcher if it
+	is running, otherwise from bitcoind
+	"""
+	if tip_grunt.is_running():
+		return tip_grunt.get_height()
+	return get_info()["blocks"]
+
 def account2txhashes(account):
 	"""
 	use rpc to get the tx hashes associated with an account using the
@@ -8047,7 +9621,7 @@ def block_date2heights(req_datetime):
 	if (req_datetime <= genesis_datetime):
 		return {0: genesis_datetime, 1: get_block(1, "json")["time"]}
 
-	latest_block_height = get_info()["blocks"]
+	latest_block_height = get_latest_block_height()
 	latest_datetime = get_block(latest_block_height, "json")["time"]
 
 	# if the specified datetime is after the last block then return the latest
@@ -8170,21 +9744,27 @@ def do_rpc(command, parameter, json_result = True):
 	"""
 	perform the rpc, catch errors and take a guess at what may have gone wrong
 	"""
+	# use this thread's own connection if it has one
+	conn = getattr(rpc_thread_local, "rpc", rpc)
 	try:
 		if command == "getinfo":
-			result = rpc.getinfo()
+			result = conn.getinfo()
 		elif command == "getblockhash":
-			result = rpc.getblockhash(parameter)
+			result = conn.getblockhash(parameter)
 		elif command == "getblock":
-			result = rpc.getblock(parameter, json_result)
+			result = conn.getblock(parameter, json_result)
 		elif command == "getrawtransaction":
-			result = rpc.getrawtransaction(parameter, 1 if json_result else 0)
+			result = conn.getrawtransaction(parameter, 1 if json_result else 0)
 		elif command == "listtransactions":
 			count = 999999 # no limit on the number of returned txs
 			from_block = 0 # start from the start
-			result = rpc.listtransactions(parameter, count, from_block)
+			result = conn.listtransactions(parameter, count, from_block)
 		elif command == "getbestblockhash":
-			result = rpc.getbestblockhash()
+			result = conn.getbestblockhash()
+		elif command == "batch":
+			# parameter is a list of rpcs in the format [[command, arg, ...]]
+			# and the result is a list of their results in the same order
+			result = conn.batch_(parameter)
 
 	except ValueError as e:
 		# the rpc client throws this type of error when using the wrong port,
@@ -8269,11 +9849,12 @@ def pubkey2address(pubkey):
 	no sanity checking is done on the pubkey. valid pubkeys should be 33 bytes
 	when compressed and 65 bytes when uncompressed.
 	"""
-	return hash1602address(ripemd160(sha256(pubkey)), "pub_key_hash")
+	return hash1602address(hash160(pubkey), "pub_key_hash")
 
 def address2hash160(address):
 	"""
-	from https://github.com/gavinandresen/bitcointools/blob/master/base58.py
+	decode the address (ascii string) into the hash160 (bytes). the magic byte
+	and the checksum are stripped off.
 	"""
 	bytes = base58decode(address)
 	return bytes[1: 21]
@@ -8283,17 +9864,30 @@ def hash1602address(hash160, format_type):
 	convert the hash160 output (bytes) to the bitcoin address (ascii string)
 	https://en.bitcoin.it/wiki/Technical_background_of_Bitcoin_addresses
 	"""
-	temp = "%s%s" % (chr(address_symbol[format_type]["magic"]), hash160)
+	return base58check_encode(
+		"%s%s" % (chr(address_symbol[format_type]["magic"]), hash160)
+	)
 
-	# leading zeros are lost when converting to decimal, so count them here so
-	# we can replace them at the end
-	num_leading_zeros = len(re.match("^\x00*", temp).group(0))
-	replace_leading_zeros = "1" * num_leading_zeros
+def hash1602address_batch(hash160s, format_type):
+	"""
+	convert a list of hash160s (bytes) to a list of bitcoin addresses (ascii
+	strings) of the same format. use this instead of hash1602address() when
+	there are many addresses to convert at once.
+	"""
+	magic = chr(address_symbol[format_type]["magic"])
+	return base58check_encode_batch(
+		["%s%s" % (magic, hash160) for hash160 in hash160s]
+	)
 
-	checksum = sha256(sha256(temp))[: 4] # checksum is the first 4 bytes
-	hex_address = bin2hex("%s%s" % (temp, checksum))
-	decimal_address = int(hex_address, 16)
-	return "%s%s" % (replace_leading_zeros, base58encode(decimal_address))
+def address2hash160_batch(addresses):
+	"""
+	convert a list of addresses (ascii strings) to a list of hash160s (bytes).
+	an element is None if the address is not base58 or has a bad checksum.
+	"""
+	return [
+		None if payload is None else payload[1: 21] for payload in \
+		base58check_decode_batch(addresses)
+	]
 
 def encode_variable_length_int(value):
 	"""encode a value as a variable length integer"""
@@ -8375,35 +9969,6 @@ def manage_orphans(
 
 	return (filtered_blocks, hash_table, aux_blockchain_data)
 
-def save_new_orphans(hash_table, latest_block_hash):
-	"""
-	if there are any new orphans in the hash table then save them to disk and
-	update the saved_known_orphans global var
-	hash_table format: {block hash: [block height, previous hash], ...}
-	saved_known_orphans format: {block height: [block hash1, hash2, ...], ...}
-	"""
-	# get orphans in a list of the format [(height, hash), ...]
-	orphans_list = detect_orphans(hash_table, latest_block_hash, 0)
-	if orphans_list is None:
-		return
-
-	# if we get here then there are orphans. now detect if they have been saved
-	# already or not
-	new_orphans = copy.deepcopy(saved_known_orphans) # init
-	any_new = False
-	for (block_height, block_hash) in orphans_list:
-		if block_height not in new_orphans:
-			new_orphans[block_height] = [block_hash]
-			any_new = True
-		elif block_hash not in new_orphans[block_height]:
-			new_orphans[block_height].append(block_hash)
-			any_new = True
-
-	if not any_new:
-		return
-
-	save_known_orphans(new_orphans)
-
 def detect_orphans(hash_table, latest_block_hash, threshold_confirmations):
 	"""
 	look back through the hash_table for orphans. if any are found then	return
@@ -8721,62 +10286,139 @@ def get_formatted_data(options, data):
 	# this line
 
 base58alphabet = "123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz"
+
+# reverse lookup for base58decode(), so that each char costs a dict lookup
+# rather than a linear scan of the alphabet
+base58alphabet_index = dict(
+	(char, i) for (i, char) in enumerate(base58alphabet)
+)
 def is_base58(input_str):
 	"""check if the input string is base58"""
 	for char in input_str:
-		if char not in base58alphabet:
+		if char not in base58alphabet_index:
 			return False
 	return True # if we get here then it is a base58 string
 
 def base58encode(input_num):
 	"""
 	encode the input integer into a base58 string. see
-	https://en.bitcoin.it/wiki/Base58Check_encoding for doco. code modified from
-	http://darklaunch.com/2009/08/07/base58-encode-and-decode-using-php-with-\
-	example-base58-encode-base58-decode using bcmath
+	https://en.bitcoin.it/wiki/Base58Check_encoding for doco. the digits are
+	collected in a list and joined once at the end, rather than prepending to a
+	string on each loop (which is quadratic in the length of the output).
 	"""
-	base = len(base58alphabet)
-	encoded = ""
-	num = input_num
-	try:
-		while num >= base:
-			mod = num % base
-			encoded = base58alphabet[mod] + encoded
-			num = num / base
-	except TypeError:
+	if not isinstance(input_num, (int, long)):
 		raise TypeError(
 			"function base58encode() only accepts an integer argument"
 		)
+	alphabet = base58alphabet # local lookups are faster than global lookups
+	encoded = []
+	num = input_num
+	while num >= 58:
+		(num, mod) = divmod(num, 58)
+		encoded.append(alphabet[mod])
 	if num:
-		encoded = base58alphabet[num] + encoded
-	return encoded
+		encoded.append(alphabet[num])
+	encoded.reverse()
+	return "".join(encoded)
 
 def base58decode(value):
 	"""
-	decode the value into a string of bytes in base58 from
-	https://github.com/gavinandresen/bitcointools/blob/master/base58.py
+	decode the base58 value into a string of bytes. each leading "1" in the
+	value represents a leading zero byte in the output.
 	"""
-	base = 58
+	alphabet_index = base58alphabet_index
 	long_value = 0L # init
+	try:
+		for char in value:
+			long_value = (long_value * 58) + alphabet_index[char]
+	except KeyError:
+		raise ValueError("%s is not a base58 string" % value)
+
+	if long_value:
+		hex_value = "%x" % long_value
+		if len(hex_value) % 2:
+			hex_value = "0%s" % hex_value
+		decoded = hex2bin(hex_value)
+	else:
+		decoded = ""
 
-	# loop through the input value one char at a time in reverse order
-	# (i starts at 0)
-	for (i, char) in enumerate(value[::-1]):
-		long_value += base58alphabet.find(char) * (base ** i)
-	decoded = "" # init
-	while long_value > 255:
-		(div, mod) = divmod(long_value, 256)
-		decoded = chr(mod) + decoded
-		long_value = div
-	decoded = chr(long_value) + decoded
-	padding = 0 # init
-	for char in value:
-		if char == base58alphabet[0]:
-			padding += 1
-		else:
-			break
-	decoded = (chr(0) * padding) + decoded
-	return decoded	
+	padding = len(value) - len(value.lstrip(base58alphabet[0]))
+	return "%s%s" % ("\x00" * padding, decoded)
+
+def base58check_encode(payload):
+	"""
+	append the 4 byte checksum to the payload (bytes) and encode the result in
+	base58. see https://en.bitcoin.it/wiki/Base58Check_encoding
+	"""
+	checksum = sha256d(payload)[: 4] # checksum is the first 4 bytes
+	data = "%s%s" % (payload, checksum)
+
+	# leading zeros are lost when converting to an integer, so count them here
+	# so we can replace them at the end
+	num_leading_zeros = len(data) - len(data.lstrip("\x00"))
+	return "%s%s" % (
+		base58alphabet[0] * num_leading_zeros,
+		base58encode(int(bin2hex(data), 16))
+	)
+
+def base58check_decode(value, explain = False):
+	"""
+	decode the base58 value and verify its 4 byte checksum. return the payload
+	(bytes) without the checksum. if the checksum is wrong then return False, or
+	an explanation if explain is set.
+	"""
+	data = base58decode(value)
+	payload = data[: -4]
+	checksum = data[-4:]
+	expected_checksum = sha256d(payload)[: 4]
+	if checksum == expected_checksum:
+		return payload
+	if explain:
+		return "base58 value %s has checksum %s however the checksum has been" \
+		" calculated to be %s" \
+		% (value, bin2hex(checksum), bin2hex(expected_checksum))
+	else:
+		return False
+
+def base58check_encode_batch(payloads):
+	"""
+	base58check encode a list of payloads (bytes). this is faster than calling
+	base58check_encode() once per payload because all the lookups are hoisted
+	out of the loop.
+	"""
+	alphabet = base58alphabet
+	zero_char = alphabet[0]
+	hexlify = binascii.hexlify
+	encoded_list = []
+	for (payload, checksum) in zip(payloads, sha256d_batch(payloads)):
+		data = "%s%s" % (payload, checksum[: 4])
+		num_leading_zeros = len(data) - len(data.lstrip("\x00"))
+		num = int(hexlify(data), 16)
+		encoded = []
+		while num >= 58:
+			(num, mod) = divmod(num, 58)
+			encoded.append(alphabet[mod])
+		if num:
+			encoded.append(alphabet[num])
+		encoded.append(zero_char * num_leading_zeros)
+		encoded.reverse()
+		encoded_list.append("".join(encoded))
+	return encoded_list
+
+def base58check_decode_batch(values):
+	"""
+	base58check decode a list of values. the output is a list with one element
+	per input value - either the payload (bytes) or None if the value is not
+	base58 or its checksum is wrong.
+	"""
+	payloads = []
+	for value in values:
+		try:
+			payload = base58check_decode(value)
+		except ValueError:
+			payload = None
+		payloads.append(None if payload is False else payload)
+	return payloads
 
 def get_address_type(address):
 	"""
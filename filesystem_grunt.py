@@ -11,6 +11,21 @@ def make_sure_path_exists(path):
         if exception.errno != errno.EEXIST:
             raise
 
+def write_file_atomically(f_name, data):
+    """
+    write to a temp file then rename it over the original, so that the file
+    always contains either the old data or the new data, never a mixture
+    """
+    tmp_f_name = "%s.tmp" % f_name
+    try:
+        with open(tmp_f_name, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.rename(tmp_f_name, f_name)
+    except (IOError, OSError):
+        raise IOError("failed to write file %s" % f_name)
+
 def update_errorlog(txt, prepend_datetime = True):
     prepended_datetime = "" if not prepend_datetime else "[%s] " % (
         time.strftime("%Y-%m-%d %H:%M:%S")
@@ -0,0 +1,70 @@
+#!/usr/bin/env python2.7
+"""
+get the merkle branch (spv proof) which proves that a transaction is included in
+a block. the branch is verified against the merkle root in the block header
+before it is output.
+"""
+import sys
+import btc_grunt
+import get_tx
+
+def validate_script_usage():
+    if len(sys.argv) < 2:
+        raise ValueError(
+            "\n\nUsage: ./get_merkle_branch.py <the tx hash in hex | "
+            "blockheight-txnum>\n"
+            "eg: ./get_merkle_branch.py 514c46f0b61714092f15c8dfcb576c9f79b3f9"
+            "59989b98de3944b19d98832b58\n"
+            "or ./get_merkle_branch.py 257727-130\n\n"
+        )
+
+def get_merkle_branch_from_rpc(input_arg_format, data):
+    btc_grunt.connect_to_rpc()
+
+    if input_arg_format == "blockheight-txnum":
+        (block_height, tx_num) = data
+        block_rpc_dict = btc_grunt.get_block(block_height, "json")
+    elif input_arg_format == "txhash":
+        tx_rpc_dict = btc_grunt.get_transaction(data, "json")
+        block_rpc_dict = btc_grunt.get_block(tx_rpc_dict["blockhash"], "json")
+        tx_num = block_rpc_dict["tx"].index(data)
+
+    if tx_num >= len(block_rpc_dict["tx"]):
+        raise IndexError(
+            "\n\ntx number %d does not exist in block %d\n\n"
+            % (tx_num, block_rpc_dict["height"])
+        )
+    tx_hashes = [btc_grunt.hex2bin(h) for h in block_rpc_dict["tx"]]
+    merkle_branch = btc_grunt.get_merkle_branch(
+        tx_hashes, tx_num, btc_grunt.hex2bin(block_rpc_dict["hash"])
+    )
+    return (tx_hashes[tx_num], tx_num, merkle_branch, block_rpc_dict)
+
+if __name__ == '__main__':
+
+    validate_script_usage()
+    (input_arg_format, data) = get_tx.get_stdin_params()
+
+    (tx_hash, tx_num, merkle_branch, block_rpc_dict) = \
+    get_merkle_branch_from_rpc(input_arg_format, data)
+
+    merkle_root = btc_grunt.hex2bin(block_rpc_dict["merkleroot"])
+    valid = btc_grunt.valid_merkle_branch(
+        tx_hash, merkle_branch, tx_num, merkle_root, explain = True
+    )
+    if valid is not True:
+        raise Exception(valid)
+
+    print "\nblock height: %d\n" \
+    "block hash: %s\n" \
+    "merkle root: %s\n" \
+    "tx num: %d\n" \
+    "tx hash: %s\n" \
+    "merkle branch: %s" \
+    % (
+        block_rpc_dict["height"], block_rpc_dict["hash"],
+        block_rpc_dict["merkleroot"], tx_num, btc_grunt.bin2hex(tx_hash),
+        btc_grunt.pretty_json(
+            [btc_grunt.bin2hex(node) for node in merkle_branch]
+        )
+    )
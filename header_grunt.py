@@ -0,0 +1,81 @@
+"""
+module containing the local header chain - the 80 byte header of every block on
+the main chain, stored back to back in a single file in block height order, so
+that the header for block height n is at byte 80 * n.
+
+only headers which have passed validation (proof of work, retargets and
+linkage - see btc_grunt.validate_headers()) are ever appended, so the file is a
+trusted header chain which later validation passes can read instead of asking
+bitcoind. headers are appended in batches, and a batch is made durable before
+the next one is fetched. a partial header at the end of the file (interrupted
+write) is discarded when the file is opened.
+"""
+
+import os
+import config_grunt
+import filesystem_grunt
+
+header_size = 80 # bytes
+
+# module globals - do not set here. use init()
+header_file = None
+fh = None
+num_headers = 0
+
+def init(f_name = None):
+    """open (or create) the header chain file. f_name defaults to config.json"""
+    global header_file, fh, num_headers
+    close()
+    header_file = config_grunt.config_dict["header_chain_file"] \
+    if f_name is None else f_name
+    filesystem_grunt.make_sure_path_exists(
+        os.path.dirname(os.path.abspath(header_file))
+    )
+    if not os.path.isfile(header_file):
+        open(header_file, "wb").close()
+
+    fh = open(header_file, "r+b")
+    fh.seek(0, os.SEEK_END)
+    num_headers = fh.tell() / header_size
+    if fh.tell() != num_headers * header_size:
+        fh.truncate(num_headers * header_size)
+
+def initialized():
+    return fh is not None
+
+def close():
+    global fh
+    if fh is not None:
+        fh.close()
+        fh = None
+
+def get(block_height):
+    """return the 80 byte header for the block height, or None if not stored"""
+    if (fh is None) or not (0 <= block_height < num_headers):
+        return None
+    fh.seek(block_height * header_size)
+    return fh.read(header_size)
+
+def append(headers):
+    """append a list of validated headers and make them durable"""
+    global num_headers
+    if not headers:
+        return
+    fh.seek(num_headers * header_size)
+    fh.write("".join(headers))
+    fh.flush()
+    os.fsync(fh.fileno())
+    num_headers += len(headers)
+
+def truncate(new_num_headers):
+    """
+    drop all headers from block height new_num_headers onwards. used when
+    bitcoind has reorganized onto a different chain.
+    """
+    global num_headers
+    if new_num_headers >= num_headers:
+        return
+    fh.truncate(new_num_headers * header_size)
+    fh.flush()
+    os.fsync(fh.fileno())
+    num_headers = new_num_headers
@@ -0,0 +1,216 @@
+"""
+module containing the optional per-rule validation instrumentation - calls,
+failures, cumulative time and a latency histogram for each validation rule
+(valid_*() function), and for script verification, tx metadata i/o and block
+parsing.
+
+the instrumented functions are wrapped in place in their module (see
+instrument()), so that the rest of the code does not change and there is no
+overhead at all when the instrumentation is off. times are inclusive - the time
+of a function includes the time of any instrumented functions that it calls.
+
+the counters are kept for the whole run and for the current block. the
+per-rule counters of every block are appended to the blocks file as one line of
+json per block, and the slowest blocks are also kept in memory. the run
+counters and the slowest blocks are dumped as json to the instrumentation file
+at the end of the run, or after the current block when the process receives
+SIGUSR1 (see request_dump()).
+
+functions must be instrumented before any worker processes are forked, so that
+the workers run the wrapped functions too. each worker then sends the counters
+it recorded back with its results (see take_block_counters()) and the main
+process adds them in with merge().
+
+the latency histogram is in powers of two - bucket n counts the calls which
+took from 2^(n-1) up to 2^n microseconds.
+"""
+
+import sys, time, json, signal, threading
+import config_grunt
+import filesystem_grunt
+
+# the number of slowest blocks to keep
+num_slowest_blocks = 10
+
+# module globals - do not set here. use init()
+enabled = False
+instrumentation_file = None
+blocks_file = None
+blocks_fh = None # only opened upon the first end_block()
+run_rules = {} # {rule name: {"calls", "failures", "seconds", "histogram"}}
+block_rules = {} # the same, for the current block only
+block_height = None
+block_start = None
+slowest_blocks = [] # [{"block_height", "seconds", "rules"}, ...] slowest first
+dump_requested = False
+originals = {} # {(module name, function name): original function}
+lock = threading.Lock()
+
+def init(f_name = None, blocks_f_name = None):
+    """
+    reset the counters, dump to f_name on SIGUSR1 and append the counters of
+    each block to blocks_f_name. f_name and blocks_f_name default to the values
+    in config.json.
+    """
+    global enabled, instrumentation_file, blocks_file, run_rules, block_rules, \
+    block_height, block_start, slowest_blocks, dump_requested
+    enabled = True
+    instrumentation_file = config_grunt.config_dict["instrumentation_file"] \
+    if f_name is None else f_name
+    blocks_file = config_grunt.config_dict["instrumentation_blocks_file"] \
+    if blocks_f_name is None else blocks_f_name
+    run_rules = {}
+    block_rules = {}
+    block_height = None
+    block_start = None
+    slowest_blocks = []
+    dump_requested = False
+    if hasattr(signal, "SIGUSR1"):
+        signal.signal(signal.SIGUSR1, request_dump)
+
+def new_counters():
+    return {"calls": 0, "failures": 0, "seconds": 0.0, "histogram": {}}
+
+def instrument(module, function_names, failed = None):
+    """
+    wrap the named functions of the module to count their calls, failures and
+    time. failed(result) returns True if the result is a failure - by default
+    any result other than True. functions which raise always count as failed.
+    functions which are already wrapped are left alone.
+    """
+    if failed is None:
+        failed = lambda result: result is not True
+    for name in function_names:
+        key = (module.__name__, name)
+        if key not in originals:
+            originals[key] = getattr(module, name)
+            setattr(module, name, wrap(name, originals[key], failed))
+
+def uninstrument():
+    """put back all the original functions and turn the instrumentation off"""
+    global enabled, blocks_fh
+    enabled = False
+    for ((module_name, name), function) in originals.items():
+        setattr(sys.modules[module_name], name, function)
+    originals.clear()
+    if blocks_fh is not None:
+        blocks_fh.close()
+        blocks_fh = None
+
+def wrap(name, function, failed):
+    def wrapper(*args, **kwargs):
+        start = time.time()
+        try:
+            result = function(*args, **kwargs)
+        except:
+            record(name, time.time() - start, True)
+            raise
+        record(name, time.time() - start, failed(result))
+        return result
+
+    wrapper.__name__ = function.__name__
+    wrapper.__doc__ = function.__doc__
+    return wrapper
+
+def record(name, seconds, is_failure):
+    """add a call to the run and block counters. safe to call from any thread"""
+    bucket = int(seconds * 1000000).bit_length()
+    with lock:
+        for rules in (run_rules, block_rules):
+            if name not in rules:
+                rules[name] = new_counters()
+            counters = rules[name]
+            counters["calls"] += 1
+            counters["seconds"] += seconds
+            if is_failure:
+                counters["failures"] += 1
+            counters["histogram"][bucket] = \
+            counters["histogram"].get(bucket, 0) + 1
+
+def take_block_counters():
+    """
+    return the block counters and reset them. worker processes call this to
+    send back the counters recorded since the last call.
+    """
+    global block_rules
+    with lock:
+        rules = block_rules
+        block_rules = {}
+    return rules
+
+def merge(other_rules):
+    """
+    add counters from take_block_counters() in another process to the run and
+    block counters
+    """
+    with lock:
+        for (name, other) in other_rules.items():
+            for rules in (run_rules, block_rules):
+                if name not in rules:
+                    rules[name] = new_counters()
+                counters = rules[name]
+                for key in ("calls", "failures", "seconds"):
+                    counters[key] += other[key]
+                for (bucket, num) in other["histogram"].items():
+                    counters["histogram"][bucket] = \
+                    counters["histogram"].get(bucket, 0) + num
+
+def start_block(new_block_height):
+    """start counting for a new block"""
+    global block_rules, block_height, block_start
+    with lock:
+        block_rules = {}
+    block_height = new_block_height
+    block_start = time.time()
+
+def end_block():
+    """
+    append the block counters to the blocks file, and keep them if the block is
+    one of the slowest so far. also dump everything if SIGUSR1 was received
+    during the block
+    """
+    global blocks_fh, slowest_blocks, dump_requested
+    seconds = time.time() - block_start
+    with lock:
+        rules = {
+            name: {k: v for (k, v) in counters.items() if k != "histogram"}
+            for (name, counters) in block_rules.items()
+        }
+    if blocks_fh is None:
+        blocks_fh = open(blocks_file, "a")
+    blocks_fh.write("%s\n" % json.dumps({
+        "block_height": block_height, "seconds": seconds, "rules": rules
+    }, sort_keys = True))
+    blocks_fh.flush()
+    if (
+        (len(slowest_blocks) < num_slowest_blocks) or
+        (seconds > slowest_blocks[-1]["seconds"])
+    ):
+        slowest_blocks = sorted(slowest_blocks + [{
+            "block_height": block_height, "seconds": seconds, "rules": rules
+        }], key = lambda block: block["seconds"], reverse = True)[
+            : num_slowest_blocks
+        ]
+    if dump_requested:
+        dump()
+        dump_requested = False
+
+def request_dump(signal_num = None, frame = None):
+    """
+    signal handler for SIGUSR1. do not dump here, since the signal can arrive in
+    the middle of updating the counters. end_block() does the dump instead.
+    """
+    global dump_requested
+    dump_requested = True
+
+def to_json():
+    with lock:
+        return json.dumps({
+            "block_height": block_height,
+            "run": run_rules,
+            "slowest_blocks": slowest_blocks
+        }, indent = 4, sort_keys = True)
+
+def dump():
+    """atomically write all counters to the instrumentation file as json"""
+    filesystem_grunt.write_file_atomically(instrumentation_file, to_json())
@@ -0,0 +1,55 @@
+"""
+module containing the coinbase maturity index - the coinbase txids of the
+latest blocks, so that checking if a spend is of an immature coinbase tx is a
+single lookup rather than a tx metadata lookup.
+
+a coinbase tx can only be spent once it has coinbase_maturity confirmations.
+so when validating block h, only the coinbase txs from blocks after
+h - coinbase_maturity are immature. the coinbase txids are kept in a queue in
+block height order, and the oldest are expired as the chain advances (see
+expire()). a txid that is in the index is therefore always immature, and a txid
+that is not in the index is either mature or not a coinbase tx.
+
+the index must hold the coinbase txids of every block in the window - see
+btc_grunt.init_coinbase_index().
+"""
+
+import collections
+
+# module globals - do not set here. use init()
+maturity = None # blocks
+queue = collections.deque() # [(block height, coinbase txid), ...] oldest first
+coinbase_heights = {} # {coinbase txid: block height} for the txids in queue
+
+def init(coinbase_maturity):
+    """initialize (or reinitialize) an empty index"""
+    global maturity, queue, coinbase_heights
+    maturity = coinbase_maturity
+    queue = collections.deque()
+    coinbase_heights = {}
+
+def initialized():
+    return maturity is not None
+
+def add(block_height, coinbase_txid):
+    """add the coinbase txid of a block. blocks must be added in order"""
+    queue.append((block_height, coinbase_txid))
+    coinbase_heights[coinbase_txid] = block_height
+
+def expire(block_height):
+    """
+    drop the coinbase txids which are mature for spends in the given block
+    height
+    """
+    while queue and (queue[0][0] <= block_height - maturity):
+        (old_height, coinbase_txid) = queue.popleft()
+        # a later coinbase tx with the same txid replaces the earlier one
+        if coinbase_heights.get(coinbase_txid) == old_height:
+            del coinbase_heights[coinbase_txid]
+
+def get_height(txid):
+    """
+    return the block height of the txid if it is an immature coinbase tx,
+    otherwise None
+    """
+    return coinbase_heights.get(txid)
@@ -0,0 +1,76 @@
+#!/usr/bin/env python2.7
+"""
+copy the tx metadata from the csv tree (tx_metadata_dir in config.json) into the
+sqlite tx metadata store (tx_metadata_db in config.json). the csv tree is left
+untouched. set tx_metadata_backend to "sqlite" in config.json once this is
+complete.
+
+the sqlite store is given a new generation and the tx metadata bloom filter
+(tx_metadata_bloom_file in config.json) is deleted, so that the bloom filter is
+rebuilt from the migrated store on the next run.
+"""
+import os
+import sys
+import config_grunt
+import tx_metadata_grunt
+import progress_meter
+
+# commit to the sqlite file after this many tx hashes
+commit_interval = 100000
+
+def validate_script_usage():
+    if len(sys.argv) > 3:
+        raise ValueError(
+            "\n\nUsage: ./migrate_tx_metadata.py [<csv dir> [<sqlite file>]]\n"
+            "eg: ./migrate_tx_metadata.py ~/.btc-inquisitor/tx_metadata "
+            "~/.btc-inquisitor/tx_metadata.sqlite\n"
+            "the defaults are tx_metadata_dir and tx_metadata_db from "
+            "config.json\n\n"
+        )
+
+def get_stdin_params():
+    csv_dir = sys.argv[1] if len(sys.argv) > 1 \
+    else config_grunt.config_dict["tx_metadata_dir"]
+
+    sqlite_file = sys.argv[2] if len(sys.argv) > 2 \
+    else config_grunt.config_dict["tx_metadata_db"]
+
+    return (csv_dir, sqlite_file)
+
+def migrate(csv_dir, sqlite_file):
+    """copy all tx metadata in csv_dir to sqlite_file"""
+    tx_metadata_grunt.set_backend("sqlite", sqlite_file)
+    num_txs = 0
+    for (txhash, csv_lines) in tx_metadata_grunt.csv_tree_items(csv_dir):
+        tx_metadata_grunt.set_csv(txhash, csv_lines)
+        num_txs += 1
+        if not (num_txs % commit_interval):
+            tx_metadata_grunt.commit()
+            # the tree is walked in hash order, so the hash start shows
+            # how far through we are
+            progress_meter.render(
+                100 * int(txhash[: 6], 16) / float(0xffffff),
+                "migrated %d txs (up to %s)" % (num_txs, txhash[: 6])
+            )
+    for (txhash, block_height, tx_num) in \
+    tx_metadata_grunt.get_duplicate_txids_file(csv_dir):
+        tx_metadata_grunt.add_duplicate_txid(txhash, block_height, tx_num)
+    tx_metadata_grunt.new_generation()
+    tx_metadata_grunt.close()
+    progress_meter.done()
+    return num_txs
+
+def delete_bloom_filter():
+    """the bloom filter was built from the store before the migration"""
+    bloom_file = config_grunt.config_dict["tx_metadata_bloom_file"]
+    if os.path.isfile(bloom_file):
+        os.remove(bloom_file)
+
+if __name__ == '__main__':
+
+    validate_script_usage()
+    (csv_dir, sqlite_file) = get_stdin_params()
+    num_txs = migrate(csv_dir, sqlite_file)
+    delete_bloom_filter()
+    print "migrated the metadata for %d txs from %s to %s" \
+    % (num_txs, csv_dir, sqlite_file)
@@ -80,6 +80,9 @@ def explain(options):
 		elif output_type == "BALANCES":
 			s += "balances"
 
+	elif options.headers_only is not None:
+		s = "validating all block headers"
+
 	elif options.validate is not None:
 		s = "validating all blocks"
 
@@ -162,6 +165,10 @@ def explain(options):
 		pass
 	if orphan_options == "ONLY":
 		s += ", that %s orphan blocks" % are
+
+	if options.ASSUMEVALID is not None:
+		s += ", assuming that all scripts up to block hash %s are valid" \
+		% btc_grunt.bin2hex(options.ASSUMEVALID)
 		
 	if options.OUTPUT_TYPE is None:
 		s += "."
@@ -273,6 +280,28 @@ def sanitize_options_or_die(options):
 	if options.ENDBLOCKHASH is not None:
 		options.ENDBLOCKHASH = btc_grunt.hex2bin(options.ENDBLOCKHASH)
 
+	if (
+		(options.headers_only is not None) and
+		(options.validate is None)
+	):
+		raise ValueError(
+			"option --headers-only can only be used in conjunction with option"
+			" --validate (-v)."
+		)
+
+	if options.ASSUMEVALID is not None:
+		if options.validate is None:
+			raise ValueError(
+				"option --assume-valid can only be used in conjunction with"
+				" option --validate (-v)."
+			)
+		if not btc_grunt.valid_hex_hash(options.ASSUMEVALID):
+			raise ValueError(
+				"supplied assume-valid block hash %s is not in the correct"
+				" format." % options.ASSUMEVALID
+			)
+		options.ASSUMEVALID = btc_grunt.hex2bin(options.ASSUMEVALID)
+
 	num_start_options = 0
 	if options.STARTBLOCKDATE is not None:
 		num_start_options += 1
@@ -0,0 +1,221 @@
+"""
+module containing the orphan block tracker.
+
+the latest blocks seen during validation are kept in a ring indexed by block
+height, so that a block is dropped automatically once its height slot is
+reused. alongside the ring is a dict of every block in it, so that checking for
+a parent block is a single lookup. when a new block does not follow on from the
+previous tip then the blocks from the previous tip back to the fork are
+orphans - see add().
+
+known orphans are kept in a set and in known-orphans.txt, one "block height,
+block hash" line per orphan. new orphans are appended to the file and the file
+is only ever rewritten in full to compact it - see load_known_orphans().
+"""
+
+import os
+import config_grunt
+import filesystem_grunt
+
+# module globals - do not set here. use init_ring()
+ring = None # [[block hash, ...] for each height slot]
+ring_heights = None # [block height in each slot]
+blocks = {} # {block hash: (block height, previous block hash)} for the ring
+tip_hash = None
+tip_height = None
+
+# module globals - do not set here. use load_known_orphans()
+known_orphans_file = None
+orphan_hashes = set() # block hashes
+orphans_by_height = {} # {block height: set([block hash, ...])}
+
+def init_ring(ring_size = None):
+    """
+    initialize (or reinitialize) an empty ring. ring_size (in blocks) defaults
+    to the value in config.json.
+    """
+    global ring, ring_heights, blocks, tip_hash, tip_height
+    if ring_size is None:
+        ring_size = config_grunt.config_dict["orphan_ring_size"]
+    ring = [[] for i in xrange(ring_size)]
+    ring_heights = [None] * ring_size
+    blocks = {}
+    tip_hash = None
+    tip_height = None
+
+def add(block_hash, block_height, previous_block_hash):
+    """
+    add a block to the ring and make it the tip. return the blocks that this
+    orphans as a list of (block height, block hash), oldest last. the orphans
+    are also saved as known orphans.
+    """
+    global tip_hash, tip_height
+    put(block_hash, block_height, previous_block_hash)
+
+    new_orphans = [] # init
+    if (tip_hash is not None) and (previous_block_hash != tip_hash):
+        # walk back along both chains until they meet. the blocks on the old
+        # chain are orphans. stop if either chain runs off the end of the ring.
+        (old_hash, new_hash) = (tip_hash, previous_block_hash)
+        while (
+            (old_hash != new_hash) and
+            (old_hash in blocks) and
+            (new_hash in blocks)
+        ):
+            if blocks[old_hash][0] >= blocks[new_hash][0]:
+                new_orphans.append((blocks[old_hash][0], old_hash))
+                old_hash = blocks[old_hash][1]
+            else:
+                new_hash = blocks[new_hash][1]
+
+    (tip_hash, tip_height) = (block_hash, block_height)
+    save_new_orphans(new_orphans)
+    return new_orphans
+
+def put(block_hash, block_height, previous_block_hash):
+    """put a block in its height slot, dropping any older blocks in the slot"""
+    slot = block_height % len(ring)
+    if ring_heights[slot] != block_height:
+        for old_hash in ring[slot]:
+            del blocks[old_hash]
+        ring[slot] = []
+        ring_heights[slot] = block_height
+    if block_hash not in blocks:
+        ring[slot].append(block_hash)
+    blocks[block_hash] = (block_height, previous_block_hash)
+
+def disconnect_tip():
+    """
+    drop the tip from the ring and make its parent the tip again. the old tip
+    is saved as a known orphan. return the old tip hash.
+    """
+    global tip_hash, tip_height
+    (block_hash, block_height) = (tip_hash, tip_height)
+    previous_block_hash = blocks[block_hash][1]
+    if previous_block_hash not in blocks:
+        raise ValueError(
+            "cannot disconnect block %s since its parent is not in the ring"
+            % block_hash.encode("hex")
+        )
+    ring[block_height % len(ring)].remove(block_hash)
+    del blocks[block_hash]
+    (tip_hash, tip_height) = (
+        previous_block_hash, blocks[previous_block_hash][0]
+    )
+    save_new_orphans([(block_height, block_hash)])
+    return block_hash
+
+def has_block(block_hash):
+    """return True if the block is in the ring"""
+    return block_hash in blocks
+
+def snapshot():
+    """return the blocks in the ring as a list of (hash, height, prev hash)"""
+    if tip_hash is None:
+        return []
+    # the tip goes last, so that restore() makes it the tip again
+    return [
+        (block_hash, block_height, previous_block_hash) for (
+            block_hash, (block_height, previous_block_hash)
+        ) in sorted(blocks.items(), key = lambda item: item[1][0])
+        if block_hash != tip_hash
+    ] + [(tip_hash, tip_height, blocks[tip_hash][1])]
+
+def restore(items):
+    """load the blocks from snapshot(). do this straight after init_ring()"""
+    global tip_hash, tip_height
+    for (block_hash, block_height, previous_block_hash) in items:
+        # do not call add() here, since it would detect the orphans again
+        put(block_hash, block_height, previous_block_hash)
+        (tip_hash, tip_height) = (block_hash, block_height)
+
+def load_known_orphans(f_name = None):
+    """
+    load the known orphans from disk. f_name defaults to the value in
+    config.json.
+
+    the file format is "block height, block hash" per line (hash in hex). files
+    written before orphans were appended end with a full stop line. a line
+    without a newline at the end of the file is from an interrupted append and
+    is discarded. if any lines are discarded or duplicated then the file is
+    compacted.
+    """
+    global known_orphans_file, orphan_hashes, orphans_by_height
+    known_orphans_file = config_grunt.config_dict["known_orphans_file"] \
+    if f_name is None else f_name
+    orphan_hashes = set()
+    orphans_by_height = {}
+    if not os.path.isfile(known_orphans_file):
+        return
+
+    with open(known_orphans_file, "r") as f:
+        lines = f.readlines()
+
+    needs_compaction = False
+    for line in lines:
+        if (not line.endswith("\n")) or (line.strip() in ["", "."]):
+            needs_compaction = True
+            continue
+        (block_height, block_hash) = line.strip().split(",")
+        block_hash = block_hash.decode("hex")
+        if block_hash in orphan_hashes:
+            needs_compaction = True
+            continue
+        add_known_orphan(int(block_height), block_hash)
+
+    if needs_compaction:
+        compact()
+
+def add_known_orphan(block_height, block_hash):
+    orphan_hashes.add(block_hash)
+    if block_height not in orphans_by_height:
+        orphans_by_height[block_height] = set()
+    orphans_by_height[block_height].add(block_hash)
+
+def save_new_orphans(orphans):
+    """
+    append the orphans in the list of (block height, block hash) that are not
+    already known to disk, and make them known orphans
+    """
+    new_orphans = [
+        (block_height, block_hash) for (block_height, block_hash) in orphans
+        if block_hash not in orphan_hashes
+    ]
+    if not new_orphans:
+        return
+
+    filesystem_grunt.make_sure_path_exists(
+        os.path.dirname(os.path.abspath(known_orphans_file))
+    )
+    with open(known_orphans_file, "a") as f:
+        f.write(orphan_lines(new_orphans))
+        f.flush()
+        os.fsync(f.fileno())
+    for (block_height, block_hash) in new_orphans:
+        add_known_orphan(block_height, block_hash)
+
+def compact():
+    """atomically rewrite the known orphans file with one line per orphan"""
+    filesystem_grunt.write_file_atomically(known_orphans_file, orphan_lines([
+        (block_height, block_hash) for (block_height, block_hashes) in \
+        sorted(orphans_by_height.items()) for block_hash in sorted(block_hashes)
+    ]))
+
+def orphan_lines(orphans):
+    return "".join(
+        "%d,%s\n" % (block_height, block_hash.encode("hex"))
+        for (block_height, block_hash) in orphans
+    )
+
+def is_orphan(block_hash):
+    return block_hash in orphan_hashes
+
+def is_orphan_blockhashend(block_height, blockhashend):
+    """
+    same as is_orphan() but for when we only know the block height and the last
+    2 bytes of the block hash (eg for utxos)
+    """
+    return any(
+        block_hash[-2:] == blockhashend
+        for block_hash in orphans_by_height.get(block_height, ())
+    )
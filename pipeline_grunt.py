@@ -0,0 +1,157 @@
+"""
+module containing the plumbing for the staged validation pipeline - bounded
+queues between the stages, stage threads whose errors are handed back to the
+main thread, and per-stage throughput stats.
+
+each stage records how many items it has processed and how long it spent busy
+processing them (not waiting on its queues). the busy fraction of a stage is
+its busy time divided by the wall time (and by its number of workers). the
+stage with the highest busy fraction is the bottleneck - the other stages spend
+their time waiting on it.
+"""
+
+import threading, time, Queue, traceback
+
+# how often blocked queue operations wake up to check for errors
+poll_interval = 0.1 # seconds
+
+# module globals - do not set here. use init()
+stages = None # [stage name, ...] in pipeline order
+stats = None # {stage name: {"items", "busy", "workers"}}
+queues = None # {stage name: the queue feeding into the stage}
+threads = []
+errors = [] # [(stage name, traceback string), ...]
+stop_event = threading.Event()
+stats_lock = threading.Lock()
+start_time = None
+
+def init(stage_workers):
+    """
+    reset the pipeline. stage_workers is a list of (stage name, num workers) in
+    pipeline order.
+    """
+    global stages, stats, queues, threads, errors, start_time
+    stages = [name for (name, workers) in stage_workers]
+    stats = {
+        name: {"items": 0, "busy": 0.0, "workers": workers}
+        for (name, workers) in stage_workers
+    }
+    queues = {}
+    threads = []
+    errors = []
+    stop_event.clear()
+    start_time = time.time()
+
+def make_queue(stage_name, max_size):
+    """create the bounded queue which feeds into the named stage"""
+    queues[stage_name] = Queue.Queue(max_size)
+    return queues[stage_name]
+
+def record(stage_name, busy_seconds, num_items = 1):
+    """add to the stats for the named stage. safe to call from any thread"""
+    with stats_lock:
+        stats[stage_name]["items"] += num_items
+        stats[stage_name]["busy"] += busy_seconds
+
+def start_thread(stage_name, target, *args):
+    """
+    run target(*args) in a daemon thread. if it raises then the error is kept
+    for raise_error() and the whole pipeline is stopped.
+    """
+    def run():
+        try:
+            target(*args)
+        except Exception:
+            errors.append((stage_name, traceback.format_exc()))
+            stop_event.set()
+
+    thread = threading.Thread(
+        target = run, name = "%s pipeline stage" % stage_name
+    )
+    thread.daemon = True
+    threads.append(thread)
+    thread.start()
+    return thread
+
+def raise_error():
+    """re-raise the first error from any of the stage threads"""
+    if errors:
+        (stage_name, error) = errors[0]
+        raise Exception(
+            "the %s stage of the validation pipeline failed:\n%s"
+            % (stage_name, error)
+        )
+
+def stopped():
+    return stop_event.is_set()
+
+def put(queue, item):
+    """
+    put the item on the queue, waiting while the queue is full. return False
+    without putting the item if the pipeline stops in the meantime.
+    """
+    while not stopped():
+        try:
+            queue.put(item, timeout = poll_interval)
+            return True
+        except Queue.Full:
+            pass
+    return False
+
+def get(queue):
+    """
+    get the next item from the queue, waiting while the queue is empty. items
+    that were queued before a stage failed are still returned in order - the
+    error is only raised once the queue has been drained.
+    """
+    while True:
+        try:
+            return queue.get(timeout = poll_interval)
+        except Queue.Empty:
+            raise_error()
+
+def join(queue):
+    """wait until all items put on the queue have been processed"""
+    while queue.unfinished_tasks:
+        raise_error()
+        time.sleep(poll_interval)
+    raise_error()
+
+def shutdown():
+    """stop and wait for all stage threads"""
+    stop_event.set()
+    for thread in threads:
+        thread.join()
+    del threads[:]
+
+def busy_fraction(stage_name):
+    elapsed = time.time() - start_time
+    if elapsed <= 0:
+        return 0
+    stage = stats[stage_name]
+    return stage["busy"] / (elapsed * stage["workers"])
+
+def stats2short_str():
+    """a one line summary for the progress meter"""
+    return ", ".join(
+        "%s %d%%%s" % (
+            name, 100 * busy_fraction(name),
+            " q%d" % queues[name].qsize() if name in queues else ""
+        ) for name in stages
+    )
+
+def stats2human_str():
+    lines = ["validation pipeline (the busiest stage is the bottleneck):"]
+    for name in stages:
+        stage = stats[name]
+        rate = stage["items"] / stage["busy"] if stage["busy"] else 0
+        lines.append(
+            "- %s: %d items, %.1f items per busy second, %d worker(s) %d%%"
+            " busy%s" % (
+                name, stage["items"], rate, stage["workers"],
+                100 * busy_fraction(name),
+                ", queue %d/%d" % (queues[name].qsize(), queues[name].maxsize)
+                if name in queues else ""
+            )
+        )
+    return "\n".join(lines)
@@ -486,3 +486,161 @@ def update_merkle_root_status(valid, block_height):
         where block_height = %s
     """, (1 if valid else 0, block_height))
     return mysql_grunt.cursor.rowcount
+
+def get_tx_hashes_in_range(
+    validated, block_height_start, block_height_end
+):
+    """
+    get the merkle root and all tx hashes for every block in the range in a
+    single query. the range may include orphans, so there can be more than one
+    block at a height. the rows are ordered by block height, block hash then tx
+    num, so the tx hashes for each block are together and in merkle leaf order.
+    """
+    query = """select
+    hex(h.block_hash) as block_hash_hex,
+    h.block_height as block_height,
+    hex(h.merkle_root) as merkle_root_hex,
+    hex(t.tx_hash) as tx_hash_hex
+    from blockchain_headers h
+    inner join blockchain_txs t on h.block_hash = t.block_hash
+    where h.block_height >= %s
+    and h.block_height < %s
+    """
+
+    if validated is None:
+        query += "and h.merkle_root_validation_status is null\n"
+    elif validated == True:
+        query += "and h.merkle_root_validation_status = 1\n"
+    elif validated == False:
+        query += "and h.merkle_root_validation_status = 0\n"
+    elif validated == "set":
+        query += "and h.merkle_root_validation_status is not null\n"
+    elif validated == "any":
+        pass
+
+    query += "order by h.block_height asc, h.block_hash asc, t.tx_num asc"
+    return mysql_grunt.quick_fetch(
+        query, (block_height_start, block_height_end)
+    )
+
+def update_merkle_root_statuses(valid, block_hashes_hex):
+    "set the same merkle root status for all the block hashes in one query"
+    if not block_hashes_hex:
+        return 0
+    mysql_grunt.cursor.execute("""
+        update blockchain_headers
+        set merkle_root_validation_status = %%s
+        where block_hash in (%s)
+    """ % ", ".join(["unhex(%s)"] * len(block_hashes_hex)),
+    [1 if valid else 0] + list(block_hashes_hex))
+    return mysql_grunt.cursor.rowcount
+
+def get_txs_for_script_validation(block_height_start, block_height_end):
+    """
+    get the tx header and block header data that verify_script() needs for
+    every non-coinbase tx on the main chain in the range in a single query
+    """
+    return mysql_grunt.quick_fetch("""
+        select
+        tx.block_height as block_height,
+        h.timestamp as block_time,
+        h.version as block_version,
+        hex(tx.tx_hash) as tx_hash_hex,
+        tx.tx_version as tx_version,
+        tx.num_txins as num_txins,
+        tx.num_txouts as num_txouts,
+        tx.tx_lock_time as tx_lock_time
+        from blockchain_txs tx
+        inner join blockchain_headers h on tx.block_hash = h.block_hash
+        where tx.block_height >= %s
+        and tx.block_height < %s
+        and tx.tx_num != 0
+        and h.orphan_status = 0
+        order by tx.block_height asc, tx.tx_num asc
+    """, (block_height_start, block_height_end))
+
+def get_txins_with_prev_txout_scripts(block_height_start, block_height_end):
+    """
+    get every txin in the range joined to the script of the previous txout it
+    spends in a single query. the previous txout script is null if the
+    previous txout is not in the db.
+    """
+    return mysql_grunt.quick_fetch("""
+        select
+        hex(txin.tx_hash) as tx_hash_hex,
+        txin.txin_num as txin_num,
+        hex(txin.prev_txout_hash) as prev_txout_hash_hex,
+        txin.prev_txout_num as prev_txout_num,
+        hex(txin.script) as txin_script_hex,
+        txin.txin_sequence_num as txin_sequence_num,
+        txin.txin_checksig_validation_status as checksig_validation_status,
+        hex(txout.script) as prev_txout_script_hex
+        from blockchain_txins txin
+        left join blockchain_txouts txout on (
+            txin.prev_txout_hash = txout.tx_hash
+            and txin.prev_txout_num = txout.txout_num
+        )
+        where txin.block_height >= %s
+        and txin.block_height < %s
+    """, (block_height_start, block_height_end))
+
+def get_txouts_in_range(block_height_start, block_height_end):
+    return mysql_grunt.quick_fetch("""
+        select
+        hex(tx_hash) as tx_hash_hex,
+        txout_num,
+        funds,
+        hex(script) as script_hex
+        from blockchain_txouts
+        where block_height >= %s
+        and block_height < %s
+    """, (block_height_start, block_height_end))
+
+def update_txin_checksig_statuses(statuses):
+    """
+    statuses is a list of (valid, tx hash hex, txin num). update them all in one
+    batch
+    """
+    if not statuses:
+        return 0
+    mysql_grunt.cursor.executemany("""
+        update blockchain_txins
+        set txin_checksig_validation_status = %s
+        where tx_hash = unhex(%s)
+        and txin_num = %s
+    """, [
+        (1 if valid else 0, tx_hash_hex, txin_num)
+        for (valid, tx_hash_hex, txin_num) in statuses
+    ])
+    return mysql_grunt.cursor.rowcount
+
+def get_next_task(name, host):
+    """
+    get the latest task with this name for this host which has not been started
+    yet from the tasklist. higher ids take precedence. return None if there are
+    no tasks.
+    """
+    data = mysql_grunt.quick_fetch("""
+        select id, details from tasklist
+        where host = %s
+        and name = %s
+        and started is null
+        and ended is null
+        order by id desc
+        limit 1
+    """, (host, name))
+    return data[0] if len(data) else None
+
+def mark_task_started(task_id, host):
+    mysql_grunt.cursor.execute("""
+        update tasklist set started = now()
+        where id = %s
+        and host = %s
+    """, (task_id, host))
+
+def mark_task_ended(task_id, host):
+    mysql_grunt.cursor.execute("""
+        update tasklist set ended = now()
+        where id = %s
+        and host = %s
+    """, (task_id, host))
@@ -0,0 +1,59 @@
+"""
+module containing a cache of difficulty retarget periods - the bits and
+timestamp of the first block in the current and previous retarget periods.
+
+the bits of a block at a retarget height (a multiple of 2016) are calculated
+from the first block of the period before it (see btc_grunt.valid_bits()). the
+cache is updated as each block is validated, so that the block is always here
+when it is needed, rather than being looked up in the header chain or bitcoind
+at every retarget. the cache is tiny, so it is saved in the validation snapshot
+(see snapshot() and restore()) along with the bits data of the previous block.
+"""
+
+retarget_interval = 2016 # blocks
+
+# the number of retarget periods to keep - the current and the previous one
+num_periods = 2
+
+# module globals - reset with init()
+periods = {} # {first block height: (bits, timestamp)}
+stats = {"hits": 0, "misses": 0}
+
+def init():
+    """initialize (or reinitialize) an empty cache"""
+    global periods, stats
+    periods = {}
+    stats = {"hits": 0, "misses": 0}
+
+def is_period_start(block_height):
+    return not (block_height % retarget_interval)
+
+def update(block_height, bits, timestamp):
+    """
+    add the block to the cache if it is the first block of a retarget period,
+    then drop all but the latest num_periods periods. call this for every block
+    once it is valid.
+    """
+    if not is_period_start(block_height):
+        return
+    periods[block_height] = (bits, timestamp)
+    for old_height in sorted(periods)[: -num_periods]:
+        del periods[old_height]
+
+def get(block_height):
+    """
+    return (bits, timestamp) for the block at the start of a retarget period, or
+    None if it is not cached
+    """
+    period = periods.get(block_height)
+    stats["hits" if period is not None else "misses"] += 1
+    return period
+
+def snapshot():
+    """return the cached periods as a list of (height, (bits, timestamp))"""
+    return periods.items()
+
+def restore(items):
+    """load the periods from snapshot(). do this straight after init()"""
+    for (block_height, (bits, timestamp)) in items:
+        update(block_height, bits, timestamp)
@@ -0,0 +1,135 @@
+"""
+module containing the persistent cache of txin script verification results, so
+that a txin script which has passed verification once is not verified again
+on later runs (eg a rerun after a failure, or parallel workers covering the
+same blocks). validate_txin_scripts_in_db.py also reads the cache in db-update
+mode. validate_tx_scripts.py never uses it, since re-verifying is the point of
+that tool.
+
+each result is keyed by:
+
+- the tx hash and txin number - the tx hash covers the txin script
+- the sha256 hash of the previous txout script
+- the script rule flags for the block (see btc_grunt.get_script_flags())
+
+the txs in identical blocks always hit the same entries, while a txin which
+spends a different previous txout, or is verified under different rules, never
+does. only passing results are cached - a failure is always verified again so
+that it can be explained.
+
+all results are dropped if the stored engine_version differs from the one
+below. increment it whenever the script verification code changes its verdict
+on any script.
+"""
+
+import os, sqlite3, cPickle, hashlib
+import config_grunt
+import filesystem_grunt
+
+engine_version = 1
+
+# module globals - do not set here. use init()
+script_cache_file = None
+db = None
+pending = {} # results not yet written - {key: sig pubkey statuses}
+stats = {"hits": 0, "misses": 0}
+
+def init(f_name = None):
+    """
+    open (or create) the script cache. f_name defaults to the value in
+    config.json.
+    """
+    global script_cache_file, db, pending, stats
+    close()
+    script_cache_file = config_grunt.config_dict["script_cache_db"] \
+    if f_name is None else f_name
+    filesystem_grunt.make_sure_path_exists(
+        os.path.dirname(os.path.abspath(script_cache_file))
+    )
+    db = sqlite3.connect(script_cache_file)
+    db.text_factory = str
+    db.execute(
+        "create table if not exists results (txid blob not null,"
+        " txin_num integer not null, script_hash blob not null,"
+        " flags integer not null, sig_pubkey_statuses blob not null,"
+        " primary key (txid, txin_num, script_hash, flags)) without rowid"
+    )
+    db.execute(
+        "create table if not exists info (name text primary key, value integer)"
+    )
+    row = db.execute(
+        "select value from info where name = 'engine_version'"
+    ).fetchone()
+    if (row is None) or (row[0] != engine_version):
+        db.execute("delete from results")
+        db.execute(
+            "insert or replace into info (name, value)"
+            " values ('engine_version', ?)", (engine_version,)
+        )
+        db.commit()
+    pending = {}
+    stats = {"hits": 0, "misses": 0}
+
+def initialized():
+    return db is not None
+
+def commit():
+    """write all pending results in one pass and make them durable"""
+    global pending
+    if (db is None) or not pending:
+        return
+    db.executemany(
+        "insert or replace into results (txid, txin_num, script_hash, flags,"
+        " sig_pubkey_statuses) values (?, ?, ?, ?, ?)", (
+            (
+                buffer(txid), txin_num, buffer(script_hash), flags,
+                buffer(cPickle.dumps(statuses, cPickle.HIGHEST_PROTOCOL))
+            ) for ((txid, txin_num, script_hash, flags), statuses) in \
+            pending.iteritems()
+        )
+    )
+    db.commit()
+    pending = {}
+
+def close():
+    global db
+    if db is not None:
+        commit()
+        db.close()
+        db = None
+
+def make_key(txid, txin_num, prev_txout_script, flags):
+    return (txid, txin_num, hashlib.sha256(prev_txout_script).digest(), flags)
+
+def get(txid, txin_num, prev_txout_script, flags):
+    """
+    return the sig pubkey statuses of the passing result for the txin, or None
+    if it has not passed before under these rules
+    """
+    key = make_key(txid, txin_num, prev_txout_script, flags)
+    statuses = pending.get(key)
+    if statuses is None:
+        row = db.execute(
+            "select sig_pubkey_statuses from results where txid = ? and"
+            " txin_num = ? and script_hash = ? and flags = ?",
+            (buffer(key[0]), key[1], buffer(key[2]), key[3])
+        ).fetchone()
+        if row is not None:
+            statuses = cPickle.loads(str(row[0]))
+
+    stats["hits" if statuses is not None else "misses"] += 1
+    return statuses
+
+def add(txid, txin_num, prev_txout_script, flags, sig_pubkey_statuses):
+    """
+    cache a passing result. it is not written until commit() is called
+    """
+    pending[make_key(txid, txin_num, prev_txout_script, flags)] = \
+    sig_pubkey_statuses
+
+def stats2human_str():
+    lookups = stats["hits"] + stats["misses"]
+    return "script cache: %d lookups, %d hits (%.1f%%)" % (
+        lookups, stats["hits"],
+        100.0 * stats["hits"] / lookups if lookups else 0
+    )
@@ -0,0 +1,70 @@
+"""
+module containing crash-safe snapshots of the in-memory validation state.
+
+without a snapshot, validation resumes from latest-validated-block.txt with an
+orphan tracker containing only that block and an empty utxo set, and this state
+is only rebuilt slowly as validation carries on. a snapshot holds this state as it
+was straight after the latest validated block was saved, so that it can be
+picked up again in one read.
+
+a snapshot is a single pickled dict. it is written to a temp file which is then
+renamed over the previous snapshot, so the snapshot on disk is always either
+the old one or the new one in full. a snapshot is only usable if it was taken
+at the same block that latest-validated-block.txt holds - see load().
+"""
+
+import os, cPickle
+import config_grunt
+import filesystem_grunt
+
+# increment this whenever the format of the snapshot dict changes, so that old
+# snapshots are ignored rather than misread
+snapshot_version = 3
+
+def get_snapshot_file(f_name = None):
+    if f_name is None:
+        return config_grunt.config_dict["validation_snapshot_file"]
+    return f_name
+
+def save(block_hash, block_height, state, f_name = None):
+    """
+    atomically save the state dict as the snapshot for the given block. block
+    hash is binary. f_name defaults to the value in config.json.
+    """
+    f_name = get_snapshot_file(f_name)
+    filesystem_grunt.make_sure_path_exists(
+        os.path.dirname(os.path.abspath(f_name))
+    )
+    filesystem_grunt.write_file_atomically(f_name, cPickle.dumps({
+        "version": snapshot_version,
+        "block_hash": block_hash,
+        "block_height": block_height,
+        "state": state
+    }, cPickle.HIGHEST_PROTOCOL))
+
+def load(block_hash, block_height, f_name = None):
+    """
+    return the state dict from the snapshot, but only if it was taken at the
+    given block (binary hash). otherwise return None - the snapshot is stale (or
+    from the future) and the state would not match the data on disk.
+    """
+    f_name = get_snapshot_file(f_name)
+    if not os.path.isfile(f_name):
+        return None
+
+    try:
+        with open(f_name, "rb") as f:
+            snapshot = cPickle.load(f)
+    except Exception:
+        # unreadable snapshots are just ignored, they only speed things up
+        return None
+
+    if (
+        (not isinstance(snapshot, dict)) or
+        (snapshot.get("version") != snapshot_version) or
+        (snapshot.get("block_hash") != block_hash) or
+        (snapshot.get("block_height") != block_height)
+    ):
+        return None
+
+    return snapshot["state"]
@@ -0,0 +1,86 @@
+"""
+module containing the chain tip watcher - a background thread which polls
+bitcoind for its latest block on a timer. callers read the cached tip from here
+instead of making an rpc every time they need to know the latest block.
+
+the tip is polled with a callback so that this module does not need to know how
+to talk to bitcoind (see btc_grunt.poll_chain_tip()). the callback is given the
+previous tip and returns the new tip as a dict with at least "height" and
+"hash" elements. it can return the previous tip unchanged to save work when
+the best block has not changed.
+"""
+
+import threading, time
+import config_grunt
+
+# module globals - do not set here. use start()
+tip = None # {"height": latest block height, "hash": latest block hash, ...}
+refresh_interval = None # seconds
+poll_tip = None # callback - see start()
+watcher = None
+stop_event = threading.Event()
+stats = None
+
+def start(poll_tip_callback, connect = None, interval = None):
+    """
+    poll the tip once straight away, so that it is available as soon as this
+    returns, then start the watcher thread to keep it up to date. connect() is
+    called at the start of the watcher thread, for callbacks which need a
+    connection per thread. interval (in seconds) defaults to the value in
+    config.json.
+    """
+    global tip, refresh_interval, poll_tip, watcher, stats
+    stop()
+    refresh_interval = config_grunt.config_dict[
+        "chain_tip_refresh_interval"
+    ] if interval is None else interval
+    poll_tip = poll_tip_callback
+    stats = {"polls": 1, "changes": 0, "errors": 0, "last_error": None}
+    tip = poll_tip(None)
+
+    stop_event.clear()
+    watcher = threading.Thread(
+        target = watch, args = (connect,), name = "chain tip watcher"
+    )
+    watcher.daemon = True
+    watcher.start()
+
+def stop():
+    """stop the watcher thread, if it is running. the last tip is kept"""
+    global watcher
+    if watcher is None:
+        return
+    stop_event.set()
+    watcher.join()
+    watcher = None
+
+def is_running():
+    return watcher is not None
+
+def watch(connect):
+    """
+    the watcher thread. a failed poll keeps the previous tip - whatever needs
+    bitcoind next will report the problem properly.
+    """
+    global tip
+    if connect is not None:
+        connect()
+    while not stop_event.wait(refresh_interval):
+        stats["polls"] += 1
+        try:
+            new_tip = poll_tip(tip)
+        except Exception as e:
+            stats["errors"] += 1
+            stats["last_error"] = str(e)
+            continue
+        if new_tip is not tip:
+            stats["changes"] += 1
+            tip = new_tip # a single assignment, so readers never see a mixture
+
+def get_height():
+    """the height of the latest block at the last poll"""
+    return tip["height"]
+
+def get_hash():
+    """the hash of the latest block at the last poll"""
+    return tip["hash"]
@@ -0,0 +1,664 @@
+"""
+module containing the storage backends for the tx metadata.
+
+the tx metadata for each tx hash is a list of csv strings - one line per
+blockhashend-txnum (see btc_grunt.tx_metadata_keynames for the columns). this
+module only stores and retrieves these lines. converting them to and from dicts
+and merging new data into old data is done in btc_grunt.
+
+the backend is set by tx_metadata_backend in config.json:
+
+- "csv" - the original tree of up to 0xff^3 = 16,777,216 files like
+tx_metadata_dir/2e/a1/21.txt. all tx hashes beginning with the same 6
+characters share a file, and each line begins with the remainder of the hash.
+every update is a read-modify-write of the whole file.
+
+- "sqlite" - a single sqlite file at tx_metadata_db, keyed by the binary tx
+hash. the value is the csv lines for that tx hash only, with the tx hash column
+left empty since it is already in the key.
+
+the default is "csv". to switch an existing installation to sqlite, run
+migrate_tx_metadata.py to copy the csv tree into sqlite and then set
+tx_metadata_backend to "sqlite". see check_store().
+"""
+
+import os, binascii, hashlib, sqlite3, struct, threading
+import config_grunt
+import filesystem_grunt
+
+backends = ["csv", "sqlite"]
+
+# the files in the csv tree which hold the generation of the store and the
+# duplicate txids. they are not part of the tree since their names are not 2 hex
+# characters long.
+generation_file = "generation.txt"
+duplicate_txids_file = "duplicate_txids.txt"
+
+# module globals - do not set here. use set_backend()
+backend = None
+tx_metadata_dir = None
+tx_metadata_db = None
+db = None # the sqlite connection. only opened upon first use
+
+def set_backend(new_backend = None, path = None):
+    """
+    select the storage backend. if path is not specified then the location
+    comes from config.json (tx_metadata_dir for csv and tx_metadata_db for
+    sqlite)
+    """
+    global backend, tx_metadata_dir, tx_metadata_db
+    if new_backend is None:
+        new_backend = config_grunt.config_dict["tx_metadata_backend"]
+
+    if new_backend not in backends:
+        raise ValueError(
+            "unrecognized tx metadata backend %s. use one of %s"
+            % (new_backend, ", ".join(backends))
+        )
+    close()
+    backend = new_backend
+    if backend == "csv":
+        tx_metadata_dir = config_grunt.config_dict["tx_metadata_dir"] \
+        if path is None else path
+    elif backend == "sqlite":
+        tx_metadata_db = config_grunt.config_dict["tx_metadata_db"] \
+        if path is None else path
+
+def connect():
+    """
+    open a new connection to the sqlite file. each thread needs its own
+    connection. wait for other connections to finish writing rather than
+    failing straight away.
+    """
+    filesystem_grunt.make_sure_path_exists(
+        os.path.dirname(os.path.abspath(tx_metadata_db))
+    )
+    conn = sqlite3.connect(tx_metadata_db, timeout = 60)
+    conn.text_factory = str
+    conn.execute(
+        "create table if not exists tx_metadata ("
+        "txid blob primary key, csv text not null)"
+    )
+    conn.execute(
+        "create table if not exists store_info ("
+        "name text primary key, value text not null)"
+    )
+    conn.execute(
+        "create table if not exists duplicate_txids (txid blob not null,"
+        " block_height integer not null, tx_num integer not null,"
+        " primary key (txid, block_height, tx_num)) without rowid"
+    )
+    return conn
+
+def get_db():
+    global db
+    if db is None:
+        db = connect()
+    return db
+
+def commit():
+    """make all writes since the last commit durable"""
+    if db is not None:
+        db.commit()
+
+def close():
+    global db
+    if db is not None:
+        db.commit()
+        db.close()
+        db = None
+
+def get_generation():
+    """
+    return the generation of the store - a random id which changes whenever the
+    store is rewritten outside validation (see new_generation()). a store
+    without a generation is given a new one.
+    """
+    if backend == "sqlite":
+        row = get_db().execute(
+            "select value from store_info where name = 'generation'"
+        ).fetchone()
+        if row is not None:
+            return row[0]
+    else:
+        f_name = os.path.join(tx_metadata_dir, generation_file)
+        if os.path.isfile(f_name):
+            with open(f_name, "r") as f:
+                return f.read().strip()
+    return new_generation()
+
+def new_generation():
+    """
+    give the store a new generation. call this after changing the store outside
+    validation, so that anything derived from the store (eg the bloom filter)
+    is rebuilt.
+    """
+    generation = binascii.b2a_hex(os.urandom(16))
+    if backend == "sqlite":
+        get_db().execute(
+            "insert or replace into store_info (name, value) values"
+            " ('generation', ?)", (generation,)
+        )
+        get_db().commit()
+    else:
+        filesystem_grunt.make_sure_path_exists(tx_metadata_dir)
+        filesystem_grunt.write_file_atomically(
+            os.path.join(tx_metadata_dir, generation_file), generation
+        )
+    return generation
+
+def get_duplicate_txids():
+    """
+    return every instance of the tx hashes which are known to have more than one
+    instance in the store, as a list of (tx hash hex, block height, tx num). see
+    add_duplicate_txid().
+    """
+    if backend == "sqlite":
+        return [
+            (binascii.b2a_hex(txid), block_height, tx_num)
+            for (txid, block_height, tx_num) in get_db().execute(
+                "select txid, block_height, tx_num from duplicate_txids"
+            )
+        ]
+    return get_duplicate_txids_file(tx_metadata_dir)
+
+def get_duplicate_txids_file(csv_dir):
+    """get_duplicate_txids() for the csv tree in csv_dir"""
+    duplicates = []
+    for line in read_file_lines(os.path.join(csv_dir, duplicate_txids_file)) \
+    or []:
+        if line:
+            (txhash, block_height, tx_num) = line.split(",")
+            duplicates.append((txhash, int(block_height), int(tx_num)))
+    return duplicates
+
+def add_duplicate_txid(txhash, block_height, tx_num):
+    """
+    save an instance of a tx hash (hex) which has more than one instance in the
+    store. this is written straight away rather than with the tx metadata,
+    since a duplicate which is missing after a crash could be taken for a
+    unique tx hash, while an extra one does no harm.
+    """
+    if backend == "sqlite":
+        get_db().execute(
+            "insert or ignore into duplicate_txids (txid, block_height, tx_num)"
+            " values (?, ?, ?)",
+            (buffer(binascii.a2b_hex(txhash)), block_height, tx_num)
+        )
+        get_db().commit()
+    else:
+        filesystem_grunt.make_sure_path_exists(tx_metadata_dir)
+        with open(
+            os.path.join(tx_metadata_dir, duplicate_txids_file), "a"
+        ) as f:
+            f.write("%s,%d,%d\n" % (txhash, block_height, tx_num))
+            f.flush()
+            os.fsync(f.fileno())
+
+def get_store_id():
+    """
+    return a 32 byte id for the current store. the id changes if the backend,
+    the location of the store or its generation changes.
+    """
+    path = tx_metadata_db if backend == "sqlite" else tx_metadata_dir
+    return hashlib.sha256("%s\n%s\n%s" % (
+        backend, os.path.abspath(path), get_generation()
+    )).digest()
+
+def get_csv(txhash, conn = None):
+    """
+    given a tx hash (as a hex string), return its tx metadata as a list of csv
+    strings - one per line, each beginning with the full tx hash. return None if
+    there is no metadata for this tx hash (eg because the tx is in the block
+    currently being processed and has not been saved yet). conn is only needed
+    when using sqlite from a thread other than the main thread.
+    """
+    if backend == "sqlite":
+        return get_csv_sqlite(txhash, conn)
+    return get_csv_file(txhash)
+
+def set_csv(txhash, csv_lines):
+    """
+    overwrite the tx metadata for the given tx hash (as a hex string) with the
+    list of csv strings. each line must begin with the full tx hash.
+    """
+    if backend == "sqlite":
+        set_csv_sqlite(txhash, csv_lines)
+    else:
+        set_csv_file(txhash, csv_lines)
+
+def set_csv_batch(txs, conn = None):
+    """
+    overwrite the tx metadata for many tx hashes in one pass and make it
+    durable. txs is a dict in the format {txhash: [csv lines]}. an empty list
+    of csv lines deletes the tx metadata for the tx hash. for sqlite this
+    is a single transaction. for the csv tree the tx hashes are grouped by file
+    so that each file is rewritten only once, and each file is replaced
+    atomically.
+    """
+    if backend == "sqlite":
+        set_csv_batch_sqlite(txs, conn)
+    else:
+        set_csv_batch_file(txs)
+
+def get_csv_sqlite(txhash, conn = None):
+    row = (conn or get_db()).execute(
+        "select csv from tx_metadata where txid = ?",
+        (buffer(binascii.a2b_hex(txhash)),)
+    ).fetchone()
+    if row is None:
+        return None
+    return ["%s%s" % (txhash, line) for line in row[0].split("\n")]
+
+def set_csv_sqlite(txhash, csv_lines):
+    # strip the tx hash from the start of each line since it is the key
+    get_db().execute(
+        "insert or replace into tx_metadata (txid, csv) values (?, ?)", (
+            buffer(binascii.a2b_hex(txhash)),
+            "\n".join(line[len(txhash):] for line in csv_lines)
+        )
+    )
+
+def set_csv_batch_sqlite(txs, conn = None):
+    conn = conn or get_db()
+    conn.executemany(
+        "insert or replace into tx_metadata (txid, csv) values (?, ?)", ((
+            buffer(binascii.a2b_hex(txhash)),
+            "\n".join(line[len(txhash):] for line in csv_lines)
+        ) for (txhash, csv_lines) in txs.iteritems() if csv_lines)
+    )
+    conn.executemany(
+        "delete from tx_metadata where txid = ?", (
+            (buffer(binascii.a2b_hex(txhash)),)
+            for (txhash, csv_lines) in txs.iteritems() if not csv_lines
+        )
+    )
+    conn.commit()
+
+def hash2dir_and_filename_and_hashend(hash64 = ""):
+    """
+    convert a 64 character hash, eg 2ea121e32934b7348445f09f46d03dda69117f2540de
+    16436835db7f032370d0 to a directory structure like base_dir/2e/a1/21.txt
+    the remainder of the hash will be stored within this file
+    """
+    n = 2 # max dirname length
+    hash_elements = [hash64[i: i + n] for i in range(0, 6, n)]
+    f_dir = os.path.join(
+        os.path.join(tx_metadata_dir, *hash_elements[: -1]), ""
+    )
+    f_name = os.path.join(f_dir, "%s.txt" % hash_elements[-1])
+    hashend = hash64[6:]
+    return (f_dir, f_name, hashend)
+
+def read_file_lines(f_name):
+    """return all lines in the csv file without newlines, or None"""
+    try:
+        with open(f_name, "r") as f:
+            return [line.translate(None, "\n\r") for line in f]
+    except IOError:
+        return None
+
+def get_csv_file(txhash):
+    (f_dir, f_name, hashend) = hash2dir_and_filename_and_hashend(txhash)
+    lines = read_file_lines(f_name)
+    if lines is None:
+        return None
+
+    # the file also contains other tx hashes that begin with the same 6
+    # characters. prepend the first 6 characters to create a complete hash
+    hashstart = txhash[: 64 - len(hashend)]
+    data = [
+        "%s%s" % (hashstart, line) for line in lines
+        if line.startswith("%s," % hashend)
+    ]
+    return data if data else None
+
+def set_csv_file(txhash, csv_lines):
+    (f_dir, f_name, hashend) = hash2dir_and_filename_and_hashend(txhash)
+    filesystem_grunt.make_sure_path_exists(f_dir)
+
+    # keep the lines for the other tx hashes in this file
+    lines = read_file_lines(f_name) or []
+    lines = [line for line in lines if not line.startswith("%s," % hashend)]
+    hashstart_len = 64 - len(hashend)
+    lines.extend(line[hashstart_len:] for line in csv_lines)
+    filesystem_grunt.write_file_atomically(f_name, "\n".join(lines))
+
+def set_csv_batch_file(txs):
+    # group the tx hashes by file - {f_name: [f_dir, {hashend: [csv lines]}]}
+    files = {}
+    for (txhash, csv_lines) in txs.iteritems():
+        (f_dir, f_name, hashend) = hash2dir_and_filename_and_hashend(txhash)
+        hashstart_len = 64 - len(hashend)
+        if f_name not in files:
+            files[f_name] = [f_dir, {}]
+        files[f_name][1][hashend] = [
+            line[hashstart_len:] for line in csv_lines
+        ]
+    for (f_name, (f_dir, hashends)) in files.iteritems():
+        filesystem_grunt.make_sure_path_exists(f_dir)
+
+        # keep the lines for the other tx hashes in this file
+        lines = [
+            line for line in (read_file_lines(f_name) or [])
+            if line.split(",", 1)[0] not in hashends
+        ]
+        for hashend_lines in hashends.itervalues():
+            lines.extend(hashend_lines)
+
+        filesystem_grunt.write_file_atomically(f_name, "\n".join(lines))
+
+def all_txids():
+    """
+    generator which yields every binary tx hash in the store, including those
+    that are only in the journal so far
+    """
+    if backend == "sqlite":
+        for (txid,) in get_db().execute("select txid from tx_metadata"):
+            yield str(txid)
+    else:
+        for (txhash, csv_lines) in csv_tree_items(tx_metadata_dir):
+            yield binascii.a2b_hex(txhash)
+
+    with journal_lock:
+        txids = journal_index.keys()
+    for txid in txids:
+        yield txid
+
+def check_store(csv_dir = None):
+    """
+    refuse to use an empty sqlite store when the csv tree has tx metadata in it.
+    this happens when tx_metadata_backend is switched to sqlite without running
+    migrate_tx_metadata.py first. validation would then resume without any of
+    the earlier spends, and miss double spends of earlier txouts. csv_dir
+    defaults to tx_metadata_dir in config.json.
+    """
+    if backend != "sqlite":
+        return
+    if get_db().execute("select 1 from tx_metadata limit 1").fetchone():
+        return
+    if csv_dir is None:
+        csv_dir = config_grunt.config_dict["tx_metadata_dir"]
+    if next(csv_tree_items(csv_dir), None) is None:
+        return
+    raise IOError(
+        "the sqlite tx metadata store %s is empty but the csv tree %s is not."
+        " run migrate_tx_metadata.py before setting tx_metadata_backend to"
+        " sqlite in config.json" % (tx_metadata_db, csv_dir)
+    )
+
+def csv_tree_items(csv_dir):
+    """
+    generator which walks the csv tree in csv_dir and yields (tx hash, csv
+    lines) for each tx hash found. each line begins with the full tx hash.
+    """
+    for (dir_path, dir_names, file_names) in os.walk(csv_dir):
+        dir_names.sort()
+        for file_name in sorted(file_names):
+            if not file_name.endswith(".txt"):
+                continue
+
+            hashstart = "".join(
+                os.path.relpath(dir_path, csv_dir).split(os.sep) +
+                [file_name[: -4]]
+            )
+            if len(hashstart) != 6:
+                continue # not part of the tree
+
+            txs = {} # {txhash: [csv lines]}
+            for line in read_file_lines(os.path.join(dir_path, file_name)):
+                if not line:
+                    continue
+                txhash = "%s%s" % (hashstart, line.split(",", 1)[0])
+                txs.setdefault(txhash, []).append("%s%s" % (hashstart, line))
+
+            for (txhash, csv_lines) in sorted(txs.items()):
+                yield (txhash, csv_lines)
+
+################################################################################
+# append-only journal
+################################################################################
+
+# when the journal is open, creates and spends are appended to the journal file
+# as fixed-size binary records instead of rewriting the tx metadata in the
+# store. a background thread (the compactor) periodically folds the journal
+# into the store. until then, lookups apply the journal records for a tx hash
+# on top of whatever is in the store (see get_journal_records()).
+#
+# record format:
+# - kind (1 byte) - journal_create or journal_spend
+# - tx hash (32 bytes, binary) - the created tx, or the spendee tx
+# - last 2 bytes of the block hash of the created/spendee tx
+# - tx num of the created/spendee tx within its block (4 bytes)
+# - create: block height, spend: spendee txout index (4 bytes)
+# - create: num txouts, spend: spender txin index (4 bytes)
+# - create: flags (journal_coinbase_flag, journal_orphan_flag), spend: 0
+# - create: blank, spend: first 2 bytes of the spender tx hash
+journal_record_format = "<B32s2sIIIB2s"
+journal_record_size = struct.calcsize(journal_record_format)
+journal_create = 0
+journal_spend = 1
+journal_coinbase_flag = 0x01
+journal_orphan_flag = 0x02
+
+# module globals - do not set here. use open_journal()
+journal_file = None
+journal_fh = None
+journal_index = {} # {binary tx hash: [record tuple, ...]} in journal order
+journal_generation = [] # records appended since the journal was last rotated
+journal_lock = threading.Lock()
+compactor = None
+compactor_wake = threading.Event()
+compactor_stop = False
+compactor_final_compact = False
+compactor_error = None
+compact_records = None # compact once the journal has this many records
+compact_interval = None # seconds
+fold_records = None # callback - see open_journal()
+
+def pack_journal_record(record):
+    return struct.pack(journal_record_format, *record)
+
+def read_journal_records(f_name):
+    """
+    return all complete records in the journal file. a partial record at the end
+    of the file (interrupted write) is discarded and truncated from the file.
+    """
+    if not os.path.isfile(f_name):
+        return []
+
+    with open(f_name, "r+b") as f:
+        data = f.read()
+        num_records = len(data) / journal_record_size
+        if len(data) != num_records * journal_record_size:
+            f.truncate(num_records * journal_record_size)
+
+    return [
+        struct.unpack_from(journal_record_format, data, i * journal_record_size)
+        for i in xrange(num_records)
+    ]
+
+def rotated_journal_file():
+    return "%s.compacting" % journal_file
+
+def journal_is_open():
+    return journal_fh is not None
+
+def open_journal(fold_records_callback, f_name = None):
+    """
+    open the journal for appending and start the background compactor. any
+    records left in the journal from a previous run are loaded into the index
+    first, so that lookups remain correct.
+
+    fold_records_callback(txhash, csv_lines, records) must return the new csv
+    lines for the tx hash (as a hex string) given the csv lines currently in the
+    store (or None) and the list of journal records to apply. it must be safe to
+    apply the same records more than once.
+    """
+    global journal_file, journal_fh, journal_index, journal_generation, \
+    compactor, compactor_stop, compactor_error, compact_records, \
+    compact_interval, fold_records
+
+    if journal_is_open():
+        close_journal()
+
+    journal_file = config_grunt.config_dict["tx_metadata_journal_file"] \
+    if f_name is None else f_name
+    compact_records = config_grunt.config_dict[
+        "tx_metadata_journal_compact_records"
+    ]
+    compact_interval = config_grunt.config_dict[
+        "tx_metadata_journal_compact_interval"
+    ]
+    fold_records = fold_records_callback
+    filesystem_grunt.make_sure_path_exists(
+        os.path.dirname(os.path.abspath(journal_file))
+    )
+    # a rotated journal means that the last compaction never completed
+    rotated_records = read_journal_records(rotated_journal_file())
+    if (not rotated_records) and os.path.isfile(rotated_journal_file()):
+        # remove an empty rotated journal now, before the compactor starts and
+        # before the journal can be rotated again
+        os.remove(rotated_journal_file())
+    journal_generation = read_journal_records(journal_file)
+    journal_index = {}
+    for record in rotated_records + journal_generation:
+        journal_index.setdefault(record[1], []).append(record)
+
+    journal_fh = open(journal_file, "ab")
+    compactor_stop = False
+    compactor_error = None
+    compactor_wake.clear()
+    compactor = threading.Thread(
+        target = compactor_loop, args = (rotated_records,),
+        name = "tx metadata compactor"
+    )
+    compactor.daemon = True
+    compactor.start()
+
+def close_journal(compact_now = True):
+    """
+    stop the compactor (after folding the whole journal into the store if
+    compact_now is set) and close the journal
+    """
+    global journal_fh, compactor, compactor_stop, compactor_final_compact
+    if not journal_is_open():
+        return
+
+    compactor_stop = True
+    compactor_final_compact = compact_now
+    compactor_wake.set()
+    compactor.join()
+    compactor = None
+    journal_fh.close()
+    journal_fh = None
+    raise_compactor_error()
+
+def raise_compactor_error():
+    if compactor_error is not None:
+        raise IOError(
+            "the tx metadata compactor failed: %s" % compactor_error
+        )
+
+def append_journal_records(records):
+    """
+    append the records to the journal in one sequential write and make them
+    durable
+    """
+    raise_compactor_error()
+    if not records:
+        return
+
+    data = "".join(pack_journal_record(record) for record in records)
+    with journal_lock:
+        journal_fh.write(data)
+        journal_fh.flush()
+        os.fsync(journal_fh.fileno())
+        journal_generation.extend(records)
+        for record in records:
+            journal_index.setdefault(record[1], []).append(record)
+
+        if len(journal_generation) >= compact_records:
+            compactor_wake.set()
+
+def get_journal_records(txid):
+    """
+    return the journal records for the binary tx hash that have not yet been
+    folded into the store, in journal order. always get these before reading
+    the store - the compactor writes to the store before dropping records from
+    the index, so the records are then either still here or already in the
+    store (or both, which is harmless).
+    """
+    with journal_lock:
+        return list(journal_index.get(txid, []))
+
+def rotate_journal():
+    """
+    move the current journal aside for compaction and start a new one. return
+    the records in the moved journal.
+    """
+    global journal_fh, journal_generation
+    with journal_lock:
+        records = journal_generation
+        journal_fh.close()
+        os.rename(journal_file, rotated_journal_file())
+        journal_fh = open(journal_file, "ab")
+        journal_generation = []
+    return records
+
+def compact(records, conn = None):
+    """
+    fold the records from the rotated journal into the store, then delete the
+    rotated journal and drop the records from the index
+    """
+    txs = {} # {binary tx hash: [record, ...]}
+    for record in records:
+        txs.setdefault(record[1], []).append(record)
+
+    updates = {}
+    for (txid, tx_records) in txs.iteritems():
+        txhash = binascii.b2a_hex(txid)
+        updates[txhash] = fold_records(
+            txhash, get_csv(txhash, conn), tx_records
+        )
+    set_csv_batch(updates, conn)
+
+    with journal_lock:
+        # the rotated records are always the oldest records for each tx hash
+        for (txid, tx_records) in txs.iteritems():
+            remaining = journal_index[txid][len(tx_records):]
+            if remaining:
+                journal_index[txid] = remaining
+            else:
+                del journal_index[txid]
+
+    os.remove(rotated_journal_file())
+
+def compactor_loop(rotated_records):
+    """
+    the background compactor thread. wake up every compact_interval seconds, or
+    when the journal has grown to compact_records, and fold the journal into the
+    store.
+    """
+    global compactor_error
+    conn = connect() if backend == "sqlite" else None
+    try:
+        if rotated_records:
+            compact(rotated_records, conn)
+
+        while True:
+            compactor_wake.wait(compact_interval)
+            compactor_wake.clear()
+            if compactor_stop and not compactor_final_compact:
+                break
+            if journal_generation:
+                compact(rotate_journal(), conn)
+            if compactor_stop:
+                break
+    except Exception as e:
+        compactor_error = e
+    finally:
+        if conn is not None:
+            conn.close()
+
+set_backend()
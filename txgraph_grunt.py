@@ -0,0 +1,89 @@
+"""
+module containing the dependency graph of the txs within a block.
+
+a tx depends on an earlier tx in the same block if it spends one of its txouts
+(see btc_grunt.add_missing_prev_txs()), or if it spends the same txout as the
+earlier tx (a double spend, which validation must catch in block order). the
+txs are grouped into topological levels - every tx is in the level after the
+latest level of the txs it depends on. the txs within a level do not depend on
+each other, so btc_grunt.validate_block() can take them in any order within the
+level, as long as the levels themselves are processed in order. txs in the
+same level may still spend different txouts of the same previous tx, so the
+same block double spend check must be per txout (see
+btc_grunt.record_same_block_spend()).
+
+validate_block() still validates one tx at a time - nothing here runs
+concurrently. level stats are kept for all blocks, to show how much
+parallelism real blocks would allow.
+"""
+
+# module globals - reset with init()
+stats = {"blocks": 0, "txs": 0, "levels": 0, "max_levels": 0, "max_width": 0}
+
+def init():
+    """reset the level stats"""
+    global stats
+    stats = {
+        "blocks": 0, "txs": 0, "levels": 0, "max_levels": 0, "max_width": 0
+    }
+
+def build_block_dependency_graph(parsed_block):
+    """
+    return the dependencies of each tx in the parsed block, in the format {tx
+    num: set([tx num, ...])}. only earlier txs are dependencies - a tx which
+    spends a later tx in the block is invalid, and validation reports that.
+    """
+    graph = {}
+    tx_nums = {} # {txid: [tx num, ...]} for the txs so far
+    spenders = {} # {(txid, txout index): tx num} for the txouts spent so far
+    for (tx_num, tx) in sorted(parsed_block["tx"].items()):
+        graph[tx_num] = set()
+        # coinbase txs do not spend any txouts
+        if tx_num != 0:
+            for txin in tx["input"].values():
+                # txids are not unique, so depend on every earlier tx with
+                # this txid
+                graph[tx_num].update(tx_nums.get(txin["hash"], ()))
+                outpoint = (txin["hash"], txin["index"])
+                if outpoint in spenders:
+                    graph[tx_num].add(spenders[outpoint])
+                spenders[outpoint] = tx_num
+
+        if tx["hash"] not in tx_nums:
+            tx_nums[tx["hash"]] = []
+        tx_nums[tx["hash"]].append(tx_num)
+    return graph
+
+def get_levels(graph):
+    """
+    group the txs in the graph from build_block_dependency_graph() into
+    topological levels. return [[tx num, ...], ...] with each level sorted.
+    """
+    tx_levels = {} # {tx num: level}
+    levels = []
+    # dependencies are always earlier txs, so they always have a level already
+    for tx_num in sorted(graph):
+        level = 1 + max([-1] + [tx_levels[dep] for dep in graph[tx_num]])
+        tx_levels[tx_num] = level
+        if level == len(levels):
+            levels.append([])
+        levels[level].append(tx_num)
+    return levels
+
+def record(levels):
+    """add the levels of a block to the stats"""
+    stats["blocks"] += 1
+    stats["txs"] += sum(len(level) for level in levels)
+    stats["levels"] += len(levels)
+    stats["max_levels"] = max(stats["max_levels"], len(levels))
+    stats["max_width"] = max(
+        [stats["max_width"]] + [len(level) for level in levels]
+    )
+
+def stats2human_str():
+    return "tx dependency levels: %d blocks, %.1f txs per level on average," \
+    " at most %d levels in a block and %d txs in a level" % (
+        stats["blocks"],
+        float(stats["txs"]) / stats["levels"] if stats["levels"] else 0,
+        stats["max_levels"], stats["max_width"]
+    )
@@ -0,0 +1,146 @@
+"""
+module containing the local txout store - the funds and script of every txout
+in the blockchain, keyed by (txid, vout).
+
+the store is populated as blocks are connected during validation, so that the
+previous txouts spent by each block can be read locally instead of asking
+bitcoind for the whole previous tx with getrawtransaction (which also requires
+bitcoind's txindex). spent txouts are kept, so that attempted doublespends can
+still be explained. unspendable (op_return) txouts are never stored.
+
+the store also records the latest block height it holds, so that callers can
+tell whether it covers all blocks before the one being validated.
+"""
+
+import os, sqlite3
+import config_grunt
+import filesystem_grunt
+
+# module globals - do not set here. use init()
+txout_db_file = None
+db = None
+
+def init(f_name = None):
+    """open (or create) the txout store. f_name defaults to config.json"""
+    global txout_db_file, db
+    close()
+    txout_db_file = config_grunt.config_dict["txout_db"] if f_name is None \
+    else f_name
+    filesystem_grunt.make_sure_path_exists(
+        os.path.dirname(os.path.abspath(txout_db_file))
+    )
+    db = sqlite3.connect(txout_db_file)
+    db.text_factory = str
+    db.execute(
+        "create table if not exists txouts ("
+        "txid blob not null, vout integer not null, funds integer not null,"
+        " script blob not null, primary key (txid, vout)) without rowid"
+    )
+    db.execute(
+        "create table if not exists info (name text primary key, value integer)"
+    )
+
+def initialized():
+    return db is not None
+
+def commit():
+    """make all txouts added since the last commit durable"""
+    if db is not None:
+        db.commit()
+
+def close():
+    global db
+    if db is not None:
+        db.commit()
+        db.close()
+        db = None
+
+def get_latest_height():
+    """the latest block height in the store, or -1 if it is empty"""
+    row = db.execute(
+        "select value from info where name = 'latest_height'"
+    ).fetchone()
+    return -1 if row is None else row[0]
+
+def add_block(parsed_block):
+    """
+    add all spendable txouts in the parsed block to the store. the block must
+    contain the tx hashes and the txout funds and scripts.
+
+    a duplicate txid (see bip30) overwrites the txouts of the earlier tx. return
+    the overwritten txouts as a list of (txid, vout, funds, script) for the undo
+    record of the block (see remove_txs()).
+    """
+    txids = list(set(tx["hash"] for tx in parsed_block["tx"].itervalues()))
+    overwritten = []
+    # stay well within the limit on the number of sqlite query parameters
+    for i in xrange(0, len(txids), 500):
+        chunk = txids[i: i + 500]
+        overwritten.extend(
+            (str(txid), vout, funds, str(script))
+            for (txid, vout, funds, script) in db.execute(
+                "select txid, vout, funds, script from txouts where txid in"
+                " (%s)" % ", ".join(["?"] * len(chunk)),
+                [buffer(txid) for txid in chunk]
+            )
+        )
+    db.executemany(
+        "insert or replace into txouts (txid, vout, funds, script)"
+        " values (?, ?, ?, ?)", (
+            (
+                buffer(tx["hash"]), vout, txout["funds"],
+                buffer(txout["script"])
+            )
+            for tx in parsed_block["tx"].itervalues()
+            for (vout, txout) in tx["output"].iteritems()
+            if txout["script"][: 1] != "\x6a" # op_return
+        )
+    )
+    db.execute(
+        "insert or replace into info (name, value)"
+        " values ('latest_height', ?)", (parsed_block["block_height"],)
+    )
+    return overwritten
+
+def remove_txs(created, latest_height, overwritten = ()):
+    """
+    remove the txouts of the txs in the list of (txid, tx num, num txouts) from
+    the store, put back the overwritten txouts returned by add_block() and set
+    the latest block height in the store. used to disconnect an orphaned block.
+    """
+    db.executemany(
+        "delete from txouts where txid = ? and vout < ?", (
+            (buffer(txid), num_txouts)
+            for (txid, tx_num, num_txouts) in created
+        )
+    )
+    db.executemany(
+        "insert or replace into txouts (txid, vout, funds, script)"
+        " values (?, ?, ?, ?)", (
+            (buffer(txid), vout, funds, buffer(script))
+            for (txid, vout, funds, script) in overwritten
+        )
+    )
+    db.execute(
+        "insert or replace into info (name, value)"
+        " values ('latest_height', ?)", (latest_height,)
+    )
+
+def get(txid, vout):
+    """return (funds, script) for the binary txid and vout, or None"""
+    row = db.execute(
+        "select funds, script from txouts where txid = ? and vout = ?",
+        (buffer(txid), vout)
+    ).fetchone()
+    if row is None:
+        return None
+    return (row[0], str(row[1]))
+
+def get_tx(txid):
+    """return {vout: (funds, script)} for all stored txouts of the binary txid"""
+    return {
+        vout: (funds, str(script)) for (vout, funds, script) in db.execute(
+            "select vout, funds, script from txouts where txid = ?",
+            (buffer(txid),)
+        )
+    }
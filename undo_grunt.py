@@ -0,0 +1,120 @@
+"""
+module containing the undo records - what each recently validated block changed,
+so that the block can be disconnected again if it is orphaned by a reorg (see
+btc_grunt.disconnect_block()).
+
+each record is keyed by the binary block hash and holds:
+
+- created - [(txid, tx num, num txouts), ...] for every tx in the block
+- spends - [(spendee txid, spendee blockhashend-txnum, spendee txout index),
+...] for every txout that the block marked as spent in the tx metadata
+- prior utxos - [(utxo key, utxo value or None), ...] for every txout that the
+block removed, added or overwrote in the utxo set, encoded as in utxo_grunt
+(see utxo_grunt.connect_block())
+- overwritten txouts - [(txid, vout, funds, script), ...] for every txout of an
+earlier tx with the same txid that the block overwrote in the txout store (see
+txout_grunt.add_block())
+
+records are only needed for blocks near the tip, so records more than
+undo_depth blocks below the latest validated block are pruned.
+"""
+
+import os, sqlite3, cPickle
+import config_grunt
+import filesystem_grunt
+import utxo_grunt
+
+# module globals - do not set here. use init()
+undo_db_file = None
+db = None
+
+def init(f_name = None):
+    """open (or create) the undo records. f_name defaults to config.json"""
+    global undo_db_file, db
+    close()
+    undo_db_file = config_grunt.config_dict["undo_db"] if f_name is None \
+    else f_name
+    filesystem_grunt.make_sure_path_exists(
+        os.path.dirname(os.path.abspath(undo_db_file))
+    )
+    db = sqlite3.connect(undo_db_file)
+    db.execute(
+        "create table if not exists undo (block_hash blob primary key,"
+        " block_height integer not null, data blob not null)"
+    )
+    db.execute(
+        "create index if not exists undo_height on undo (block_height)"
+    )
+
+def initialized():
+    return db is not None
+
+def commit():
+    """make all records saved since the last commit durable"""
+    if db is not None:
+        db.commit()
+
+def close():
+    global db
+    if db is not None:
+        db.commit()
+        db.close()
+        db = None
+
+def save(
+    block_hash, block_height, created, spends, prior_utxos,
+    overwritten_txouts
+):
+    """save the undo record for a block. see the top of this file"""
+    db.execute(
+        "insert or replace into undo (block_hash, block_height, data)"
+        " values (?, ?, ?)", (
+            buffer(block_hash), block_height, buffer(cPickle.dumps(
+                (created, spends, prior_utxos, overwritten_txouts),
+                cPickle.HIGHEST_PROTOCOL
+            ))
+        )
+    )
+
+def get(block_hash):
+    """
+    return (block height, created, spends, prior utxos, overwritten txouts) for
+    the binary block hash, or None if there is no undo record for the block
+    """
+    row = db.execute(
+        "select block_height, data from undo where block_hash = ?",
+        (buffer(block_hash),)
+    ).fetchone()
+    if row is None:
+        return None
+    data = cPickle.loads(str(row[1]))
+    if len(data) == 3:
+        # an older record, which only has the spent utxos and no overwritten
+        # txouts. the utxos which the block both created and spent are not
+        # prior utxos, so drop them.
+        (created, spends, spent_utxos) = data
+        created_keys = set(
+            utxo_grunt.encode_key(txid, vout)
+            for (txid, tx_num, num_txouts) in created
+            for vout in xrange(num_txouts)
+        )
+        data = (created, spends, [
+            (key, value) for (key, value) in spent_utxos
+            if key not in created_keys
+        ], [])
+    return (row[0],) + data
+
+def delete(block_hash):
+    db.execute("delete from undo where block_hash = ?", (buffer(block_hash),))
+
+def prune(latest_block_height, undo_depth = None):
+    """
+    delete the records more than undo_depth blocks below the latest block.
+    undo_depth defaults to the value in config.json.
+    """
+    if undo_depth is None:
+        undo_depth = config_grunt.config_dict["undo_depth"]
+    db.execute(
+        "delete from undo where block_height < ?",
+        (latest_block_height - undo_depth,)
+    )
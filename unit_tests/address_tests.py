@@ -64,3 +64,59 @@ for (i, address) in enumerate(addresses):
 	else:
 		if verbose:
 			print "pass"
+
+################################################################################
+# tests for hash160 to address conversion (and back again)
+################################################################################
+hash160s_and_addresses = [
+	("751e76e8199196d454941c45d1b3a323f1433bd6", "1BgGZ9tcN4rm9KBzDn7KprQz87SZ26SAMH"),
+	("0" * 40, "1111111111111111111114oLvT2") # leading zeros
+]
+for (i, (hash160_hex, address)) in enumerate(hash160s_and_addresses):
+	if verbose:
+		print """
+==================== test for hash160 to address conversion %s =================
+""" % i
+	hash160 = btc_grunt.hex2bin(hash160_hex)
+	test = btc_grunt.hash1602address(hash160, "pub_key_hash")
+	if test != address:
+		lang_grunt.die(
+			"hash160 %s converted to address %s, but it should be %s"
+			% (hash160_hex, test, address)
+		)
+	test = btc_grunt.address2hash160(address)
+	if test != hash160:
+		lang_grunt.die(
+			"address %s converted to hash160 %s, but it should be %s"
+			% (address, btc_grunt.bin2hex(test), hash160_hex)
+		)
+	if verbose:
+		print "pass"
+
+################################################################################
+# tests for batch base58check encoding and decoding
+################################################################################
+if verbose:
+	print """
+================= test for batch base58check encoding and decoding =============
+"""
+hash160s = [btc_grunt.hex2bin(h) for (h, a) in hash160s_and_addresses]
+expected_addresses = [a for (h, a) in hash160s_and_addresses]
+test = btc_grunt.hash1602address_batch(hash160s, "pub_key_hash")
+if test != expected_addresses:
+	lang_grunt.die(
+		"batch hash160 to address conversion gave %s, but it should be %s"
+		% (test, expected_addresses)
+	)
+test = btc_grunt.address2hash160_batch(expected_addresses + ["0OIl"])
+if test != (hash160s + [None]):
+	lang_grunt.die(
+		"batch address to hash160 conversion failed. result: %s"
+		% [None if h is None else btc_grunt.bin2hex(h) for h in test]
+	)
+test = btc_grunt.valid_address_checksum_batch(expected_addresses + addresses)
+if test != ([True] * len(expected_addresses) + [False] * len(addresses)):
+	lang_grunt.die("batch address checksum validation gave %s" % test)
+
+if verbose:
+	print "pass"
@@ -0,0 +1,117 @@
+#!/usr/bin/env python2.7
+
+import os, sys, tempfile
+
+# when executing this test directly include the parent dir in the path
+if (
+	(__name__ == "__main__") and
+	(__package__ is None)
+):
+	os.sys.path.append(
+		os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+	)
+
+verbose = True if "-v" in sys.argv else False
+
+# module containing some general bitcoin-related functions
+import btc_grunt
+
+# module containing the tx metadata bloom filter
+import bloom_grunt
+
+# module containing the tx metadata storage backends
+import tx_metadata_grunt
+
+test_dir = tempfile.mkdtemp()
+bloom_filename = os.path.join(test_dir, "tx_metadata.bloom")
+capacity = 10000
+fp_rate = 0.01
+
+################################################################################
+# bloom filter membership tests
+################################################################################
+if verbose:
+	print """
+======================= test for bloom filter membership =======================
+"""
+if not bloom_grunt.init(bloom_filename, capacity, fp_rate):
+	raise Exception("a new bloom filter was not created")
+added = [btc_grunt.sha256d("added %d" % i) for i in range(capacity)]
+for txid in added:
+	bloom_grunt.add(txid)
+for txid in added:
+	if not bloom_grunt.may_contain(txid):
+		raise Exception(
+			"bloom filter false negative for %s" % btc_grunt.bin2hex(txid)
+		)
+absent = [btc_grunt.sha256d("absent %d" % i) for i in range(capacity)]
+num_false_positives = 0
+for txid in absent:
+	if bloom_grunt.may_contain(txid):
+		bloom_grunt.record_false_positive()
+		num_false_positives += 1
+# allow plenty of slack on the expected false positive rate
+if num_false_positives > 3 * fp_rate * capacity:
+	raise Exception(
+		"bloom filter gave %s false positives for %s absent tx hashes"
+		% (num_false_positives, capacity)
+	)
+if bloom_grunt.stats["false_positives"] != num_false_positives:
+	raise Exception("bloom filter false positive stats are incorrect")
+if verbose:
+	print "pass"
+
+################################################################################
+# bloom filter persistence tests
+################################################################################
+if verbose:
+	print """
+====================== test for bloom filter persistence =======================
+"""
+bloom_grunt.save()
+saved_bits = bloom_grunt.bits
+if bloom_grunt.init(bloom_filename, capacity, fp_rate):
+	raise Exception("the saved bloom filter was not loaded")
+if (bloom_grunt.bits != saved_bits) or (bloom_grunt.num_items != capacity):
+	raise Exception("the loaded bloom filter differs from the saved one")
+if not bloom_grunt.init(bloom_filename, 2 * capacity, fp_rate):
+	raise Exception("a bloom filter with the wrong dimensions was loaded")
+if verbose:
+	print "pass"
+
+################################################################################
+# bloom filter store id tests
+################################################################################
+if verbose:
+	print """
+======================= test for bloom filter store ids ========================
+"""
+# the id of each store stays the same until the store is given a new generation
+store_ids = []
+for (backend, path) in [
+	("csv", os.path.join(test_dir, "tx_metadata")),
+	("sqlite", os.path.join(test_dir, "tx_metadata.sqlite"))
+]:
+	tx_metadata_grunt.set_backend(backend, path)
+	store_id = tx_metadata_grunt.get_store_id()
+	tx_metadata_grunt.set_backend(backend, path)
+	if tx_metadata_grunt.get_store_id() != store_id:
+		raise Exception("the %s store id changed between runs" % backend)
+	store_ids.append(store_id)
+	tx_metadata_grunt.new_generation()
+	store_ids.append(tx_metadata_grunt.get_store_id())
+	tx_metadata_grunt.close()
+if len(set(store_ids)) != len(store_ids):
+	raise Exception("different stores have the same store id")
+
+# a filter is only loaded for the store it was built from
+bloom_grunt.init(bloom_filename, capacity, fp_rate, store_ids[0])
+bloom_grunt.add(added[0])
+bloom_grunt.save()
+if bloom_grunt.init(bloom_filename, capacity, fp_rate, store_ids[0]):
+	raise Exception("the bloom filter for the same store was not loaded")
+for store_id in store_ids[1:]:
+	if not bloom_grunt.init(bloom_filename, capacity, fp_rate, store_id):
+		raise Exception("a bloom filter for a different store was loaded")
+if verbose:
+	print "pass"
@@ -0,0 +1,121 @@
+#!/usr/bin/env python2.7
+
+import os, sys, tempfile
+
+# when executing this test directly include the parent dir in the path
+if (
+	(__name__ == "__main__") and
+	(__package__ is None)
+):
+	os.sys.path.append(
+		os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+	)
+
+verbose = True if "-v" in sys.argv else False
+
+# module containing some general bitcoin-related functions
+import btc_grunt
+
+# module containing the tx metadata storage backends
+import tx_metadata_grunt
+
+tx_metadata_grunt.set_backend(
+	"sqlite", os.path.join(tempfile.mkdtemp(), "tx_metadata.sqlite")
+)
+
+def make_block(name, block_height, coinbase_name):
+	"""a block with only a coinbase tx with one txout"""
+	return {
+		"block_hash": btc_grunt.sha256d(name),
+		"block_height": block_height,
+		"is_orphan": None,
+		"tx": {0: {
+			"hash": btc_grunt.sha256d(coinbase_name),
+			"input": {0: {
+				"hash": btc_grunt.blank_hash,
+				"index": btc_grunt.coinbase_index
+			}},
+			"output": {0: {"funds": 5000000000, "script": "\x51"}}
+		}}
+	}
+
+def spend(txid, spender_name):
+	"""mark txout 0 of the tx as spent. return the instance that was spent"""
+	return btc_grunt.mark_spent_tx(
+		txid, 0, btc_grunt.sha256d(spender_name), 0,
+		btc_grunt.get_tx_metadata(txid)
+	)
+
+################################################################################
+# duplicate txid tests
+################################################################################
+if verbose:
+	print """
+=========================== test for duplicate txids ===========================
+"""
+# the bip30 duplicates are known from the start
+if len(btc_grunt.duplicate_txids[
+	"d5d27987d2a3dfc724e359870c6644b40e497bdc0589a033220fe15429d88599"
+]) != 2:
+	raise Exception("duplicate txid fail. a bip30 duplicate is not indexed")
+
+# a unique tx hash takes the single instance fast path
+btc_grunt.save_tx_metadata(make_block("block a", 10, "coinbase a"))
+unique_txid = btc_grunt.bin2hex(btc_grunt.sha256d("coinbase a"))
+if unique_txid in btc_grunt.duplicate_txids:
+	raise Exception("duplicate txid fail. a unique tx hash is indexed")
+if spend(unique_txid, "spender a") != "%s-0" % btc_grunt.bin2hex(
+	btc_grunt.sha256d("block a")[-2:]
+):
+	raise Exception("duplicate txid fail. the unique tx was not spent")
+
+# a duplicate found during validation is indexed with both instances
+btc_grunt.save_tx_metadata(make_block("block b", 20, "coinbase b"))
+btc_grunt.save_tx_metadata(make_block("block c", 30, "coinbase b"))
+duplicate_txid = btc_grunt.bin2hex(btc_grunt.sha256d("coinbase b"))
+if btc_grunt.duplicate_txids.get(duplicate_txid) != [(20, 0), (30, 0)]:
+	raise Exception(
+		"duplicate txid fail. the duplicate was indexed as %s"
+		% btc_grunt.duplicate_txids.get(duplicate_txid)
+	)
+
+# and the latest unspent instance is spent first
+block_c_instance = "%s-0" % btc_grunt.bin2hex(
+	btc_grunt.sha256d("block c")[-2:]
+)
+if spend(duplicate_txid, "spender c") != block_c_instance:
+	raise Exception("duplicate txid fail. the wrong instance was spent")
+btc_grunt.flush_tx_metadata()
+if spend(duplicate_txid, "spender b") == block_c_instance:
+	raise Exception("duplicate txid fail. an instance was spent twice")
+
+# a restart starts over from the bip30 duplicates, and the duplicate found
+# during validation is loaded back in from the store
+btc_grunt.duplicate_txids = {
+	txhash: instances for (txhash, instances) in \
+	btc_grunt.duplicate_txids.items() if txhash != duplicate_txid
+}
+btc_grunt.load_duplicate_txids()
+if btc_grunt.duplicate_txids.get(duplicate_txid) != [(20, 0), (30, 0)]:
+	raise Exception(
+		"duplicate txid fail. the duplicate was not loaded from the store"
+	)
+if unique_txid in btc_grunt.duplicate_txids:
+	raise Exception("duplicate txid fail. a unique tx hash was loaded")
+
+# the csv tree keeps the duplicates in a file of its own
+tx_metadata_grunt.close()
+csv_dir = tempfile.mkdtemp()
+tx_metadata_grunt.set_backend("csv", csv_dir)
+tx_metadata_grunt.add_duplicate_txid(duplicate_txid, 20, 0)
+tx_metadata_grunt.add_duplicate_txid(duplicate_txid, 30, 0)
+if tx_metadata_grunt.get_duplicate_txids() != [
+	(duplicate_txid, 20, 0), (duplicate_txid, 30, 0)
+]:
+	raise Exception("duplicate txid fail. the csv tree lost the duplicates")
+if list(tx_metadata_grunt.csv_tree_items(csv_dir)):
+	raise Exception("duplicate txid fail. the duplicates are in the csv tree")
+if verbose:
+	print "pass"
+
+tx_metadata_grunt.close()
@@ -0,0 +1,156 @@
+#!/usr/bin/env python2.7
+
+import os, sys
+
+# when executing this test directly include the parent dir in the path
+if (
+	(__name__ == "__main__") and
+	(__package__ is None)
+):
+	os.sys.path.append(
+		os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+	)
+
+verbose = True if "-v" in sys.argv else False
+
+# module containing some general bitcoin-related functions
+import btc_grunt
+
+################################################################################
+# double sha256 tests
+################################################################################
+if verbose:
+	print """
+============================ test for sha256d ==================================
+"""
+empty_sha256d = btc_grunt.hex2bin(
+	"5df6e0e2761359d30a8275058e299fcc0381534545f55cf43e41983f5d4c9456"
+)
+test = btc_grunt.sha256d("")
+if test != empty_sha256d:
+	raise Exception(
+		"sha256d of an empty string gave %s but it should be %s"
+		% (btc_grunt.bin2hex(test), btc_grunt.bin2hex(empty_sha256d))
+	)
+test = btc_grunt.sha256d("abc", "def")
+if test != btc_grunt.sha256(btc_grunt.sha256("abcdef")):
+	raise Exception("sha256d of multiple arguments does not match sha256d of" \
+	" the concatenated arguments")
+test = btc_grunt.sha256d_batch(["", "abcdef"])
+if test != [empty_sha256d, btc_grunt.sha256d("abcdef")]:
+	raise Exception("sha256d_batch does not match sha256d")
+if verbose:
+	print "pass"
+
+################################################################################
+# hash160 tests
+################################################################################
+if verbose:
+	print """
+============================ test for hash160 ==================================
+"""
+# the uncompressed and compressed forms of the same pubkey, from
+# https://en.bitcoin.it/wiki/Technical_background_of_Bitcoin_addresses
+pubkeys_hash160s_and_addresses = [
+	(
+		"0450863ad64a87ae8a2fe83c1af1a8403cb53f53e486d8511dad8a04887e5b2352" \
+		"2cd470243453a299fa9e77237716103abc11a1df38855ed6f2ee187e9c582ba6",
+		"010966776006953d5567439e5e39f86a0d273bee",
+		"16UwLL9Risc3QfPqBUvKofHmBQ7wMtjvM"
+	),
+	(
+		"0250863ad64a87ae8a2fe83c1af1a8403cb53f53e486d8511dad8a04887e5b2352",
+		"f54a5851e9372b87810a8e60cdd2e7cfd80b6e31",
+		"1PMycacnJaSqwwJqjawXBErnLsZ7RkXUAs"
+	)
+]
+for (pubkey_hex, hash160_hex, address) in pubkeys_hash160s_and_addresses:
+	pubkey = btc_grunt.hex2bin(pubkey_hex)
+	test = btc_grunt.hash160(pubkey)
+	if test != btc_grunt.hex2bin(hash160_hex):
+		raise Exception(
+			"hash160 of pubkey %s gave %s but it should be %s"
+			% (pubkey_hex, btc_grunt.bin2hex(test), hash160_hex)
+		)
+	if btc_grunt.address2hash160(address) != test:
+		raise Exception(
+			"hash160 of pubkey %s does not match address %s"
+			% (pubkey_hex, address)
+		)
+	test = btc_grunt.pubkey2address(pubkey)
+	if test != address:
+		raise Exception(
+			"pubkey %s converted to address %s but it should be %s"
+			% (pubkey_hex, test, address)
+		)
+empty_hash160 = btc_grunt.hex2bin("b472a266d0bd89c13706a4132ccfb16f7c3b9fcb")
+if btc_grunt.hash160("") != empty_hash160:
+	raise Exception("hash160 of an empty string is wrong")
+pubkeys = [btc_grunt.hex2bin(p) for (p, _, _) in pubkeys_hash160s_and_addresses]
+test = btc_grunt.hash160_batch([""] + pubkeys)
+if test != [empty_hash160] + [
+	btc_grunt.hex2bin(h) for (_, h, _) in pubkeys_hash160s_and_addresses
+]:
+	raise Exception("hash160_batch does not match hash160")
+if verbose:
+	print "pass"
+
+################################################################################
+# hash instrumentation tests
+################################################################################
+if verbose:
+	print """
+========================= test for hash instrumentation ========================
+"""
+def hash_some_bytes():
+	btc_grunt.sha256d("abc", "def")
+	btc_grunt.sha256d_batch(["a", "bc"])
+	btc_grunt.sha256("abcd")
+
+btc_grunt.reset_hash_instrumentation()
+btc_grunt.enable_hash_instrumentation()
+hash_some_bytes()
+btc_grunt.enable_hash_instrumentation(False)
+hash_some_bytes() # not counted
+expected = {"hash_some_bytes": {"sha256d": 9, "sha256": 4}}
+if btc_grunt.hashed_bytes_per_caller != expected:
+	raise Exception(
+		"hash instrumentation counted %s but it should have counted %s"
+		% (btc_grunt.hashed_bytes_per_caller, expected)
+	)
+
+# the merkle engine hashes inline, but still counts its bytes. 3 leaves make 2
+# pairs then 1 pair
+def merkle_some_leaves():
+	btc_grunt.calculate_merkle_root(["a" * 32, "b" * 32, "c" * 32])
+	btc_grunt.calculate_merkle_tree(["a" * 32, "b" * 32, "c" * 32])
+
+btc_grunt.reset_hash_instrumentation()
+btc_grunt.enable_hash_instrumentation()
+merkle_some_leaves()
+btc_grunt.enable_hash_instrumentation(False)
+expected = {"merkle_some_leaves": {"sha256d": 2 * 3 * 64}}
+if btc_grunt.hashed_bytes_per_caller != expected:
+	raise Exception(
+		"merkle hash instrumentation counted %s but it should have counted %s"
+		% (btc_grunt.hashed_bytes_per_caller, expected)
+	)
+
+# counts from the script worker processes are added to the counts here
+btc_grunt.merge_worker_counters({"rules": {}, "hashed_bytes": {
+	"merkle_some_leaves": {"sha256d": 1}, "verify_script": {"sha256d": 2}
+}})
+expected = {
+	"merkle_some_leaves": {"sha256d": 2 * 3 * 64 + 1},
+	"verify_script": {"sha256d": 2}
+}
+if btc_grunt.hashed_bytes_per_caller != expected:
+	raise Exception(
+		"merged hash instrumentation counted %s but it should have counted %s"
+		% (btc_grunt.hashed_bytes_per_caller, expected)
+	)
+if btc_grunt.hashed_bytes2human_str() != "bytes hashed per function:\n" \
+"merkle_some_leaves: sha256d 385\nverify_script: sha256d 2":
+	raise Exception("hash instrumentation summary is wrong")
+if verbose:
+	print "pass"
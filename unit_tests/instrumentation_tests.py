@@ -0,0 +1,103 @@
+#!/usr/bin/env python2.7
+
+import os, sys, tempfile, json, signal, multiprocessing
+
+# when executing this test directly include the parent dir in the path
+if (
+	(__name__ == "__main__") and
+	(__package__ is None)
+):
+	os.sys.path.append(
+		os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+	)
+
+verbose = True if "-v" in sys.argv else False
+
+# module containing some general bitcoin-related functions
+import btc_grunt
+
+# module to count the calls, failures and time of each validation rule
+import instrumentation_grunt
+
+test_dir = tempfile.mkdtemp()
+dump_file = os.path.join(test_dir, "instrumentation.json")
+blocks_file = os.path.join(test_dir, "instrumentation-blocks.json")
+
+def call_in_worker():
+	"""runs in a worker process forked after the instrumentation was set up"""
+	btc_grunt.valid_coinbase_index(0)
+	return instrumentation_grunt.take_block_counters()
+
+################################################################################
+# instrumentation tests
+################################################################################
+if verbose:
+	print """
+========================= test for the rule instrumentation ====================
+"""
+original_valid_coinbase_index = btc_grunt.valid_coinbase_index
+instrumentation_grunt.init(dump_file, blocks_file)
+instrumentation_grunt.instrument(btc_grunt, ["valid_coinbase_index"])
+
+instrumentation_grunt.start_block(1)
+btc_grunt.valid_coinbase_index(btc_grunt.coinbase_index)
+instrumentation_grunt.end_block()
+instrumentation_grunt.start_block(2)
+btc_grunt.valid_coinbase_index(btc_grunt.coinbase_index)
+btc_grunt.valid_coinbase_index(0)
+# the dump is only done at the end of the block
+os.kill(os.getpid(), signal.SIGUSR1)
+if os.path.exists(dump_file):
+	raise Exception("instrumentation fail. dumped in the signal handler")
+instrumentation_grunt.end_block()
+
+with open(dump_file, "r") as f:
+	dumped = json.load(f)
+counters = dumped["run"]["valid_coinbase_index"]
+if (counters["calls"], counters["failures"]) != (3, 1):
+	raise Exception(
+		"instrumentation fail. the run counters are %s" % counters
+	)
+if sum(counters["histogram"].values()) != 3:
+	raise Exception("instrumentation fail. the histogram does not add up")
+block_heights = [block["block_height"] for block in dumped["slowest_blocks"]]
+if sorted(block_heights) != [1, 2]:
+	raise Exception(
+		"instrumentation fail. the slowest blocks are %s" % block_heights
+	)
+for block in dumped["slowest_blocks"]:
+	calls = block["rules"]["valid_coinbase_index"]["calls"]
+	if calls != block["block_height"]:
+		raise Exception(
+			"instrumentation fail. block %d has %d calls"
+			% (block["block_height"], calls)
+		)
+
+# every block is in the blocks file
+with open(blocks_file, "r") as f:
+	blocks = [json.loads(line) for line in f]
+if [
+	(block["block_height"], block["rules"]["valid_coinbase_index"]["calls"])
+	for block in blocks
+] != [(1, 1), (2, 2)]:
+	raise Exception("instrumentation fail. the blocks file is %s" % blocks)
+
+# worker processes forked after instrumenting send back their counters
+instrumentation_grunt.start_block(3)
+pool = multiprocessing.Pool(1)
+instrumentation_grunt.merge(pool.apply(call_in_worker))
+pool.terminate()
+counters = instrumentation_grunt.block_rules["valid_coinbase_index"]
+if (counters["calls"], counters["failures"]) != (1, 1):
+	raise Exception(
+		"instrumentation fail. the worker counters are %s" % counters
+	)
+if instrumentation_grunt.run_rules["valid_coinbase_index"]["calls"] != 4:
+	raise Exception("instrumentation fail. the worker counters are not merged")
+
+# the original function is put back
+instrumentation_grunt.uninstrument()
+if btc_grunt.valid_coinbase_index is not original_valid_coinbase_index:
+	raise Exception("instrumentation fail. the function was not put back")
+if verbose:
+	print "pass"
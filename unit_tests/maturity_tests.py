@@ -0,0 +1,56 @@
+#!/usr/bin/env python2.7
+
+import os, sys
+
+# when executing this test directly include the parent dir in the path
+if (
+	(__name__ == "__main__") and
+	(__package__ is None)
+):
+	os.sys.path.append(
+		os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+	)
+
+verbose = True if "-v" in sys.argv else False
+
+# module containing some general bitcoin-related functions
+import btc_grunt
+
+# module to look up the coinbase txs which are not mature yet
+import maturity_grunt
+
+def coinbase_txid(block_height):
+	return btc_grunt.sha256d("coinbase %d" % block_height)
+
+################################################################################
+# coinbase maturity index tests
+################################################################################
+if verbose:
+	print """
+====================== test for the coinbase maturity index ====================
+"""
+maturity_grunt.init(btc_grunt.coinbase_maturity)
+for block_height in range(250):
+	maturity_grunt.expire(block_height)
+	maturity_grunt.add(block_height, coinbase_txid(block_height))
+
+# when validating block 249, the coinbase txs of blocks 150 to 249 are immature
+if len(maturity_grunt.coinbase_heights) != btc_grunt.coinbase_maturity:
+	raise Exception(
+		"maturity fail. the index has %d coinbase txs"
+		% len(maturity_grunt.coinbase_heights)
+	)
+if maturity_grunt.get_height(coinbase_txid(149)) is not None:
+	raise Exception("maturity fail. a mature coinbase tx is in the index")
+if maturity_grunt.get_height(coinbase_txid(150)) != 150:
+	raise Exception("maturity fail. an immature coinbase tx is not indexed")
+
+# a duplicate coinbase txid is kept until its latest block is mature
+maturity_grunt.expire(250)
+maturity_grunt.add(250, coinbase_txid(200))
+maturity_grunt.expire(300)
+if maturity_grunt.get_height(coinbase_txid(200)) != 250:
+	raise Exception("maturity fail. a duplicate coinbase tx was expired")
+
+if verbose:
+	print "pass"
@@ -17,86 +17,183 @@ import lang_grunt
 # module containing some general bitcoin-related functions
 import btc_grunt
 
-# set the btc_grunt base dir to the current dir
-btc_grunt.base_dir = os.path.join(
-	os.path.dirname(os.path.abspath(__file__)), ""
-)
-btc_grunt.tx_meta_dir = os.path.join(btc_grunt.base_dir, "tx_metadata", "")
+# module containing the tx metadata storage backends
+import tx_metadata_grunt
 
+# script to copy the csv tree into sqlite
+import migrate_tx_metadata
+
+# keep the test tx metadata in the current dir
+test_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "")
+test_paths = {
+	"csv": os.path.join(test_dir, "tx_metadata", ""),
+	"sqlite": os.path.join(test_dir, "tx_metadata.sqlite")
+}
 txhash1 = "23ab47f962e86d1849fe2e1bdc3e3e5e49373fd8082bbb3792d704eeeaaec40f"
 
-# get the dir and filename for this hash
-(f_dir, f_name, hashend) = btc_grunt.hash2dir_and_filename_and_hashend(txhash1)
-
-# erase the test tx_metadata file if it exists
-if os.path.exists(btc_grunt.tx_meta_dir):
-	shutil.rmtree(btc_grunt.tx_meta_dir)
-
-# write the data to the tx_metadata file
-save_data1 = {
-	"c9c7-3": {
-		"blockfile_num": 3,
-		"block_start_pos": 128407591,
-		"tx_start_pos": 731,
-		"tx_size": 193,
-		"block_height": 142392,
-		"is_coinbase": None,
-		"is_orphan": None,
-		"spending_txs_list": ["d308-0", "3bd9-15"]
+def erase_test_data():
+	if os.path.isdir(test_paths["csv"]):
+		shutil.rmtree(test_paths["csv"])
+	if os.path.isfile(test_paths["sqlite"]):
+		os.remove(test_paths["sqlite"])
+
+for backend in tx_metadata_grunt.backends:
+	erase_test_data()
+	tx_metadata_grunt.set_backend(backend, test_paths[backend])
+
+	# write the data to the tx_metadata file
+	save_data1 = {
+		"c9c7-3": {
+			"blockfile_num": 3,
+			"block_start_pos": 128407591,
+			"tx_start_pos": 731,
+			"tx_size": 193,
+			"block_height": 142392,
+			"is_coinbase": None,
+			"is_orphan": None,
+			"spending_txs_list": ["d308-0", "3bd9-15"]
+		}
 	}
-}
-btc_grunt.save_tx_data_to_disk(txhash1, save_data1)
-
-# merge new data into the tx metadata file
-save_data2 = {
-	"ffff-9": {
-		"blockfile_num": 3,
-		"block_start_pos": 111111111,
-		"tx_start_pos": 777,
-		"tx_size": 193,
-		"block_height": 999999,
-		"is_coinbase": None,
-		"is_orphan": None,
-		"spending_txs_list": [None, None]
+	btc_grunt.save_tx_data_to_disk(txhash1, save_data1)
+
+	# merge new data into the tx metadata file
+	save_data2 = {
+		"ffff-9": {
+			"blockfile_num": 3,
+			"block_start_pos": 111111111,
+			"tx_start_pos": 777,
+			"tx_size": 193,
+			"block_height": 999999,
+			"is_coinbase": None,
+			"is_orphan": None,
+			"spending_txs_list": [None, None]
+		}
 	}
-}
-btc_grunt.save_tx_data_to_disk(txhash1, save_data2)
-txhash2 = "23ab47a450dd4a8ba00f25041813e42dae7e29508d0ec94980344433088b2861"
-save_data3 = {
-	"386d-26": {
-		"blockfile_num": 12,
-		"block_start_pos": 12945601,
-		"tx_start_pos": 15984,
-		"tx_size": 259,
-		"block_height": 183244,
-		"is_coinbase": None,
-		"is_orphan": None,
-		"spending_txs_list": [None, "ad9b-1"]
+	btc_grunt.save_tx_data_to_disk(txhash1, save_data2)
+	txhash2 = "23ab47a450dd4a8ba00f25041813e42dae7e29508d0ec94980344433088b2861"
+	save_data3 = {
+		"386d-26": {
+			"blockfile_num": 12,
+			"block_start_pos": 12945601,
+			"tx_start_pos": 15984,
+			"tx_size": 259,
+			"block_height": 183244,
+			"is_coinbase": None,
+			"is_orphan": None,
+			"spending_txs_list": [None, "ad9b-1"]
+		}
 	}
-}
-btc_grunt.save_tx_data_to_disk(txhash2, save_data3)
-
-# verify that the file now contains the correct data
-existing_data_csv = btc_grunt.get_tx_metadata_csv(txhash1) # one tx per list item
-existing_data_dict = btc_grunt.tx_metadata_csv2dict(existing_data_csv)
-save_data_combined = copy.deepcopy(save_data1)
-save_data_combined.update(save_data2)
-expected_data_dict = {txhash1: save_data_combined, txhash2: save_data3}
-if existing_data_dict == expected_data_dict:
-	print "pass"
-	# clean up the directories since everything is fine
-	shutil.rmtree(btc_grunt.tx_meta_dir)
-else:
-	# do not clean up the directories, leave for investigation
-	lang_grunt.die("fail. expected: %s but got %s" % (
-		os.linesep.join(
-			l.rstrip() for l in json.dumps(
-				expected_data_dict, sort_keys = True, indent = 4
-			).splitlines()
-		),
-		os.linesep.join(
-			l.rstrip() for l in json.dumps(
-				existing_data_dict, sort_keys = True, indent = 4
-			).splitlines()
-		),
-	))
+	btc_grunt.save_tx_data_to_disk(txhash2, save_data3)
+
+	# write the buffered data to the store in one pass
+	btc_grunt.flush_tx_metadata()
+	if btc_grunt.tx_metadata_write_buffer:
+		raise Exception("%s fail. the write buffer was not emptied" % backend)
+
+	# verify that the store now contains the correct data
+	existing_data_dict = {
+		txhash1: btc_grunt.get_tx_metadata(txhash1),
+		txhash2: btc_grunt.get_tx_metadata(txhash2)
+	}
+	save_data_combined = copy.deepcopy(save_data1)
+	save_data_combined.update(save_data2)
+	expected_data_dict = {txhash1: save_data_combined, txhash2: save_data3}
+	if existing_data_dict == expected_data_dict:
+		print "%s pass" % backend
+		# clean up the test data since everything is fine
+		tx_metadata_grunt.close()
+		erase_test_data()
+	else:
+		# do not clean up the test data, leave for investigation
+		raise Exception("%s fail. expected: %s but got %s" % (
+			backend,
+			os.linesep.join(
+				l.rstrip() for l in json.dumps(
+					expected_data_dict, sort_keys = True, indent = 4
+				).splitlines()
+			),
+			os.linesep.join(
+				l.rstrip() for l in json.dumps(
+					existing_data_dict, sort_keys = True, indent = 4
+				).splitlines()
+			),
+		))
+
+# now do the same creates and spends via the append-only journal, compacting
+# part way through
+test_journal = os.path.join(test_dir, "tx_metadata.journal")
+spender_txhash = btc_grunt.hex2bin("abcd" + "00" * 30)
+for backend in tx_metadata_grunt.backends:
+	erase_test_data()
+	tx_metadata_grunt.set_backend(backend, test_paths[backend])
+	tx_metadata_grunt.open_journal(btc_grunt.fold_journal_records, test_journal)
+
+	save_data1 = {"c9c7-3": {
+		"block_height": 142392, "is_coinbase": 1, "is_orphan": None,
+		"spending_txs_list": [None, None, None]
+	}}
+	btc_grunt.save_tx_data_to_disk(txhash1, save_data1)
+	btc_grunt.flush_tx_metadata()
+
+	# fold the create into the store before spending
+	tx_metadata_grunt.compact(tx_metadata_grunt.rotate_journal())
+
+	btc_grunt.mark_spent_tx(
+		txhash1, 2, spender_txhash, 0, btc_grunt.get_tx_metadata(txhash1)
+	)
+	btc_grunt.flush_tx_metadata()
+	btc_grunt.mark_spent_tx(
+		txhash1, 0, spender_txhash, 1, btc_grunt.get_tx_metadata(txhash1)
+	)
+	btc_grunt.flush_tx_metadata()
+	expected_data = {"c9c7-3": {
+		"block_height": 142392, "is_coinbase": 1, "is_orphan": None,
+		"spending_txs_list": ["abcd-1", None, "abcd-0"]
+	}}
+	for stage in ["journal", "store"]:
+		existing_data = btc_grunt.get_tx_metadata(txhash1)
+		for (key, value) in expected_data["c9c7-3"].items():
+			if existing_data["c9c7-3"][key] != value:
+				raise Exception(
+					"%s journal fail. expected %s from the %s but got %s"
+					% (backend, expected_data, stage, existing_data)
+				)
+		# compact the spends into the store and close the journal
+		tx_metadata_grunt.close_journal()
+
+	if os.path.getsize(test_journal):
+		raise Exception(
+			"%s journal fail. the journal was not compacted" % backend
+		)
+
+	# spending the same txout again is a doublespend
+	try:
+		btc_grunt.save_tx_data_to_disk(
+			txhash1, {"c9c7-3": {"spending_txs_list": [None, None, "ef01-0"]}}
+		)
+		raise Exception("%s journal fail. doublespend not detected" % backend)
+	except ValueError:
+		pass
+
+	print "%s journal pass" % backend
+	tx_metadata_grunt.close()
+	erase_test_data()
+	os.remove(test_journal)
+
+# an empty sqlite store must not be used while the csv tree has tx metadata in
+# it, since the earlier spends would be lost
+erase_test_data()
+tx_metadata_grunt.set_backend("csv", test_paths["csv"])
+tx_metadata_grunt.set_csv(txhash1, ["%s,c9c7-3" % txhash1])
+tx_metadata_grunt.set_backend("sqlite", test_paths["sqlite"])
+try:
+	tx_metadata_grunt.check_store(test_paths["csv"])
+	raise Exception("check store fail. the unmigrated csv tree was not detected")
+except IOError:
+	pass
+migrate_tx_metadata.migrate(test_paths["csv"], test_paths["sqlite"])
+tx_metadata_grunt.set_backend("sqlite", test_paths["sqlite"])
+tx_metadata_grunt.check_store(test_paths["csv"])
+print "check store pass"
+tx_metadata_grunt.close()
+erase_test_data()
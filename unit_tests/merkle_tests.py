@@ -0,0 +1,119 @@
+#!/usr/bin/env python2.7
+
+import os, sys
+
+# when executing this test directly include the parent dir in the path
+if (
+	(__name__ == "__main__") and
+	(__package__ is None)
+):
+	os.sys.path.append(
+		os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+	)
+
+verbose = True if "-v" in sys.argv else False
+
+# module to convert data into human readable form
+import lang_grunt
+
+# module containing some general bitcoin-related functions
+import btc_grunt
+
+################################################################################
+# merkle root tests
+################################################################################
+# block 100000 - the tx hashes and the merkle root are all in little endian
+block_100000_tx_hashes = [btc_grunt.hex2bin(h) for h in [
+	"8c14f0db3df150123e6f3dbbf30f8b955a8249b62ac1d1ff16284aefa3d06d87",
+	"fff2525b8931402dd09222c50775608f75787bd2b87e56995a7bdd30f79702c4",
+	"6359f0868171b1d194cbee1af2f16ea598ae8fad666d9b012c8ed2b79a236ec4",
+	"e9a66845e05d5abc0ad04ec80f774a7e585c6e8db975962d069a522137b80c1d"
+]]
+block_100000_merkle_root = btc_grunt.hex2bin(
+	"f3e94742aca4b5ef85488dc37c06c3282295ffec960994b2c0d5ac2a25a95766"
+)
+if verbose:
+	print """
+============================ test for merkle root ==============================
+"""
+test = btc_grunt.calculate_merkle_root(block_100000_tx_hashes)
+if test != block_100000_merkle_root:
+	lang_grunt.die(
+		"the merkle root for block 100000 was calculated as %s but it should"
+		" be %s"
+		% (btc_grunt.bin2hex(test), btc_grunt.bin2hex(block_100000_merkle_root))
+	)
+if verbose:
+	print "pass"
+
+if verbose:
+	print """
+========================= test for batch merkle roots ==========================
+"""
+# a single leaf is its own root. three leaves duplicate the final leaf.
+three_leaves = block_100000_tx_hashes[: 3]
+expected = btc_grunt.calculate_merkle_root(three_leaves + three_leaves[-1:])
+test = btc_grunt.calculate_merkle_roots([
+	block_100000_tx_hashes, block_100000_tx_hashes[: 1], three_leaves
+])
+if test != [block_100000_merkle_root, block_100000_tx_hashes[0], expected]:
+	lang_grunt.die(
+		"batch merkle roots were calculated as %s"
+		% [btc_grunt.bin2hex(root) for root in test]
+	)
+if verbose:
+	print "pass"
+
+################################################################################
+# merkle branch tests
+################################################################################
+# use 5 leaves so that every level except the root has an odd final node
+five_leaves = block_100000_tx_hashes + block_100000_tx_hashes[: 1]
+five_leaves[4] = btc_grunt.sha256(five_leaves[4])
+five_leaves_root = btc_grunt.calculate_merkle_root(five_leaves)
+for (leaves, merkle_root) in [
+	(block_100000_tx_hashes, block_100000_merkle_root),
+	(five_leaves, five_leaves_root),
+	(five_leaves[: 1], five_leaves[0])
+]:
+	branches = btc_grunt.get_merkle_branches(
+		leaves, range(len(leaves)), block_hash = merkle_root
+	)
+	for (tx_num, tx_hash) in enumerate(leaves):
+		if verbose:
+			print """
+=================== test for merkle branch %s of %s leaves =====================
+""" % (tx_num, len(leaves))
+		test = btc_grunt.valid_merkle_branch(
+			tx_hash, branches[tx_num], tx_num, merkle_root, explain = True
+		)
+		if test is not True:
+			lang_grunt.die(test)
+
+		# the same branch must not prove the neighbouring position (unless the
+		# neighbour is a duplicate of this leaf)
+		if (len(leaves) > 1) and (branches[tx_num][0] != tx_hash):
+			test = btc_grunt.valid_merkle_branch(
+				tx_hash, branches[tx_num], tx_num ^ 1, merkle_root
+			)
+			if test is not False:
+				lang_grunt.die(
+					"the merkle branch for tx %s also validates tx %s"
+					% (tx_num, tx_num ^ 1)
+				)
+		if verbose:
+			print "pass"
+
+if verbose:
+	print """
+========================= test for merkle tree cache ===========================
+"""
+# the trees built above were cached by block hash, so no leaves are needed
+test = btc_grunt.get_merkle_branch([], 2, block_hash = five_leaves_root)
+expected = btc_grunt.merkle_tree2branch(
+	btc_grunt.calculate_merkle_tree(five_leaves), 2
+)
+if test != expected:
+	lang_grunt.die("the cached merkle tree gave a different branch")
+if verbose:
+	print "pass"
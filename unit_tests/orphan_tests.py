@@ -0,0 +1,115 @@
+#!/usr/bin/env python2.7
+
+import os, sys, tempfile, hashlib
+
+# when executing this test directly include the parent dir in the path
+if (
+	(__name__ == "__main__") and
+	(__package__ is None)
+):
+	os.sys.path.append(
+		os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+	)
+
+verbose = True if "-v" in sys.argv else False
+
+# module to keep track of the latest blocks and detect orphans among them
+import orphan_grunt
+
+def block_hash(name):
+	return hashlib.sha256(name).digest()
+
+orphans_file = os.path.join(tempfile.mkdtemp(), "known-orphans.txt")
+orphan_grunt.load_known_orphans(orphans_file)
+
+################################################################################
+# orphan detection tests
+################################################################################
+if verbose:
+	print """
+======================== test for orphan block detection =======================
+"""
+orphan_grunt.init_ring(10)
+orphan_grunt.add(block_hash("a0"), 0, "\x00" * 32)
+for height in range(1, 30):
+	new_orphans = orphan_grunt.add(
+		block_hash("a%d" % height), height, block_hash("a%d" % (height - 1))
+	)
+	if new_orphans:
+		raise Exception("orphan fail. orphans found on a single chain")
+
+# only the latest blocks are kept
+if orphan_grunt.has_block(block_hash("a19")):
+	raise Exception("orphan fail. an old block was not dropped from the ring")
+if not orphan_grunt.has_block(block_hash("a20")):
+	raise Exception("orphan fail. a recent block was dropped from the ring")
+
+# bitcoind switches to a fork from block 27, which orphans blocks 28 and 29
+new_orphans = orphan_grunt.add(block_hash("b28"), 28, block_hash("a27"))
+if new_orphans != [(29, block_hash("a29")), (28, block_hash("a28"))]:
+	raise Exception("orphan fail. the switch to the fork found orphans %s" % (
+		[(height, orphan.encode("hex")) for (height, orphan) in new_orphans],
+	))
+for height in [29, 30]:
+	new_orphans = orphan_grunt.add(
+		block_hash("b%d" % height), height, block_hash("b%d" % (height - 1))
+	)
+	if new_orphans:
+		raise Exception("orphan fail. orphans found on the fork")
+
+# then switches back again
+new_orphans = orphan_grunt.add(block_hash("a30"), 30, block_hash("a29"))
+if new_orphans != [
+	(30, block_hash("b30")), (29, block_hash("b29")), (28, block_hash("b28"))
+]:
+	raise Exception("orphan fail. the switch back found orphans %s" % (
+		[(height, orphan.encode("hex")) for (height, orphan) in new_orphans],
+	))
+if not orphan_grunt.is_orphan(block_hash("b29")):
+	raise Exception("orphan fail. b29 is not a known orphan")
+if not orphan_grunt.is_orphan(block_hash("a29")):
+	raise Exception("orphan fail. a29 is not a known orphan")
+if orphan_grunt.is_orphan(block_hash("a27")):
+	raise Exception("orphan fail. a27 is a known orphan")
+if not orphan_grunt.is_orphan_blockhashend(28, block_hash("b28")[-2:]):
+	raise Exception("orphan fail. b28 is not a known orphan by hash end")
+
+# the ring survives a snapshot
+items = orphan_grunt.snapshot()
+orphan_grunt.init_ring(10)
+orphan_grunt.restore(items)
+if orphan_grunt.tip_hash != block_hash("a30"):
+	raise Exception("orphan fail. the restored tip is wrong")
+if orphan_grunt.snapshot() != items:
+	raise Exception("orphan fail. the restored ring differs")
+if verbose:
+	print "pass"
+
+################################################################################
+# known orphans file tests
+################################################################################
+if verbose:
+	print """
+========================= test for the known orphans file ======================
+"""
+with open(orphans_file, "r") as f:
+	lines = f.readlines()
+if len(lines) != 5:
+	raise Exception("orphan fail. expected 5 lines but found %d" % len(lines))
+
+# known orphans are not appended again
+orphan_grunt.save_new_orphans([(29, block_hash("b29"))])
+if os.path.getsize(orphans_file) != len("".join(lines)):
+	raise Exception("orphan fail. a known orphan was appended again")
+
+# an interrupted append is discarded and the file is compacted
+with open(orphans_file, "a") as f:
+	f.write("31,%s" % block_hash("b31").encode("hex")[: 20])
+orphan_grunt.load_known_orphans(orphans_file)
+if len(orphan_grunt.orphan_hashes) != 5:
+	raise Exception("orphan fail. the interrupted append was not discarded")
+with open(orphans_file, "r") as f:
+	if sorted(f.readlines()) != sorted(lines):
+		raise Exception("orphan fail. the file was not compacted")
+if verbose:
+	print "pass"
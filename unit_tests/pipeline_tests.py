@@ -0,0 +1,109 @@
+#!/usr/bin/env python2.7
+
+import os, sys, tempfile
+
+# when executing this test directly include the parent dir in the path
+if (
+	(__name__ == "__main__") and
+	(__package__ is None)
+):
+	os.sys.path.append(
+		os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+	)
+
+verbose = True if "-v" in sys.argv else False
+
+# module containing some general bitcoin-related functions
+import btc_grunt
+
+# module containing the tx metadata storage backends
+import tx_metadata_grunt
+
+# module containing the queues, threads and stats for the validation pipeline
+import pipeline_grunt
+
+################################################################################
+# pipeline ordering and error tests
+################################################################################
+if verbose:
+	print """
+================= test for pipeline stage ordering and errors ==================
+"""
+def produce(out_queue):
+	for i in range(5):
+		pipeline_grunt.put(out_queue, i)
+	raise ValueError("deliberate producer failure")
+
+pipeline_grunt.init([("produce", 1), ("consume", 1)])
+consume_queue = pipeline_grunt.make_queue("consume", 2)
+pipeline_grunt.start_thread("produce", produce, consume_queue)
+# everything queued before the failure must still arrive, in order
+for expected in range(5):
+	item = pipeline_grunt.get(consume_queue)
+	if item != expected:
+		raise Exception(
+			"pipeline fail. expected item %s but got %s" % (expected, item)
+		)
+try:
+	pipeline_grunt.get(consume_queue)
+	raise AssertionError("the producer error was not raised")
+except AssertionError:
+	raise
+except Exception as e:
+	if "deliberate producer failure" not in str(e):
+		raise
+pipeline_grunt.shutdown()
+if verbose:
+	print "pass"
+
+################################################################################
+# pipeline writer tests
+################################################################################
+if verbose:
+	print """
+========================= test for the pipeline writer =========================
+"""
+tx_metadata_grunt.set_backend(
+	"sqlite", os.path.join(tempfile.mkdtemp(), "tx_metadata.sqlite")
+)
+txhash1 = "23ab47f962e86d1849fe2e1bdc3e3e5e49373fd8082bbb3792d704eeeaaec40f"
+save_data1 = {
+	"c9c7-3": {
+		"block_height": 142392,
+		"is_coinbase": None,
+		"is_orphan": None,
+		"spending_txs_list": [None, None]
+	}
+}
+btc_grunt.save_tx_data_to_disk(txhash1, save_data1)
+
+pipeline_grunt.init([("write", 1)])
+write_queue = pipeline_grunt.make_queue("write", 2)
+btc_grunt.queue_tx_metadata_flush(write_queue, None)
+# the writer has not started yet, so the data must come from the queued buffer
+if btc_grunt.tx_metadata_write_buffer:
+	raise Exception("pipeline writer fail. the write buffer was not emptied")
+if btc_grunt.get_tx_metadata(txhash1) != save_data1:
+	raise Exception("pipeline writer fail. the queued data is not visible")
+if tx_metadata_grunt.get_csv(txhash1) is not None:
+	raise Exception("pipeline writer fail. the data was written too early")
+
+pipeline_grunt.start_thread("write", btc_grunt.tx_metadata_writer, write_queue)
+pipeline_grunt.join(write_queue)
+pipeline_grunt.shutdown()
+if btc_grunt.tx_metadata_inflight_buffers:
+	raise Exception("pipeline writer fail. the written buffer was not dropped")
+if tx_metadata_grunt.get_csv(txhash1) is None:
+	raise Exception("pipeline writer fail. the data was not written")
+written_data = btc_grunt.get_tx_metadata(txhash1)["c9c7-3"]
+for (k, v) in save_data1["c9c7-3"].items():
+	if written_data[k] != v:
+		raise Exception(
+			"pipeline writer fail. expected %s %s but got %s"
+			% (k, v, written_data[k])
+		)
+if pipeline_grunt.stats["write"]["items"] != 1:
+	raise Exception("pipeline writer fail. the write stats are incorrect")
+tx_metadata_grunt.close()
+if verbose:
+	print "pass"
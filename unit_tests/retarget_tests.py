@@ -0,0 +1,69 @@
+#!/usr/bin/env python2.7
+
+import os, sys
+
+# when executing this test directly include the parent dir in the path
+if (
+	(__name__ == "__main__") and
+	(__package__ is None)
+):
+	os.sys.path.append(
+		os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+	)
+
+verbose = True if "-v" in sys.argv else False
+
+# module containing some general bitcoin-related functions
+import btc_grunt
+
+# module to cache the start of the latest difficulty retarget periods
+import retarget_grunt
+
+bits = btc_grunt.hex2bin("1d00ffff")
+
+################################################################################
+# retarget period cache tests
+################################################################################
+if verbose:
+	print """
+======================= test for the retarget period cache =====================
+"""
+retarget_grunt.init()
+for block_height in range(0, 3 * 2016 + 1, 12):
+	retarget_grunt.update(block_height, bits, 1231006505 + 600 * block_height)
+
+if sorted(retarget_grunt.periods) != [2 * 2016, 3 * 2016]:
+	raise Exception(
+		"retarget cache fail. expected periods at blocks %d and %d but got %s"
+		% (2 * 2016, 3 * 2016, sorted(retarget_grunt.periods))
+	)
+if retarget_grunt.get(2016) is not None:
+	raise Exception("retarget cache fail. an old period was not dropped")
+if retarget_grunt.get(2 * 2016) != (bits, 1231006505 + 600 * 2 * 2016):
+	raise Exception("retarget cache fail. wrong data for the previous period")
+
+# the cache survives a snapshot
+items = retarget_grunt.snapshot()
+retarget_grunt.init()
+retarget_grunt.restore(items)
+if retarget_grunt.snapshot() != items:
+	raise Exception("retarget cache fail. the restored cache differs")
+
+# the bits at a retarget come from the cache, so bitcoind is never asked. the
+# blocks in this period were mined twice as fast as they should have been
+block_1_ago = {"bits": bits, "timestamp": 1231006505 + 300 * (4 * 2016 - 1)}
+retarget_grunt.init()
+retarget_grunt.update(3 * 2016, bits, 1231006505 + 300 * 3 * 2016)
+new_bits = btc_grunt.calc_new_bits(
+	bits, 1231006505 + 300 * 3 * 2016, block_1_ago["timestamp"]
+)
+if new_bits == bits:
+	raise Exception("retarget cache fail. the difficulty did not change")
+parsed_block = {"block_height": 4 * 2016, "bits": new_bits}
+if btc_grunt.valid_bits(parsed_block, block_1_ago, True) is not True:
+	raise Exception("retarget cache fail. the retarget bits were not valid")
+parsed_block["bits"] = bits
+if btc_grunt.valid_bits(parsed_block, block_1_ago) is not False:
+	raise Exception("retarget cache fail. the wrong retarget bits were valid")
+if verbose:
+	print "pass"
@@ -0,0 +1,74 @@
+#!/usr/bin/env python2.7
+
+import os, sys, tempfile
+
+# when executing this test directly include the parent dir in the path
+if (
+	(__name__ == "__main__") and
+	(__package__ is None)
+):
+	os.sys.path.append(
+		os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+	)
+
+verbose = True if "-v" in sys.argv else False
+
+# module containing some general bitcoin-related functions
+import btc_grunt
+
+# module to remember which txin scripts have already passed verification
+import script_cache_grunt
+
+cache_file = os.path.join(tempfile.mkdtemp(), "script-cache.sqlite")
+txid = btc_grunt.sha256d("tx a")
+prev_txout_script = "\x76\xa9\x14" + "\x01" * 20 + "\x88\xac"
+flags = btc_grunt.get_script_flags(1333238400, 2, True)
+statuses = {"sig0": {"pubkey0": True}}
+
+################################################################################
+# script cache tests
+################################################################################
+if verbose:
+	print """
+=========================== test for the script cache =========================
+"""
+if flags != 0x3:
+	raise Exception("script cache fail. the p2sh flags are %s" % flags)
+if btc_grunt.get_script_flags(1333238399, 4, False) != 0x4 | 0x8:
+	raise Exception("script cache fail. the pre-p2sh flags are wrong")
+
+script_cache_grunt.init(cache_file)
+if script_cache_grunt.get(txid, 0, prev_txout_script, flags) is not None:
+	raise Exception("script cache fail. hit on an empty cache")
+script_cache_grunt.add(txid, 0, prev_txout_script, flags, statuses)
+if script_cache_grunt.get(txid, 0, prev_txout_script, flags) != statuses:
+	raise Exception("script cache fail. miss on an uncommitted result")
+script_cache_grunt.close()
+
+# results survive between runs
+script_cache_grunt.init(cache_file)
+if script_cache_grunt.get(txid, 0, prev_txout_script, flags) != statuses:
+	raise Exception("script cache fail. miss on a committed result")
+
+# but only for the same txin, previous txout script and rules
+for (txin_num, script, script_flags) in [
+	(1, prev_txout_script, flags),
+	(0, prev_txout_script + "\x00", flags),
+	(0, prev_txout_script, flags | 0x8)
+]:
+	if script_cache_grunt.get(txid, txin_num, script, script_flags) is not None:
+		raise Exception("script cache fail. hit on a different txin")
+if script_cache_grunt.stats != {"hits": 1, "misses": 3}:
+	raise Exception(
+		"script cache fail. the stats are %s" % script_cache_grunt.stats
+	)
+script_cache_grunt.close()
+
+# results from an older script engine are dropped
+script_cache_grunt.engine_version += 1
+script_cache_grunt.init(cache_file)
+if script_cache_grunt.get(txid, 0, prev_txout_script, flags) is not None:
+	raise Exception("script cache fail. hit from an older script engine")
+script_cache_grunt.close()
+if verbose:
+	print "pass"
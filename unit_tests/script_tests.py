@@ -163,6 +163,43 @@ ensure %s. der signature: %s
 		if verbose:
 			print "pass - error expected.\n%s" % res
 
+################################################################################
+# single-pass signature parsing tests
+################################################################################
+
+# (signature, r, s, low-s status, overall encoding status)
+inputs = [
+	("30 06 02 01 7f 02 01 7f 01", 0x7f, 0x7f, True, True),
+	(
+		"30 26 02 01 7f 02 21 00 %s 01" % ("ff" * 0x20), 0x7f,
+		int("ff" * 0x20, 16), False, False
+	),
+	("30 06 02 01 7f 02 01 7f 04", 0x7f, 0x7f, True, False), # bad hashtype
+	("30 06 02 01 ff 02 01 7f 01", None, None, False, False) # not der
+]
+for (i, (human_signature, r, s, low_s_status, status)) in enumerate(inputs):
+	signature = btc_grunt.hex2bin(human_signature.replace(" ", ""))
+	if verbose:
+		print """
+========================== test for signature parsing %s ========================
+signature: %s
+""" % (i, human_signature)
+
+	parsed = btc_grunt.parse_signature(signature)
+	if (
+		(parsed["r"] != r) or
+		(parsed["s"] != s) or
+		(parsed["low_s_status"] is not low_s_status) or
+		(parsed["status"] is not status) or
+		(parsed["status"] is not btc_grunt.check_signature_encoding(signature))
+	):
+		raise Exception(
+			"function parse_signature() parsed signature %s incorrectly: %s"
+			% (human_signature, parsed)
+		)
+	if verbose:
+		print "pass"
+
 ################################################################################
 # unit tests for converting a non-checksig script from human-readable script to
 # bin and back
@@ -0,0 +1,81 @@
+#!/usr/bin/env python2.7
+
+import os, sys, tempfile
+
+# when executing this test directly include the parent dir in the path
+if (
+	(__name__ == "__main__") and
+	(__package__ is None)
+):
+	os.sys.path.append(
+		os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+	)
+
+verbose = True if "-v" in sys.argv else False
+
+# module containing some general bitcoin-related functions
+import btc_grunt
+
+# module to save and load snapshots of the validation state
+import snapshot_grunt
+
+# module to hold the unspent txouts in ram during validation
+import utxo_grunt
+
+test_dir = tempfile.mkdtemp()
+snapshot_file = os.path.join(test_dir, "validation-snapshot.pickle")
+block_hash = btc_grunt.sha256d("block 1000")
+other_hash = btc_grunt.sha256d("block 999")
+
+################################################################################
+# snapshot save and load tests
+################################################################################
+if verbose:
+	print """
+======================== test for snapshot save and load =======================
+"""
+if snapshot_grunt.load(block_hash, 1000, snapshot_file) is not None:
+	raise Exception("snapshot fail. loaded a snapshot that does not exist")
+
+utxo_grunt.init(1024 * 1024, os.path.join(test_dir, "utxo-spill.sqlite"))
+for vout in range(10):
+	utxo_grunt.add(
+		other_hash, vout, 999, False, 1, other_hash[-2:], vout * 1000, "\x51"
+	)
+state = {
+	"hash_table": {block_hash: [1000, other_hash], other_hash: [999, "x"]},
+	"block_1_ago": {"bits": btc_grunt.hex2bin("1d00ffff"), "timestamp": 123},
+	"utxos": utxo_grunt.snapshot()
+}
+snapshot_grunt.save(block_hash, 1000, state, snapshot_file)
+if os.path.isfile("%s.tmp" % snapshot_file):
+	raise Exception("snapshot fail. the temp file was left behind")
+
+loaded_state = snapshot_grunt.load(block_hash, 1000, snapshot_file)
+if loaded_state != state:
+	raise Exception(
+		"snapshot fail. the loaded state differs from the saved state"
+	)
+
+# a snapshot from any other block must be ignored
+if snapshot_grunt.load(block_hash, 1001, snapshot_file) is not None:
+	raise Exception("snapshot fail. loaded a snapshot for the wrong height")
+if snapshot_grunt.load(other_hash, 1000, snapshot_file) is not None:
+	raise Exception("snapshot fail. loaded a snapshot for the wrong block")
+
+# the utxo set must come back exactly as it was
+utxo_grunt.init(1024 * 1024, os.path.join(test_dir, "utxo-spill.sqlite"))
+utxo_grunt.restore(loaded_state["utxos"])
+if utxo_grunt.snapshot() != state["utxos"]:
+	raise Exception("snapshot fail. the restored utxo set differs")
+if utxo_grunt.get(other_hash, 3)["funds"] != 3000:
+	raise Exception("snapshot fail. the restored utxo has the wrong funds")
+utxo_grunt.close()
+
+# a corrupt snapshot is ignored rather than raising an error
+with open(snapshot_file, "wb") as f:
+	f.write("not a snapshot")
+if snapshot_grunt.load(block_hash, 1000, snapshot_file) is not None:
+	raise Exception("snapshot fail. loaded a corrupt snapshot")
+if verbose:
+	print "pass"
@@ -0,0 +1,68 @@
+#!/usr/bin/env python2.7
+
+import os, sys, time
+
+# when executing this test directly include the parent dir in the path
+if (
+	(__name__ == "__main__") and
+	(__package__ is None)
+):
+	os.sys.path.append(
+		os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+	)
+
+verbose = True if "-v" in sys.argv else False
+
+# module to keep track of the latest block in bitcoind in the background
+import tip_grunt
+
+# stand in for bitcoind. the chain grows by one block on every other poll and
+# the poll after that fails
+chain = {"height": 100, "polls": 0}
+def poll_tip(known_tip):
+	chain["polls"] += 1
+	if not (chain["polls"] % 3):
+		raise IOError("bitcoind is busy")
+	if not (chain["polls"] % 2):
+		chain["height"] += 1
+	if (known_tip is not None) and (known_tip["height"] == chain["height"]):
+		return known_tip
+	return {"height": chain["height"], "hash": "hash%d" % chain["height"]}
+
+connected = []
+def connect():
+	connected.append(True)
+
+################################################################################
+# chain tip watcher tests
+################################################################################
+if verbose:
+	print """
+========================= test for the chain tip watcher =======================
+"""
+tip_grunt.start(poll_tip, connect, 0.01)
+if (tip_grunt.get_height() != 100) or (tip_grunt.get_hash() != "hash100"):
+	raise Exception(
+		"tip watcher fail. the first tip was not polled at the start"
+	)
+time.sleep(0.5)
+tip_grunt.stop()
+if tip_grunt.is_running():
+	raise Exception("tip watcher fail. the watcher did not stop")
+if not connected:
+	raise Exception("tip watcher fail. the watcher thread did not connect")
+if tip_grunt.get_height() != chain["height"]:
+	raise Exception(
+		"tip watcher fail. expected tip %d but got %d"
+		% (chain["height"], tip_grunt.get_height())
+	)
+if tip_grunt.get_hash() != "hash%d" % chain["height"]:
+	raise Exception("tip watcher fail. the tip hash does not match its height")
+if not tip_grunt.stats["errors"]:
+	raise Exception("tip watcher fail. poll errors were not counted")
+# the tip does not change on every successful poll
+if tip_grunt.stats["changes"] >= tip_grunt.stats["polls"] - \
+tip_grunt.stats["errors"]:
+	raise Exception("tip watcher fail. an unchanged tip counted as a change")
+if verbose:
+	print "pass"
@@ -0,0 +1,119 @@
+#!/usr/bin/env python2.7
+
+import os, sys
+
+# when executing this test directly include the parent dir in the path
+if (
+	(__name__ == "__main__") and
+	(__package__ is None)
+):
+	os.sys.path.append(
+		os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+	)
+
+verbose = True if "-v" in sys.argv else False
+
+# module containing some general bitcoin-related functions
+import btc_grunt
+
+# module to group the txs of a block by their dependencies on each other
+import txgraph_grunt
+
+def make_block(txs):
+	"""txs is a list of (tx name, [(prev tx name, index), ...])"""
+	return {"tx": {tx_num: {
+		"hash": btc_grunt.sha256d(tx_name),
+		"input": {txin_num: {
+			"hash": btc_grunt.sha256d(prev_tx_name), "index": index
+		} for (txin_num, (prev_tx_name, index)) in enumerate(txins)}
+	} for (tx_num, (tx_name, txins)) in enumerate(txs)}}
+
+################################################################################
+# dependency graph tests
+################################################################################
+if verbose:
+	print """
+======================= test for the tx dependency graph =======================
+"""
+txgraph_grunt.init()
+block = make_block([
+	("coinbase", [("", 0)]),
+	("tx 1", [("old tx", 0)]),
+	("tx 2", [("old tx", 1)]),
+	("tx 3", [("tx 1", 0), ("tx 2", 0)]), # spends 2 earlier txs in the block
+	("tx 4", [("old tx", 0)]), # double spends the txout spent by tx 1
+	("tx 5", [("tx 6", 0)]), # spends a later tx, which is invalid
+	("tx 6", [("tx 3", 0)])
+])
+graph = txgraph_grunt.build_block_dependency_graph(block)
+if graph != {
+	0: set(), 1: set(), 2: set(), 3: set([1, 2]), 4: set([1]), 5: set(),
+	6: set([3])
+}:
+	raise Exception("tx graph fail. the graph is %s" % graph)
+
+levels = txgraph_grunt.get_levels(graph)
+if levels != [[0, 1, 2, 5], [3, 4], [6]]:
+	raise Exception("tx graph fail. the levels are %s" % levels)
+
+# duplicate txids depend on every earlier tx with the txid
+block = make_block([
+	("coinbase", []), ("coinbase", []), ("tx 2", [("coinbase", 0)])
+])
+graph = txgraph_grunt.build_block_dependency_graph(block)
+if graph[2] != set([0, 1]):
+	raise Exception("tx graph fail. a duplicate txid was not a dependency")
+
+txgraph_grunt.record(levels)
+txgraph_grunt.record(txgraph_grunt.get_levels(graph))
+if txgraph_grunt.stats != {
+	"blocks": 2, "txs": 10, "levels": 5, "max_levels": 3, "max_width": 4
+}:
+	raise Exception("tx graph fail. the stats are %s" % txgraph_grunt.stats)
+if verbose:
+	print "pass"
+
+################################################################################
+# same block doublespend tests
+################################################################################
+if verbose:
+	print """
+===================== test for doublespends in level order =====================
+"""
+# tx 3 double spends the txout spent by tx 1, while tx 4 spends a different
+# txout of the same previous tx. tx 4 does not depend on anything, so it is
+# validated before tx 3
+block = make_block([
+	("coinbase", []),
+	("tx 1", [("old tx", 0)]),
+	("tx 2", []),
+	("tx 3", [("old tx", 0)]),
+	("tx 4", [("old tx", 1)])
+])
+levels = txgraph_grunt.get_levels(
+	txgraph_grunt.build_block_dependency_graph(block)
+)
+if [tx_num for level in levels for tx_num in level] != [0, 1, 2, 4, 3]:
+	raise Exception("tx graph fail. the levels are %s" % levels)
+
+spent_txs = {}
+doublespends = []
+for level in levels:
+	for tx_num in level:
+		tx = block["tx"][tx_num]
+		for (txin_num, txin) in tx["input"].items():
+			if btc_grunt.valid_tx_spend(
+				None, txin["hash"], txin["index"], tx["hash"], txin_num,
+				spent_txs
+			) is not True:
+				doublespends.append(tx_num)
+				continue
+			btc_grunt.record_same_block_spend(
+				spent_txs, txin["hash"], txin["index"], tx["hash"], txin_num
+			)
+if doublespends != [3]:
+	raise Exception(
+		"tx graph fail. the doublespends found are %s" % doublespends
+	)
+if verbose:
+	print "pass"
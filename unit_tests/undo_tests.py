@@ -0,0 +1,148 @@
+#!/usr/bin/env python2.7
+
+import os, sys, tempfile
+
+# when executing this test directly include the parent dir in the path
+if (
+	(__name__ == "__main__") and
+	(__package__ is None)
+):
+	os.sys.path.append(
+		os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+	)
+
+verbose = True if "-v" in sys.argv else False
+
+# module containing some general bitcoin-related functions
+import btc_grunt
+
+# module containing the tx metadata storage backends
+import tx_metadata_grunt
+
+# module to hold the unspent txouts in ram during validation
+import utxo_grunt
+
+# module to store the funds and script of every txout for validation
+import txout_grunt
+
+# module to store what each recent block changed, so that it can be undone
+import undo_grunt
+
+test_dir = tempfile.mkdtemp()
+tx_metadata_grunt.set_backend(
+	"sqlite", os.path.join(test_dir, "tx_metadata.sqlite")
+)
+utxo_grunt.init(1024 * 1024, os.path.join(test_dir, "utxo-spill.sqlite"))
+txout_grunt.init(os.path.join(test_dir, "txouts.sqlite"))
+undo_grunt.init(os.path.join(test_dir, "undo.sqlite"))
+
+def make_block(name, block_height, txs):
+	"""txs is a list of (tx name, [(prev tx hash, index), ...], num txouts)"""
+	return {
+		"block_hash": btc_grunt.sha256d(name),
+		"block_height": block_height,
+		"is_orphan": None,
+		"tx": {tx_num: {
+			"hash": btc_grunt.sha256d(tx_name),
+			"input": {txin_num: {
+				"hash": prev_hash, "index": index
+			} for (txin_num, (prev_hash, index)) in enumerate(txins)},
+			"output": {vout: {
+				"funds": 1000 * (vout + 1), "script": "\x51"
+			} for vout in range(num_txouts)}
+		} for (tx_num, (tx_name, txins, num_txouts)) in enumerate(txs)}
+	}
+
+def connect(parsed_block):
+	"""do what validate_blockchain() does once a block is valid"""
+	btc_grunt.save_tx_metadata(parsed_block)
+	for tx in parsed_block["tx"].values():
+		for txin in tx["input"].values():
+			txin["prev_txs_metadata"] = btc_grunt.get_tx_metadata(
+				btc_grunt.bin2hex(txin["hash"])
+			)
+	spends = btc_grunt.mark_spent_txs(parsed_block)
+	prior_utxos = utxo_grunt.connect_block(parsed_block)
+	overwritten_txouts = txout_grunt.add_block(parsed_block)
+	undo_grunt.save(
+		parsed_block["block_hash"], parsed_block["block_height"], [
+			(tx["hash"], tx_num, len(tx["output"]))
+			for (tx_num, tx) in sorted(parsed_block["tx"].items())
+		], spends, prior_utxos, overwritten_txouts
+	)
+	btc_grunt.flush_tx_metadata()
+
+coinbase_txin = (btc_grunt.blank_hash, btc_grunt.coinbase_index)
+block_a = make_block("block a", 10, [("tx a0", [coinbase_txin], 2)])
+tx_a0 = block_a["tx"][0]["hash"]
+block_b = make_block("block b", 11, [
+	("tx b0", [coinbase_txin], 1), ("tx b1", [(tx_a0, 0)], 1),
+	("tx b2", [(btc_grunt.sha256d("tx b1"), 0)], 1)
+])
+
+################################################################################
+# block disconnect tests
+################################################################################
+if verbose:
+	print """
+========================== test for disconnecting blocks =======================
+"""
+connect(block_a)
+tx_a0_before = btc_grunt.get_tx_metadata(btc_grunt.bin2hex(tx_a0))
+connect(block_b)
+tx_a0_hashend_txnum = "%s-0" % btc_grunt.bin2hex(block_a["block_hash"][-2:])
+if btc_grunt.get_tx_metadata(btc_grunt.bin2hex(tx_a0))[tx_a0_hashend_txnum][
+	"spending_txs_list"
+][0] is None:
+	raise Exception("undo fail. block b did not spend tx a0")
+if utxo_grunt.get(tx_a0, 0) is not None:
+	raise Exception("undo fail. tx a0 is still in the utxo set")
+
+if btc_grunt.disconnect_block(block_b["block_hash"]) != 11:
+	raise Exception("undo fail. the wrong block height was disconnected")
+
+if btc_grunt.get_tx_metadata(btc_grunt.bin2hex(tx_a0)) != tx_a0_before:
+	raise Exception("undo fail. tx a0 is still spent in the tx metadata")
+for tx in block_b["tx"].values():
+	if btc_grunt.get_tx_metadata(btc_grunt.bin2hex(tx["hash"])) is not None:
+		raise Exception("undo fail. a tx from block b is in the tx metadata")
+	if utxo_grunt.get(tx["hash"], 0) is not None:
+		raise Exception("undo fail. a tx from block b is in the utxo set")
+	if txout_grunt.get(tx["hash"], 0) is not None:
+		raise Exception("undo fail. a tx from block b is in the txout store")
+if utxo_grunt.get(tx_a0, 0)["funds"] != 1000:
+	raise Exception("undo fail. tx a0 was not put back in the utxo set")
+if txout_grunt.get_latest_height() != 10:
+	raise Exception("undo fail. the txout store latest height was not reset")
+if undo_grunt.get(block_b["block_hash"]) is not None:
+	raise Exception("undo fail. the undo record for block b was not deleted")
+if undo_grunt.get(block_a["block_hash"]) is None:
+	raise Exception("undo fail. the undo record for block a was deleted")
+
+# a duplicate txid (see bip30) overwrites the txouts of the earlier tx, and
+# they are put back when the block is disconnected
+block_c = make_block("block c", 11, [("tx a0", [coinbase_txin], 1)])
+block_c["tx"][0]["output"][0]["funds"] = 5
+connect(block_c)
+if (utxo_grunt.get(tx_a0, 0)["funds"], txout_grunt.get(tx_a0, 0)[0]) != (5, 5):
+	raise Exception("undo fail. the duplicate tx a0 did not overwrite tx a0")
+btc_grunt.disconnect_block(block_c["block_hash"])
+for vout in (0, 1):
+	if utxo_grunt.get(tx_a0, vout)["funds"] != 1000 * (vout + 1):
+		raise Exception("undo fail. tx a0 was not put back in the utxo set")
+	if txout_grunt.get(tx_a0, vout)[0] != 1000 * (vout + 1):
+		raise Exception("undo fail. tx a0 was not put back in the txout store")
+if btc_grunt.get_tx_metadata(btc_grunt.bin2hex(tx_a0)) != tx_a0_before:
+	raise Exception("undo fail. the duplicate tx a0 is in the tx metadata")
+
+# the undo records of old blocks are pruned
+undo_grunt.prune(20, 5)
+if undo_grunt.get(block_a["block_hash"]) is not None:
+	raise Exception("undo fail. an old undo record was not pruned")
+if verbose:
+	print "pass"
+
+utxo_grunt.close()
+txout_grunt.close()
+undo_grunt.close()
+tx_metadata_grunt.close()
@@ -0,0 +1,162 @@
+#!/usr/bin/env python2.7
+
+import os, sys, tempfile
+
+# when executing this test directly include the parent dir in the path
+if (
+	(__name__ == "__main__") and
+	(__package__ is None)
+):
+	os.sys.path.append(
+		os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+	)
+
+verbose = True if "-v" in sys.argv else False
+
+# module containing some general bitcoin-related functions
+import btc_grunt
+
+# module containing the in-memory utxo set
+import utxo_grunt
+
+spill_filename = os.path.join(tempfile.mkdtemp(), "utxo-spill.sqlite")
+
+################################################################################
+# utxo encoding tests
+################################################################################
+if verbose:
+	print """
+========================== test for utxo encoding ==============================
+"""
+script = btc_grunt.hex2bin("76a91462e907b15cbf27d5425399ebf6f0fb50ebb88f1888ac")
+value = utxo_grunt.encode_value(170, True, 0, "\xab\xcd", 5000000000, script)
+expected = {
+	"block_height": 170, "is_coinbase": True, "tx_num": 0,
+	"blockhashend": "\xab\xcd", "funds": 5000000000, "script": script
+}
+if utxo_grunt.decode_value(value) != expected:
+	raise Exception(
+		"utxo value %s decoded to %s but it should be %s"
+		% (btc_grunt.bin2hex(value), utxo_grunt.decode_value(value), expected)
+	)
+if len(value) != utxo_grunt.value_header_size + len(script):
+	raise Exception("the encoded utxo value is not compact")
+if verbose:
+	print "pass"
+
+################################################################################
+# utxo memory budget and spill tests
+################################################################################
+if verbose:
+	print """
+===================== test for utxo memory budget and spill ====================
+"""
+# a budget for roughly 10 utxos, so that most of them spill to disk
+utxo_grunt.init(10 * (utxo_grunt.entry_overhead + 100), spill_filename)
+txids = [btc_grunt.sha256d(str(i)) for i in range(50)]
+for (i, txid) in enumerate(txids):
+	utxo_grunt.add(txid, i % 3, i, False, i, "\x00\x01", i * 1000, script)
+
+if utxo_grunt.memory_used > utxo_grunt.memory_budget:
+	raise Exception("the utxo set is using more ram than its budget")
+if not utxo_grunt.num_spilled:
+	raise Exception("no utxos were spilled to disk")
+if utxo_grunt.size() != 50:
+	raise Exception(
+		"the utxo set has %s utxos but it should have 50" % utxo_grunt.size()
+	)
+# the first utxo will have been spilled and the last will still be in ram
+for i in (0, 49):
+	utxo = utxo_grunt.get(txids[i], i % 3)
+	if (utxo is None) or (utxo["funds"] != i * 1000):
+		raise Exception("utxo %s could not be retrieved" % i)
+if utxo_grunt.get(txids[0], 1) is not None:
+	raise Exception("a utxo with the wrong vout was retrieved")
+for i in (0, 49):
+	if not utxo_grunt.spend(txids[i], i % 3):
+		raise Exception("utxo %s could not be spent" % i)
+	if utxo_grunt.get(txids[i], i % 3) is not None:
+		raise Exception("utxo %s was retrieved after being spent" % i)
+if utxo_grunt.size() != 48:
+	raise Exception(
+		"the utxo set has %s utxos but it should have 48" % utxo_grunt.size()
+	)
+if verbose:
+	print "pass"
+
+################################################################################
+# utxo prev tx tests
+################################################################################
+if verbose:
+	print """
+========================== test for utxo prev tx data ==========================
+"""
+btc_grunt.orphan_grunt.orphans_by_height = {}
+(prev_txs_metadata, prev_txs) = \
+btc_grunt.get_previous_txout_from_utxo_set(txids[1], 1, False)
+expected_metadata = {"0001-1": {
+	"block_height": 1, "is_coinbase": None, "is_orphan": False,
+	"spending_txs_list": [None, None]
+}}
+if prev_txs_metadata != expected_metadata:
+	raise Exception(
+		"utxo prev tx metadata is %s but it should be %s"
+		% (prev_txs_metadata, expected_metadata)
+	)
+txout = prev_txs["0001-1"]["output"][1]
+if (
+	(txout["funds"] != 1000) or
+	(txout["script"] != script) or
+	(txout["script_format"] != "hash160") or
+	(txout["standard_script_address"] != "1A1zP1eP5QGefi2DMPTfTL5SLmv7DivfNa")
+):
+	raise Exception("utxo prev txout is incorrect: %s" % txout)
+if btc_grunt.get_previous_txout_from_utxo_set(txids[1], 0, False) is not None:
+	raise Exception("a utxo prev tx was found for a non-existent txout")
+utxo_grunt.close()
+if verbose:
+	print "pass"
+
+################################################################################
+# txout store tests
+################################################################################
+if verbose:
+	print """
+=========================== test for the txout store ===========================
+"""
+import txout_grunt
+txout_grunt.init(os.path.join(os.path.dirname(spill_filename), "txouts.sqlite"))
+genesis_block = btc_grunt.hex2bin(
+	"010000000000000000000000000000000000000000000000000000000000000000000000"
+	"3ba3edfd7a7b12b27ac72c3e67768f617fc81bc3888a51323a9fb8aa4b1e5e4a29ab5f49"
+	"ffff001d1dac2b7c01010000000100000000000000000000000000000000000000000000"
+	"00000000000000000000ffffffff4d04ffff001d0104455468652054696d65732030332f"
+	"4a616e2f32303039204368616e63656c6c6f72206f6e206272696e6b206f66207365636f"
+	"6e64206261696c6f757420666f722062616e6b73ffffffff0100f2052a01000000434104"
+	"678afdb0fe5548271967f1a67130b7105cd6a828e03909a67962e0ea1f61deb649f6bc3f"
+	"4cef38c4f35504e51ec112de5c384df7ba0b8d578a4c702b6bf11d5fac00000000"
+)
+parsed_block = btc_grunt.block_bin2dict(
+	genesis_block, 0, ["block_height", "tx_hash", "txout_funds", "txout_script"],
+	None
+)
+txout_grunt.add_block(parsed_block)
+if txout_grunt.get_latest_height() != 0:
+	raise Exception("the txout store did not record the latest block height")
+genesis_tx_hash = parsed_block["tx"][0]["hash"]
+(prev_txs_metadata, prev_txs) = btc_grunt.get_previous_txout(
+	genesis_tx_hash, ["txout_store"], True, False, 0
+)
+txout = prev_txs[None]["output"][0]
+if (
+	(txout["funds"] != 50 * btc_grunt.satoshis_per_btc) or
+	(txout["script"] != parsed_block["tx"][0]["output"][0]["script"])
+):
+	raise Exception("the txout store returned the wrong txout: %s" % txout)
+if btc_grunt.get_previous_txout(
+	genesis_tx_hash, ["txout_store"], True, False, 1
+) != (None, None):
+	raise Exception("the txout store returned a non-existent txout")
+txout_grunt.close()
+if verbose:
+	print "pass"
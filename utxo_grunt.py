@@ -0,0 +1,292 @@
+"""
+module containing an in-memory set of unspent transaction outputs (utxos).
+
+the utxo set is populated as blocks are connected during validation and is
+consulted before the tx metadata dirs or bitcoind rpc are touched. each utxo is
+keyed by (txid, vout) and its value is compactly encoded as a binary string:
+
+- block height (4 bytes)
+- flags (1 byte) - currently only bit 0 is used, to indicate a coinbase tx
+- tx number within the block (4 bytes)
+- last 2 bytes of the block hash
+- funds in satoshis (8 bytes)
+- the txout script (remaining bytes)
+
+once the encoded utxos use up more than the memory budget, the oldest ones are
+spilled to an sqlite file on disk. the spill file is scratch space - it is
+wiped whenever the utxo set is initialized, so that a crash part-way through a
+block can never leave stale utxos behind. a utxo that is not found here is not
+necessarily spent, it may just predate the utxo set - so callers must always
+fall back to the slower lookups upon a miss.
+"""
+
+import os, struct, collections, sqlite3
+import config_grunt
+
+value_header_format = "<IBI2sQ"
+value_header_size = struct.calcsize(value_header_format)
+coinbase_flag = 0x01
+
+# approximate python overhead per utxo (key string + value string + ordered dict
+# link). used to estimate how much ram the utxo set is using.
+entry_overhead = 200 # bytes
+
+# spill this fraction of the memory budget in one go, so that we do not end up
+# spilling a few utxos after every single block
+spill_fraction = 0.1
+
+# module globals - do not set here. use init()
+utxos = None # {key: value} in insertion order
+memory_budget = None # bytes
+memory_used = 0 # bytes
+spill_file = None
+spill_db = None
+num_spilled = 0 # utxos currently in the spill file
+stats = None
+
+def init(budget = None, spill_filename = None):
+    """
+    initialize (or reinitialize) an empty utxo set. the memory budget (in bytes)
+    and the spill file default to the values in config.json.
+    """
+    global utxos, memory_budget, memory_used, spill_file, spill_db, \
+    num_spilled, stats
+
+    if budget is None:
+        budget = config_grunt.config_dict["utxo_memory_budget_mb"] * 1024 * 1024
+    if spill_filename is None:
+        spill_filename = config_grunt.config_dict["utxo_spill_file"]
+
+    close()
+    utxos = collections.OrderedDict()
+    memory_budget = budget
+    memory_used = 0
+    spill_file = spill_filename
+    num_spilled = 0
+    stats = {"hits": 0, "misses": 0, "spilled": 0, "disk_hits": 0}
+
+    if os.path.exists(spill_file):
+        os.remove(spill_file)
+
+    spill_db = sqlite3.connect(spill_file)
+    # the spill file is scratch space so durability is not required
+    spill_db.execute("pragma journal_mode = off")
+    spill_db.execute("pragma synchronous = off")
+    spill_db.execute(
+        "create table utxos (k blob primary key, v blob not null)"
+    )
+
+def close():
+    """close the spill file, if one is open, and discard the utxo set"""
+    global utxos, spill_db, num_spilled, memory_used
+    if spill_db is not None:
+        spill_db.close()
+        spill_db = None
+    utxos = None
+    num_spilled = 0
+    memory_used = 0
+
+def initialized():
+    return utxos is not None
+
+def encode_key(txid, vout):
+    """txid is binary (little endian), vout is an int"""
+    return txid + struct.pack("<I", vout)
+
+def encode_value(
+    block_height, is_coinbase, tx_num, blockhashend, funds, script
+):
+    flags = coinbase_flag if is_coinbase else 0
+    return struct.pack(
+        value_header_format, block_height, flags, tx_num, blockhashend, funds
+    ) + script
+
+def decode_value(value):
+    (block_height, flags, tx_num, blockhashend, funds) = struct.unpack(
+        value_header_format, value[: value_header_size]
+    )
+    return {
+        "block_height": block_height,
+        "is_coinbase": bool(flags & coinbase_flag),
+        "tx_num": tx_num,
+        "blockhashend": blockhashend,
+        "funds": funds,
+        "script": value[value_header_size:]
+    }
+
+def add(
+    txid, vout, block_height, is_coinbase, tx_num, blockhashend, funds, script
+):
+    """
+    add an unspent txout to the set. if the (txid, vout) already exists then it
+    is overwritten, just as bitcoind does for duplicate txids (see bip30).
+    """
+    global memory_used
+    key = encode_key(txid, vout)
+    value = encode_value(
+        block_height, is_coinbase, tx_num, blockhashend, funds, script
+    )
+    if key in utxos:
+        memory_used -= len(key) + len(utxos.pop(key)) + entry_overhead
+    elif num_spilled:
+        delete_spilled(key)
+
+    utxos[key] = value
+    memory_used += len(key) + len(value) + entry_overhead
+    if memory_used > memory_budget:
+        spill()
+
+def get(txid, vout):
+    """return the decoded utxo dict, or None if it is not in the set"""
+    if utxos is None:
+        return None
+
+    key = encode_key(txid, vout)
+    value = utxos.get(key)
+    if (value is None) and num_spilled:
+        row = spill_db.execute(
+            "select v from utxos where k = ?", (buffer(key),)
+        ).fetchone()
+        if row is not None:
+            value = str(row[0])
+            stats["disk_hits"] += 1
+
+    if value is None:
+        stats["misses"] += 1
+        return None
+
+    stats["hits"] += 1
+    return decode_value(value)
+
+def spend(txid, vout):
+    """
+    remove the utxo from the set. return True if it was found, otherwise False.
+    """
+    return pop(encode_key(txid, vout)) is not None
+
+def pop(key):
+    """remove the utxo from the set and return its encoded value, or None"""
+    global memory_used
+    if key in utxos:
+        value = utxos.pop(key)
+        memory_used -= len(key) + len(value) + entry_overhead
+        return value
+
+    if num_spilled:
+        return delete_spilled(key)
+
+    return None
+
+def delete_spilled(key):
+    """delete the utxo from the spill file and return its value, or None"""
+    global num_spilled
+    row = spill_db.execute(
+        "select v from utxos where k = ?", (buffer(key),)
+    ).fetchone()
+    if row is None:
+        return None
+    spill_db.execute("delete from utxos where k = ?", (buffer(key),))
+    num_spilled -= 1
+    return str(row[0])
+
+def spill():
+    """
+    move the oldest utxos from ram to the spill file until we are comfortably
+    within the memory budget. old utxos are the least likely to be spent soon.
+    """
+    global memory_used, num_spilled
+    target = memory_budget * (1 - spill_fraction)
+    rows = []
+    while utxos and (memory_used > target):
+        (key, value) = utxos.popitem(last = False)
+        memory_used -= len(key) + len(value) + entry_overhead
+        rows.append((buffer(key), buffer(value)))
+
+    spill_db.executemany(
+        "insert or replace into utxos (k, v) values (?, ?)", rows
+    )
+    spill_db.commit()
+    num_spilled += len(rows)
+    stats["spilled"] += len(rows)
+
+def connect_block(parsed_block):
+    """
+    update the utxo set with a block that has just passed validation - first
+    remove the txouts that each tx spends and then add its own txouts. txs are
+    processed in order so that txouts spent within the same block never make it
+    into the set. unspendable (op_return) txouts are never added.
+
+    return the utxos which the block removed or overwrote, as a list of (key,
+    value before the block) for the undo record of the block (see
+    disconnect_block()). the value is None for a txout which the block created
+    where there was none before. a duplicate txid (see bip30) overwrites the
+    txouts of the earlier tx, so their values are kept too.
+    """
+    block_height = parsed_block["block_height"]
+    blockhashend = parsed_block["block_hash"][-2:]
+    prior_utxos = {} # {key: value before the block, or None}
+    for (tx_num, tx) in sorted(parsed_block["tx"].items()):
+        is_coinbase = (tx_num == 0)
+        if not is_coinbase:
+            for txin in tx["input"].values():
+                key = encode_key(txin["hash"], txin["index"])
+                value = pop(key)
+                if (value is not None) and (key not in prior_utxos):
+                    prior_utxos[key] = value
+
+        for (vout, txout) in tx["output"].items():
+            if txout["script"][: 1] == "\x6a": # op_return
+                continue
+            key = encode_key(tx["hash"], vout)
+            if key not in prior_utxos:
+                prior_utxos[key] = pop(key)
+            add(
+                tx["hash"], vout, block_height, is_coinbase, tx_num,
+                blockhashend, txout["funds"], txout["script"]
+            )
+    return prior_utxos.items()
+
+def disconnect_block(created, prior_utxos):
+    """
+    undo connect_block() - remove the txouts created by the block and put back
+    the utxos that it spent or overwrote. created is a list of (txid, tx num,
+    num txouts) and prior_utxos is the list returned by connect_block().
+    """
+    global memory_used
+    for (txid, tx_num, num_txouts) in created:
+        for vout in xrange(num_txouts):
+            spend(txid, vout)
+
+    for (key, value) in prior_utxos:
+        if value is None:
+            continue
+        pop(key)
+        utxos[key] = value
+        memory_used += len(key) + len(value) + entry_overhead
+
+    if memory_used > memory_budget:
+        spill()
+
+def snapshot():
+    """
+    return the utxos held in ram as a list of (key, value) pairs, oldest first,
+    for a validation snapshot. the spilled utxos are left out since the spill
+    file is scratch space - once restored, they are just found elsewhere.
+    """
+    return utxos.items()
+
+def restore(items):
+    """
+    load the (key, value) pairs from snapshot() into the set. this must be done
+    straight after init(), while the set is still empty.
+    """
+    global memory_used
+    for (key, value) in items:
+        utxos[key] = value
+        memory_used += len(key) + len(value) + entry_overhead
+    if memory_used > memory_budget:
+        spill()
+
+def size():
+    """the total number of utxos (in ram and spilled to disk)"""
+    return len(utxos) + num_spilled
@@ -2,31 +2,44 @@
 "validate all merkle roots in the supplied block range"
 
 import sys
+import multiprocessing
 import btc_grunt
 import queries
 import get_tx_from_db
 import get_block_from_db
 import lang_grunt
 import progress_meter
+import filesystem_grunt
 
 modes = ["db-update", "db-check"]
 
+# number of blocks to fetch from the db in one query in parallel mode
+default_chunk_size = 1000
+
 def validate_script_usage():
     usage = "\n\nUsage: ./validate_merkle_roots.py <startblock> <endblock> " \
-    "<mode>\n" \
+    "<mode> [<num_workers> [<chunk_size>]]\n" \
     "where <mode> can be %s:\n" \
     "- db-update - only check and update the status of blocks that have not\n" \
     "already been validated and had their status saved in the db.\n" \
     "- db-recheck - only check the status of blocks that have already been\n" \
     " validated and had their status saved in the db. report on any failures." \
-    % (lang_grunt.list2human_str(modes, "or"))
+    "\nif <num_workers> is specified then the range is processed in\n" \
+    "parallel mode - the tx hashes for <chunk_size> blocks (default %d) are\n" \
+    "fetched from the db in a single query and the merkle roots are\n" \
+    "calculated by <num_workers> worker processes." \
+    % (lang_grunt.list2human_str(modes, "or"), default_chunk_size)
 
     if len(sys.argv) < 3:
         raise ValueError(usage)
     try:
-        (_, _, mode) = get_stdin_params()
+        (_, _, mode, num_workers, chunk_size) = get_stdin_params()
         if mode not in modes:
             raise ValueError(usage)
+        if (num_workers is not None) and (num_workers < 1):
+            raise ValueError(usage)
+        if chunk_size < 1:
+            raise ValueError(usage)
     except:
         raise ValueError(usage)
 
@@ -34,7 +47,9 @@ def get_stdin_params():
     block_height_start = int(sys.argv[1])
     block_height_end = int(sys.argv[2])
     mode = sys.argv[3]
-    return (block_height_start, block_height_end, mode)
+    num_workers = int(sys.argv[4]) if len(sys.argv) > 4 else None
+    chunk_size = int(sys.argv[5]) if len(sys.argv) > 5 else default_chunk_size
+    return (block_height_start, block_height_end, mode, num_workers, chunk_size)
 
 def process_range(block_height_start, block_height_end, mode):
     merkle_root_status = "any"
@@ -74,11 +89,108 @@ def process_range(block_height_start, block_height_end, mode):
         print "\ninvalid block heights:\n%s\n" % \
         "\n".join(str(block_height) for block_height in invalid_blocks)
 
+def validate_merkle_roots(blocks):
+    """
+    worker function for parallel mode. blocks is a list of
+    (block_hash_hex, block_height, merkle_root, [tx hashes]) tuples. return a
+    list of (block_hash_hex, block_height, valid) tuples.
+    """
+    calculated_merkle_roots = btc_grunt.calculate_merkle_roots(
+        [tx_hashes for (_, _, _, tx_hashes) in blocks]
+    )
+    return [
+        (block_hash_hex, block_height, calculated_merkle_root == merkle_root)
+        for (
+            (block_hash_hex, block_height, merkle_root, _),
+            calculated_merkle_root
+        ) in zip(blocks, calculated_merkle_roots)
+    ]
+
+def group_tx_hashes_by_block(rows):
+    """
+    convert the rows from queries.get_tx_hashes_in_range() into a list of
+    (block_hash_hex, block_height, merkle_root, [tx hashes]) tuples. the rows
+    are grouped by block hash, since an orphan and a main chain block can have
+    the same height.
+    """
+    blocks = []
+    for row in rows:
+        if (not blocks) or (blocks[-1][0] != row["block_hash_hex"]):
+            blocks.append((
+                row["block_hash_hex"], row["block_height"],
+                btc_grunt.hex2bin(row["merkle_root_hex"]), []
+            ))
+        blocks[-1][3].append(btc_grunt.hex2bin(row["tx_hash_hex"]))
+    return blocks
+
+def process_range_parallel(
+    block_height_start, block_height_end, mode, num_workers, chunk_size
+):
+    merkle_root_status = "any"
+    pool = multiprocessing.Pool(num_workers)
+    invalid_blocks = []
+    try:
+        for chunk_start in xrange(
+            block_height_start, block_height_end, chunk_size
+        ):
+            chunk_end = min(chunk_start + chunk_size, block_height_end)
+            progress_meter.render(
+                100 * (chunk_start - block_height_start) / \
+                float(block_height_end - block_height_start),
+                "validating blocks %d to %d (final: %d)"
+                % (chunk_start, chunk_end - 1, block_height_end)
+            )
+            blocks = group_tx_hashes_by_block(queries.get_tx_hashes_in_range(
+                merkle_root_status, chunk_start, chunk_end
+            ))
+            # one slice of blocks per worker
+            slices = [blocks[i:: num_workers] for i in range(num_workers)]
+            valid_blocks = []
+            invalid_chunk_blocks = []
+            for results in pool.imap_unordered(validate_merkle_roots, slices):
+                for (block_hash_hex, block_height, valid) in results:
+                    if valid:
+                        valid_blocks.append(block_hash_hex)
+                    else:
+                        invalid_chunk_blocks.append(
+                            (block_height, block_hash_hex)
+                        )
+
+            if mode == "db-update":
+                queries.update_merkle_root_statuses(True, valid_blocks)
+                queries.update_merkle_root_statuses(False, [
+                    block_hash_hex for (_, block_hash_hex) in
+                    invalid_chunk_blocks
+                ])
+            invalid_blocks.extend(sorted(invalid_chunk_blocks))
+    except Exception as e:
+        print "\n\n---------------------\n\n"
+        filesystem_grunt.update_errorlog(e, prepend_datetime = True)
+        raise
+    finally:
+        pool.terminate()
+
+    progress_meter.render(
+        100, "finished validating from block %d to %d\n" % (
+            block_height_start, block_height_end
+        )
+    )
+    if len(invalid_blocks) and (mode == "db-check"):
+        print "\ninvalid blocks (height, hash):\n%s\n" % "\n".join(
+            "%d, %s" % invalid_block for invalid_block in invalid_blocks
+        )
+
 if __name__ == '__main__':
 
     validate_script_usage()
-    (block_height_start, block_height_end, mode) = get_stdin_params()
+    (block_height_start, block_height_end, mode, num_workers, chunk_size) = \
+    get_stdin_params()
 
-    process_range(block_height_start, block_height_end, mode)
+    if num_workers is None:
+        process_range(block_height_start, block_height_end, mode)
+    else:
+        process_range_parallel(
+            block_height_start, block_height_end, mode, num_workers, chunk_size
+        )
     if "db-" in mode:
         queries.mysql_grunt.disconnect()
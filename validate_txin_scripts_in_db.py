@@ -0,0 +1,312 @@
+#!/usr/bin/env python2.7
+"""
+validate the txin scripts (checksigs) of all txs in the supplied block range
+against their previous txout scripts, using only the db (as filled by
+parse_blocks_to_db.py and process_blocks_in_db.py). the result is saved in
+blockchain_txins.txin_checksig_validation_status.
+
+the range is processed in chunks of blocks. for each chunk, the txs, the txins
+joined to the previous txout scripts they spend, and the txouts are fetched in
+3 queries. the scripts are verified by a pool of worker processes and the
+statuses are written back in one batch per chunk. a txin whose script could not
+be verified at all (verify_script() raised) is not an invalid checksig - its
+status is left unset and it is logged to the error log instead.
+
+in db-update mode, txins which have already passed verification during
+blockchain validation are taken from the script cache (see script_cache_grunt)
+rather than verified again, if the script cache is on in config.json. the cache
+is only read here, since a result is only cached once the der signature checks
+have passed too, and this script does not do those. db-check mode always
+verifies.
+
+this script is intended to run in parallel on multiple machines, each on its
+own block range. the range can be given on the command line, or taken from the
+tasklist table with:
+
+./validate_txin_scripts_in_db.py tasklist
+
+which runs the latest task named 'validate_txin_scripts' for this host (the
+unique_host_id in config.json) that has not been started yet. the details field
+of the task is json like so:
+
+{"start_block": 1, "end_block": 1000, "mode": "db-update", "num_workers": 4,
+"chunk_size": 100}
+
+where mode, num_workers and chunk_size are optional.
+"""
+
+import sys
+import json
+import multiprocessing
+import btc_grunt
+import config_grunt
+import queries
+import lang_grunt
+import progress_meter
+import filesystem_grunt
+import script_cache_grunt
+
+modes = ["db-update", "db-check"]
+
+# number of blocks to fetch from the db in one query
+default_chunk_size = 100
+
+# the name of the tasks for this script in the tasklist table
+task_name = "validate_txin_scripts"
+
+def validate_script_usage():
+    usage = "\n\nUsage: ./validate_txin_scripts_in_db.py <startblock>" \
+    " <endblock> <mode> [<num_workers> [<chunk_size>]]\n" \
+    "or: ./validate_txin_scripts_in_db.py tasklist\n" \
+    "where <mode> can be %s:\n" \
+    "- db-update - only check and update the status of txins that have not\n" \
+    "already been validated and had their status saved in the db.\n" \
+    "- db-check - only check the status of txins that have already been\n" \
+    "validated and had their status saved in the db. report on any\n" \
+    "differences.\n" \
+    "the txs of <chunk_size> blocks (default %d) are fetched from the db\n" \
+    "at once and their scripts are verified by <num_workers> worker\n" \
+    "processes (default: one per cpu)." \
+    % (lang_grunt.list2human_str(modes, "or"), default_chunk_size)
+
+    if (len(sys.argv) == 2) and (sys.argv[1] == "tasklist"):
+        return
+    if len(sys.argv) < 4:
+        raise ValueError(usage)
+    try:
+        (_, _, mode, num_workers, chunk_size) = get_stdin_params()
+        if mode not in modes:
+            raise ValueError(usage)
+        if (num_workers is not None) and (num_workers < 1):
+            raise ValueError(usage)
+        if chunk_size < 1:
+            raise ValueError(usage)
+    except:
+        raise ValueError(usage)
+
+def get_stdin_params():
+    block_height_start = int(sys.argv[1])
+    block_height_end = int(sys.argv[2])
+    mode = sys.argv[3]
+    num_workers = int(sys.argv[4]) if len(sys.argv) > 4 else None
+    chunk_size = int(sys.argv[5]) if len(sys.argv) > 5 else default_chunk_size
+    return (block_height_start, block_height_end, mode, num_workers, chunk_size)
+
+def get_jobs(tx_rows, txin_rows, txout_rows, mode):
+    """
+    assemble the rows from the 3 queries for a chunk into script validation
+    jobs, in the format expected by btc_grunt.verify_tx_scripts(). the tx num in
+    each job is its position in the list of jobs.
+
+    only txins with an unset status (db-update mode) or a set status (db-check
+    mode) are validated. txins in the script cache (db-update mode only) are
+    not put in the jobs. return (jobs, {(tx hash hex, txin num): status in the
+    db}, number of txins whose previous txout is not in the db, [(True, tx hash
+    hex, txin num), ...] for the txins in the script cache).
+    """
+    bugs_and_all = True
+    explain = False
+    txs = {} # {tx hash hex: (tx row, tx dict, {txin num: prev tx0})}
+    for row in tx_rows:
+        txs[row["tx_hash_hex"]] = (row, {
+            "hash": btc_grunt.hex2bin(row["tx_hash_hex"]),
+            "version": row["tx_version"],
+            "num_inputs": row["num_txins"],
+            "num_outputs": row["num_txouts"],
+            "lock_time": row["tx_lock_time"],
+            "input": {},
+            "output": {}
+        }, {})
+
+    for row in txout_rows:
+        if row["tx_hash_hex"] not in txs:
+            continue
+        script = btc_grunt.hex2bin(row["script_hex"])
+        txs[row["tx_hash_hex"]][1]["output"][row["txout_num"]] = {
+            "funds": row["funds"],
+            "script": script,
+            "script_length": len(script)
+        }
+
+    db_statuses = {}
+    num_missing_prev_txouts = 0
+    cached_statuses = []
+    for row in txin_rows:
+        # coinbase txs are not in txs
+        if row["tx_hash_hex"] not in txs:
+            continue
+        (tx_row, tx, prev_tx0s) = txs[row["tx_hash_hex"]]
+        script = btc_grunt.hex2bin(row["txin_script_hex"])
+        tx["input"][row["txin_num"]] = {
+            "hash": btc_grunt.hex2bin(row["prev_txout_hash_hex"]),
+            "index": row["prev_txout_num"],
+            "script": script,
+            "script_length": len(script),
+            "script_list": btc_grunt.script_bin2list(script),
+            "sequence_num": row["txin_sequence_num"]
+        }
+        db_status = btc_grunt.bin2bool(row["checksig_validation_status"])
+        if (db_status is None) != (mode == "db-update"):
+            continue
+        if row["prev_txout_script_hex"] is None:
+            num_missing_prev_txouts += 1
+            continue
+        prev_txout_script = btc_grunt.hex2bin(row["prev_txout_script_hex"])
+        prev_txout_script_list = btc_grunt.script_bin2list(prev_txout_script)
+        prev_tx0 = {
+            "hash": tx["input"][row["txin_num"]]["hash"],
+            "output": {row["prev_txout_num"]: {
+                "script": prev_txout_script,
+                "script_list": prev_txout_script_list,
+                "script_format": btc_grunt.extract_script_format(
+                    prev_txout_script_list, ignore_nops = False
+                )
+            }}
+        }
+        if (mode == "db-update") and btc_grunt.get_cached_script_eval_data(
+            tx["hash"], row["txin_num"], row["prev_txout_num"], prev_tx0,
+            btc_grunt.get_script_flags(
+                tx_row["block_time"], tx_row["block_version"], bugs_and_all
+            )
+        ):
+            cached_statuses.append((True, row["tx_hash_hex"], row["txin_num"]))
+            continue
+        prev_tx0s[row["txin_num"]] = prev_tx0
+        db_statuses[(row["tx_hash_hex"], row["txin_num"])] = db_status
+
+    jobs = []
+    for (row, tx, prev_tx0s) in txs.values():
+        if prev_tx0s:
+            jobs.append((
+                len(jobs), tx, prev_tx0s, row["block_time"],
+                row["block_version"], bugs_and_all, explain
+            ))
+    return (jobs, db_statuses, num_missing_prev_txouts, cached_statuses)
+
+def process_range(
+    block_height_start, block_height_end, mode, num_workers = None,
+    chunk_size = default_chunk_size
+):
+    pool = multiprocessing.Pool(num_workers)
+    # open the script cache after forking the workers, so that they do not
+    # inherit the connection
+    if (mode == "db-update") and config_grunt.config_dict["script_cache"]:
+        script_cache_grunt.init()
+    differences = [] # [(tx hash hex, txin num, status in the db), ...]
+    num_txins = 0
+    num_invalid = 0
+    num_missing_prev_txouts = 0
+    errors = [] # [(tx hash hex, txin num), ...]
+    try:
+        for chunk_start in xrange(
+            block_height_start, block_height_end, chunk_size
+        ):
+            chunk_end = min(chunk_start + chunk_size, block_height_end)
+            progress_meter.render(
+                100 * (chunk_start - block_height_start) / \
+                float(block_height_end - block_height_start),
+                "validating txin scripts in blocks %d to %d (final: %d)"
+                % (chunk_start, chunk_end - 1, block_height_end)
+            )
+            (jobs, db_statuses, num_missing, cached_statuses) = get_jobs(
+                queries.get_txs_for_script_validation(chunk_start, chunk_end),
+                queries.get_txins_with_prev_txout_scripts(
+                    chunk_start, chunk_end
+                ),
+                queries.get_txouts_in_range(chunk_start, chunk_end), mode
+            )
+            num_missing_prev_txouts += num_missing
+            # [(valid, tx hash hex, txin num), ...]
+            statuses = cached_statuses
+            for (job_num, results, seconds, _) in pool.imap_unordered(
+                btc_grunt.verify_tx_scripts, jobs, chunksize = 10
+            ):
+                tx_hash_hex = btc_grunt.bin2hex(jobs[job_num][1]["hash"])
+                for (txin_num, script_eval_data) in results.items():
+                    # the script eval data is None if verify_script() raised.
+                    # this is a problem with the tooling rather than an
+                    # invalid checksig, so leave the status unset in the db
+                    if script_eval_data is None:
+                        errors.append((tx_hash_hex, txin_num))
+                        filesystem_grunt.update_errorlog(
+                            "failed to verify the script of txin %d in tx %s"
+                            % (txin_num, tx_hash_hex), prepend_datetime = True
+                        )
+                        continue
+                    valid = (script_eval_data["status"] is True)
+                    statuses.append((valid, tx_hash_hex, txin_num))
+
+            num_txins += len(statuses)
+            num_invalid += sum(1 for status in statuses if not status[0])
+            if mode == "db-update":
+                queries.update_txin_checksig_statuses(statuses)
+            elif mode == "db-check":
+                differences.extend(
+                    (tx_hash_hex, txin_num, db_statuses[
+                        (tx_hash_hex, txin_num)
+                    ]) for (valid, tx_hash_hex, txin_num) in statuses
+                    if valid != db_statuses[(tx_hash_hex, txin_num)]
+                )
+    except Exception as e:
+        print "\n\n---------------------\n\n"
+        filesystem_grunt.update_errorlog(e, prepend_datetime = True)
+        raise
+    finally:
+        pool.terminate()
+        script_cache_grunt.close()
+
+    progress_meter.render(
+        100, "finished validating from block %d to %d\n" % (
+            block_height_start, block_height_end
+        )
+    )
+    print "%d txin scripts validated, %d invalid" % (num_txins, num_invalid)
+    if script_cache_grunt.stats["hits"]:
+        print script_cache_grunt.stats2human_str()
+    if len(errors):
+        print "%d txin scripts could not be verified and were skipped (tx" \
+        " hash, txin num):\n%s\n" % (len(errors), "\n".join(
+            "%s, %d" % error for error in errors
+        ))
+    if num_missing_prev_txouts:
+        print "%d txins were skipped since the previous txout they spend is" \
+        " not in the db" % num_missing_prev_txouts
+    if len(differences):
+        print "\ntxins whose status differs from the db (tx hash, txin num," \
+        " status in the db):\n%s\n" % "\n".join(
+            "%s, %d, %s" % difference for difference in differences
+        )
+
+def manage():
+    """
+    run the next task for this script and this host from the tasklist table, if
+    there is one
+    """
+    host = config_grunt.config_dict["unique_host_id"]
+    task = queries.get_next_task(task_name, host)
+    if task is None:
+        print "there are no tasks assigned for validating txin scripts"
+        return
+
+    details = json.loads(task["details"])
+    # mark the current task as "in-progress"
+    queries.mark_task_started(task["id"], host)
+    process_range(
+        details["start_block"], details["end_block"],
+        details.get("mode", "db-update"), details.get("num_workers"),
+        details.get("chunk_size", default_chunk_size)
+    )
+    queries.mark_task_ended(task["id"], host)
+
+if __name__ == '__main__':
+
+    validate_script_usage()
+    if sys.argv[1] == "tasklist":
+        manage()
+    else:
+        (block_height_start, block_height_end, mode, num_workers, chunk_size) \
+        = get_stdin_params()
+        process_range(
+            block_height_start, block_height_end, mode, num_workers, chunk_size
+        )
+    queries.mysql_grunt.disconnect()